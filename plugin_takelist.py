@@ -3,25 +3,40 @@ from switchboard.devices.device_widget_base import DeviceWidget
 from switchboard.config import SETTINGS
 from switchboard.switchboard_logging import ConsoleStream, LOGGER
 
-from .takelist_ui import TakeListUI
-from .takelist_model import TakeListModel
+# The model, UI and sync modules are only imported once they are needed, so loading the
+# plugin doesn't pay for them. Only these small, Qt-free modules are loaded up front
+from .takelist_perf import PERF_STATS
+from .takelist_timecode import SystemClock, TimecodeClock, frames_to_timecode
 
 from PySide2 import QtCore
 from PySide2 import QtWidgets
+import time
 
 class DeviceTakeList(Device):
     takelist_ui = None
     takelist_model = None
+    takelist_sync_client = None
+
+    # Where take timecodes come from. Can be swapped for another TimecodeClock, e.g. an LTCFileClock
+    timecode_clock = SystemClock()
 
     def __init__(self, name, address, **kwargs):
         super().__init__(name, address, **kwargs)
         self.status = DeviceStatus.READY
         self.autojoin_mu_server = False
 
+        # Take info dialogs still waiting for the operator, kept alive until they are dismissed
+        self.take_info_dialogs = set()
+        self._start_frames = None
+
     @staticmethod
     def plugin_settings():
         return Device.plugin_settings()
 
+    @classmethod
+    def set_timecode_clock(cls, clock: TimecodeClock):
+        cls.timecode_clock = clock
+
     @property
     def is_recording_device(self):
         return True
@@ -35,10 +50,25 @@ class DeviceTakeList(Device):
         ''' Creates the Takelist model if it doesn't exist yet.
         '''
         if not cls.takelist_model:
+            from .takelist_model import TakeListModel
             cls.takelist_model = TakeListModel(None)
+            cls.takelist_model.restore_data()
 
         return cls.takelist_model
 
+    @classmethod
+    def start_takelist_sync(cls, host: str = None, port: int = None, station: str = None):
+        ''' Shares the take list with the other stations connected to the same sync hub. Uses the default hub address if none is given '''
+        if not cls.takelist_sync_client:
+            from .takelist_sync import DEFAULT_SYNC_HOST, DEFAULT_SYNC_PORT
+            from .takelist_sync_client import TakeListSyncClient
+            host = host or DEFAULT_SYNC_HOST
+            port = port or DEFAULT_SYNC_PORT
+            cls.create_takelist_model_if_necessary()
+            cls.takelist_sync_client = TakeListSyncClient(cls.takelist_model, host, port, station)
+            cls.takelist_sync_client.start()
+        return cls.takelist_sync_client
+
     @classmethod
     def plug_into_ui(cls, menubar, tabs):
         '''
@@ -49,6 +79,7 @@ class DeviceTakeList(Device):
 
         # Create Monitor UI if it doesn't exist
         if not cls.takelist_ui:
+            from .takelist_ui import TakeListUI
             cls.takelist_ui = TakeListUI(parent=tabs, model=cls.takelist_model)
 
         # Add our monitor UI to the main tabs in the UI
@@ -61,20 +92,44 @@ class DeviceTakeList(Device):
         self._slate = slate
         self._take = take
         self._description = description
-        self.record_start_confirm("00:00:00:00")
+        self._start_frames = self.timecode_clock.frames()
+        self.record_start_confirm(frames_to_timecode(self._start_frames, self.timecode_clock.rate))
 
     def record_stop(self):
         """
         Called by switchboard_dialog when recording was stopped.
+
+        The take is added as a provisional row and the stop is confirmed right away,
+        so the other devices aren't held up. Its notes and quality are filled in once
+        the operator accepts the take info dialog, or can be edited inline later.
         """
-        timecode = "00:00:00:00"
+        stop_time = time.perf_counter()
+        clock = self.timecode_clock
+        stop_frames = clock.frames()
+        start_frames = stop_frames if self._start_frames is None else self._start_frames
+        sequence, slate, take = SETTINGS.CURRENT_SEQUENCE, self._slate, self._take
+
+        DeviceTakeList.takelist_model.add_take(sequence, slate, take, "", "", start_frames,
+                                               clock.duration(start_frames, stop_frames), clock.rate)
+        self.record_stop_confirm(frames_to_timecode(stop_frames, clock.rate))
+        if PERF_STATS.enabled:
+            PERF_STATS.record("record_stop_confirm_latency", time.perf_counter() - stop_time)
 
         take_info_dialog = TakeInfoDialog()
-        try:
-            take_info_dialog.ui.exec()
-        finally:
-            DeviceTakeList.takelist_model.add_take(SETTINGS.CURRENT_SEQUENCE, self._slate, self._take, take_info_dialog.get_description(), take_info_dialog.get_quality(), timecode)
-        self.record_stop_confirm(timecode)
+        self.take_info_dialogs.add(take_info_dialog)
+        take_info_dialog.ui.finished.connect(
+            lambda result: self.on_take_info_dialog_finished(take_info_dialog, result, sequence, slate, take))
+        take_info_dialog.ui.show()
+
+    def on_take_info_dialog_finished(self, take_info_dialog, result, sequence, slate, take):
+        self.take_info_dialogs.discard(take_info_dialog)
+        if result != QtWidgets.QDialog.Accepted:
+            # Dismissed without grading, so the take keeps its empty notes and status
+            return
+        DeviceTakeList.takelist_model.update_take(sequence, slate, take, {
+            'Notes': take_info_dialog.get_description(),
+            'Status': take_info_dialog.get_quality()
+        })
 
     def load_takes_from_json(self):
         """
@@ -123,6 +178,8 @@ class TakeInfoDialog(QtCore.QObject):
         self.ui.quality_label.setText("Quality")
         self.ui.quality_label.setAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
         self.ui.quality_combo_box = QtWidgets.QComboBox()
+        # Takes aren't graded unless the operator picks a quality
+        self.ui.quality_combo_box.addItem("No status", "")
         self.ui.quality_combo_box.addItem("⭐", "S")
         self.ui.quality_combo_box.addItem("✔️", "G")
         self.ui.quality_combo_box.addItem("❌", "NG")
@@ -135,6 +192,11 @@ class TakeInfoDialog(QtCore.QObject):
 
         dialog_layout.addWidget(self.ui.take_info_layout)
 
+        self.ui.button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        self.ui.button_box.accepted.connect(self.ui.accept)
+        self.ui.button_box.rejected.connect(self.ui.reject)
+        dialog_layout.addWidget(self.ui.button_box)
+
     def get_quality(self):
         return self.ui.quality_combo_box.itemData(self.ui.quality_combo_box.currentIndex())
     
@@ -0,0 +1,391 @@
+''' Benchmark helpers and one-off micro-benchmarks for the take list model.
+
+The benchmark suite, which times the main take list operations at 1k, 10k and
+100k takes and keeps the results between versions, is tests/test_benchmark.py.
+It builds its take lists with the generators here. The micro-benchmarks compare
+the current implementation against the ones it replaced, and run headless with
+    QT_QPA_PLATFORM=offscreen python -m switchboard.devices.takelist.takelist_benchmark
+'''
+import argparse, csv, os, pathlib, random, subprocess, sys, tempfile, time, timeit, tracemalloc
+
+from PySide2.QtCore import QCoreApplication, QModelIndex, Qt
+from .takelist_core import RootItem, SequenceItem, SlateItem, TakeItem, HEADER_DATA, CSV_HEADER_DATA
+from .takelist_model import TakeListModel
+from .takelist_journal import TakeListJournal
+from .takelist_proxy import TakeListProxyModel
+from .takelist_flatten import Flattener, flatten_dict, flatten_records
+from .takelist_timecode import frames_to_timecode, frames_to_timecodes, timecode_to_frames, timecodes_to_frames
+
+
+class DictTakeItem(object):
+    ''' The dict based TakeItem layout used before items were slotted, kept only to compare memory against '''
+    def __init__(self, slate_parent, take, timecode, duration, rate, status, notes):
+        self.parentItem = slate_parent
+        self.itemData = {
+            'Take': take,
+            'Timecode': timecode,
+            'Duration': duration,
+            'Rate': rate,
+            'Status': status,
+            'Notes': notes
+        }
+        self.childItems = []
+        self.childLookup = {}
+        self.rowNumber = 0
+        self.column_names = []
+
+
+def build_model(take_count: int, sequence: str = "Shot1", slate: str = "Slate1") -> TakeListModel:
+    ''' Builds a model holding take_count takes in a single slate, without touching disk '''
+    model = TakeListModel(None, persistent=False)
+    model.beginResetModel()
+    for take in range(take_count):
+        model.restore_take({
+            'Sequence': sequence,
+            'Slate': slate,
+            'Take': take,
+            'Timecode': 0,
+            'Duration': 0,
+            'Status': "G",
+            'Notes': ""
+        })
+    model.endResetModel()
+    return model
+
+
+def bench_index_parent(take_counts=(100, 1000, 10000), number: int = 20000):
+    ''' index()/parent() on the last take of a slate should cost the same regardless of the slate size '''
+    print("index()/parent() on the last take of a slate")
+    for take_count in take_counts:
+        model = build_model(take_count)
+        sequence_index = model.index(0, 0, QModelIndex())
+        slate_index = model.index(0, 0, sequence_index)
+        last_row = model.rowCount(slate_index) - 1
+
+        index_time = timeit.timeit(lambda: model.index(last_row, 0, slate_index), number=number)
+        take_index = model.index(last_row, 0, slate_index)
+        parent_time = timeit.timeit(lambda: model.parent(take_index), number=number)
+
+        print(f"  {take_count:>7} takes: index() {index_time / number * 1e9:8.0f} ns  parent() {parent_time / number * 1e9:8.0f} ns")
+
+
+def measure_take_memory(take_class, take_count: int) -> int:
+    root = RootItem(HEADER_DATA.keys())
+    slate = SlateItem(SequenceItem("Shot1", root), "Slate1")
+
+    tracemalloc.start()
+    takes = [take_class(slate, take, 0, 0, 24, "G", "") for take in range(take_count)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del takes
+    return allocated
+
+
+def bench_take_memory(take_count: int = 100000):
+    ''' Compares the memory held by take_count takes in the slotted and the dict based layouts '''
+    print(f"Memory held by {take_count} takes")
+    dict_bytes = measure_take_memory(DictTakeItem, take_count)
+    slots_bytes = measure_take_memory(TakeItem, take_count)
+    print(f"  dict layout:    {dict_bytes / take_count:6.0f} bytes per take  {dict_bytes / 2**20:7.1f} MiB")
+    print(f"  slotted layout: {slots_bytes / take_count:6.0f} bytes per take  {slots_bytes / 2**20:7.1f} MiB")
+
+
+def generate_takes(take_count: int, takes_per_slate: int = 20, slates_per_sequence: int = 25):
+    for take_number in range(take_count):
+        slate_number = take_number // takes_per_slate
+        yield (f"Shot{slate_number // slates_per_sequence + 1}", f"Slate{slate_number + 1}", take_number % takes_per_slate + 1)
+
+
+def bench_add_take_with_proxy(take_count: int = 10000):
+    ''' Times add_take with a sorted TakeListProxyModel attached, like the take list widget has.
+    The signals it emits are checked in tests/test_model_signals.py '''
+    model = TakeListModel(None, persistent=False)
+    proxy = TakeListProxyModel()
+    proxy.setSourceModel(model)
+    proxy.sort(0, Qt.AscendingOrder)
+
+    start = time.perf_counter()
+    for sequence, slate, take in generate_takes(take_count):
+        model.add_take(sequence, slate, take, "", "G", 0)
+    elapsed = time.perf_counter() - start
+
+    print(f"add_take x {take_count} with a sorted proxy attached: {elapsed:.2f} s ({take_count / elapsed:.0f} takes/s)")
+
+
+def bench_load(take_count: int = 100000):
+    ''' Measures how many rows per second load_takes streams from a csv into an empty model '''
+    source = TakeListModel(None, persistent=False)
+    source.add_takes({'Sequence': sequence, 'Slate': slate, 'Take': take, 'Timecode': 0, 'Duration': 0, 'Status': "G", 'Notes': "Notes for this take"}
+                     for sequence, slate, take in generate_takes(take_count))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "takelist.csv")
+        TakeListJournal(csv_path, csv_path + ".journal", CSV_HEADER_DATA).compact(source.rootItem.flatten())
+
+        model = TakeListModel(None, persistent=False)
+        start = time.perf_counter()
+        loaded = model.load_takes(csv_path)
+        elapsed = time.perf_counter() - start
+
+    print(f"load_takes of {loaded} takes from csv: {elapsed:.2f} s ({loaded / elapsed:.0f} rows/s)")
+
+
+def nested_list_flatten(item):
+    ''' The list concatenating flatten used before export rows were streamed, kept only to compare against '''
+    if isinstance(item, TakeItem):
+        return item.toDict()
+    if isinstance(item, SlateItem):
+        rows = []
+        for child in item.childItems:
+            row = nested_list_flatten(child)
+            row["Slate"] = item.slate
+            rows.append(row)
+        return rows
+    rows = []
+    for child in item.childItems:
+        child_rows = nested_list_flatten(child)
+        if isinstance(item, SequenceItem):
+            for row in child_rows:
+                row["Sequence"] = item.sequence
+        rows += child_rows
+    return rows
+
+
+def measure_export(rows_func, take_count: int):
+    model = TakeListModel(None, persistent=False)
+    model.add_takes({'Sequence': sequence, 'Slate': slate, 'Take': take, 'Timecode': 0, 'Duration': 0, 'Status': "G", 'Notes': ""}
+                    for sequence, slate, take in generate_takes(take_count))
+
+    with open(os.devnull, 'w', newline='') as csvfile:
+        tracemalloc.start()
+        start = time.perf_counter()
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADER_DATA)
+        writer.writerows(rows_func(model.rootItem))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_export(take_count: int = 100000):
+    ''' Compares exporting through nested flatten lists against streaming rows into csv.DictWriter '''
+    print(f"csv export of {take_count} takes (times include tracemalloc overhead)")
+    for name, rows_func in (("nested lists", nested_list_flatten), ("iterRows", lambda root: root.iterRows())):
+        elapsed, peak = measure_export(rows_func, take_count)
+        print(f"  {name:>12}: {elapsed:.2f} s, peak {peak / 2**20:.1f} MiB")
+
+
+def bench_timecode_conversion(count: int = 100000):
+    ''' Compares converting a column of timecodes one call at a time against the bulk conversions '''
+    frames = [take * 37 for take in range(count)]
+    rates = [24] * count
+    timecodes = frames_to_timecodes(frames, rates)
+    print(f"timecode conversion of {count} values")
+    for name, func in (
+            ("frames_to_timecode", lambda: [frames_to_timecode(frame, rate) for frame, rate in zip(frames, rates)]),
+            ("frames_to_timecodes", lambda: frames_to_timecodes(frames, rates)),
+            ("timecode_to_frames", lambda: [timecode_to_frames(timecode, rate) for timecode, rate in zip(timecodes, rates)]),
+            ("timecodes_to_frames", lambda: timecodes_to_frames(timecodes, rates))):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"  {name:>20}: {elapsed * 1000:.1f} ms")
+
+
+def recursive_flatten_dict(d, parent_key='', sep='_'):
+    ''' The recursive flatten that takelist_model used to have, kept only to compare against '''
+    items = []
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(recursive_flatten_dict(v, new_key, sep=sep).items())
+        elif isinstance(v, list):
+            for i, item in enumerate(v):
+                item_key = f"{new_key}{sep}{i}"
+                items.extend(recursive_flatten_dict({item_key: item}, sep=sep).items())
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+
+def generate_device_metadata(row: dict) -> dict:
+    ''' Nested metadata like other Switchboard devices could attach to a take '''
+    take = row['Take']
+    return {
+        'camera': {
+            'id': f"CAM{take % 4}",
+            'lens': {'model': "Master Prime", 'focal_length': 35, 'iris': 2.8, 'focus_distance': 1.2 + take % 7},
+            'fps': row['Rate'],
+        },
+        'mocap': {
+            'subject': "Actor1",
+            'files': [f"/mocap/{row['Slate']}_{take}.fbx", f"/mocap/{row['Slate']}_{take}.c3d"],
+        },
+        'tags': ["hero", "day1"],
+        'operator': "Operator1",
+    }
+
+
+def bench_flatten_metadata(record_count: int = 100000):
+    ''' Compares flattening nested take metadata recursively, iteratively and through a compiled schema '''
+    records = [generate_device_metadata(row) for row in generate_take_rows(record_count)]
+    print(f"flatten of {record_count} nested metadata records")
+    for name, func in (
+            ("recursive", lambda: [recursive_flatten_dict(record) for record in records]),
+            ("iterative", lambda: [flatten_dict(record) for record in records]),
+            ("schema", lambda: flatten_records(records)),
+            ("schema, fixed shape", lambda: list(map(Flattener(check_leaves=False).flatten, records)))):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"  {name:>20}: {elapsed * 1000:.1f} ms ({record_count / elapsed:.0f} records/s)")
+
+
+def bench_paint_path(take_count: int = 100000, visible_rows: int = 60, frames: int = 200):
+    ''' Calls data() for every role a view asks for while painting a screenful of takes, frame after frame '''
+    model = build_model(take_count)
+    slate_index = model.index(0, 0, model.index(0, 0, QModelIndex()))
+    roles = (Qt.DisplayRole, Qt.ForegroundRole, Qt.BackgroundRole, Qt.ToolTipRole, Qt.DecorationRole, Qt.FontRole)
+    column_count = model.columnCount()
+
+    start = time.perf_counter()
+    calls = 0
+    for frame in range(frames):
+        # Scroll a little further through the slate each frame, so both cold and cached rows get painted
+        first_row = frame * visible_rows // 4
+        for row in range(first_row, first_row + visible_rows):
+            for column in range(column_count):
+                index = model.index(row, column, slate_index)
+                for role in roles:
+                    model.data(index, role)
+                    calls += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"paint path on {take_count} takes: {calls / elapsed:.0f} data() calls/s including index()")
+
+
+NOTE_WORDS = ('good', 'great', 'soft', 'focus', 'buzz', 'boom', 'in', 'shot', 'line', 'flubbed', 'late', 'cue',
+              'mark', 'missed', 'reflection', 'camera', 'bump', 'pickup', 'safety', 'alt', 'wild', 'track')
+STATUS_WEIGHTS = (("", 40), ("G", 35), ("NG", 15), ("S", 10))
+
+
+def generate_take_rows(take_count: int, seed: int = 0, rate: int = 24):
+    ''' Yields take_count rows shaped like a shoot: uneven slates per sequence and takes per slate,
+    mostly unrated takes, short notes, and timecodes that run through the day with gaps between takes '''
+    rng = random.Random(seed)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+
+    timecode = 9 * 3600 * rate
+    sequence_number = slate_number = 0
+    slates_left = takes_left = 0
+    take = 0
+    for _ in range(take_count):
+        if takes_left == 0:
+            if slates_left == 0:
+                sequence_number += 1
+                slates_left = rng.randint(3, 40)
+            slate_number += 1
+            slates_left -= 1
+            # Most slates are done in a handful of takes, a few need many more
+            takes_left = min(1 + int(rng.expovariate(1 / 4)), 60)
+            take = 0
+        take += 1
+        takes_left -= 1
+
+        duration = rng.randint(10 * rate, 180 * rate)
+        yield {
+            'Sequence': f"SEQ{sequence_number:03d}",
+            'Slate': f"SEQ{sequence_number:03d}_{slate_number:04d}",
+            'Take': take,
+            'Timecode': timecode,
+            'Duration': duration,
+            'Rate': rate,
+            'Status': rng.choices(statuses, weights)[0],
+            'Notes': " ".join(rng.choices(NOTE_WORDS, k=rng.randint(0, 6))),
+        }
+        timecode += duration + rng.randint(5 * rate, 90 * rate)
+        if timecode > 19 * 3600 * rate:
+            # Wrap to the start of the next shooting day
+            timecode = 9 * 3600 * rate
+
+
+class BenchmarkModel(TakeListModel):
+    ''' Persistent model that keeps its take list in a temporary directory instead of the project '''
+    def __init__(self, root_dir: str, **kwargs):
+        self.root_dir = root_dir
+        TakeListModel.__init__(self, None, **kwargs)
+
+    def project_takelist_path(self) -> pathlib.Path:
+        return pathlib.Path(self.root_dir) / "takelist.csv"
+
+
+def restored_model(rows) -> TakeListModel:
+    model = TakeListModel(None, persistent=False)
+    model.beginResetModel()
+    for row in rows:
+        model.restore_take(row)
+    model.endResetModel()
+    return model
+
+
+# Modules whose import time is tracked
+IMPORT_MODULES = ('takelist_core', 'takelist_io', 'takelist_model', 'plugin_takelist')
+# Modules that must not pull in Qt, so tools can use them without it
+QT_FREE_MODULES = ('takelist_core', 'takelist_io')
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, 'PySide2' in sys.modules)
+"""
+
+
+def measure_import_time(module: str, repeat: int = 5) -> tuple:
+    ''' Returns the fastest time to import module in a fresh interpreter, and whether that loaded PySide2 '''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(module=f"{__package__}.{module}")], env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(output[0]))
+    return min(timings), output[1] == 'True'
+
+
+def bench_import_time(modules=IMPORT_MODULES) -> dict:
+    ''' Returns {module: seconds}. Modules that can't be imported here, e.g. the plugin outside Switchboard, are skipped '''
+    results = {}
+    for module in modules:
+        try:
+            elapsed, loads_qt = measure_import_time(module)
+        except (subprocess.CalledProcessError, IndexError):
+            print(f"  {module:>20} can't be imported here, skipped")
+            continue
+        results[module] = elapsed
+        print(f"  {module:>20} imports in {elapsed * 1000:6.1f} ms{', loading PySide2' if loads_qt else ''}")
+    return results
+
+
+def bench_micro():
+    bench_index_parent()
+    bench_take_memory()
+    bench_add_take_with_proxy()
+    bench_load()
+    bench_export()
+    bench_timecode_conversion()
+    bench_flatten_metadata()
+    bench_paint_path()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Take list model micro-benchmarks")
+    parser.add_argument('--no-imports', action='store_true', help="don't time the module imports")
+    args = parser.parse_args()
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    bench_micro()
+    if not args.no_imports:
+        print("Module import times")
+        bench_import_time()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+''' Command line tool for merging, converting and summarizing take lists without Switchboard.
+
+Merges any number of take list files, e.g. the takelist.csv of every project after
+a shoot, into one take list and reports per sequence stats. A take that appears in
+several inputs is kept once, with the values from the input given last.
+
+    python -m switchboard.devices.takelist.takelist_cli projects/ -o merged.csv -o merged.jsonl --stats
+
+Directories are searched for takelist.csv files. Outputs are written as csv, nested
+json or columnar json lines depending on their suffix, sorted by sequence, slate
+and take. Each input is read and sorted by a worker process into a temporary run
+file, and the runs are then merged a row at a time, so memory use is bounded by
+the largest input rather than by all of them together.
+'''
+from .takelist_core import CSV_HEADER_DATA, TAKELIST_FILE_NAME
+from .takelist_io import COLUMNS_SUFFIX, read_takelist, write_takelist_columns, write_takelist_csv, write_takelist_json_rows
+from .takelist_timecode import nominal_fps
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+import argparse, heapq, json, logging, pathlib, tempfile, time
+
+STATUS_CIRCLED = 'S'
+STATUS_GOOD = 'G'
+STATUS_NG = 'NG'
+
+STATS_COLUMNS = ('Sequence', 'Slates', 'Takes', 'Circled', 'Good', 'NG', 'NG ratio', 'Duration')
+
+logger = logging.getLogger(__name__)
+
+
+def take_sort_key(row: dict) -> tuple:
+    ''' Sorts takes by sequence, slate and take number. Take numbers that didn't parse as ints sort after the rest '''
+    take = row['Take']
+    return (row['Sequence'], row['Slate'], (0, take) if isinstance(take, int) else (1, str(take)))
+
+
+def expand_inputs(inputs) -> list:
+    ''' Replaces directories with the take lists found below them '''
+    paths = []
+    for path in map(pathlib.Path, inputs):
+        if path.is_dir():
+            paths += sorted(path.rglob(TAKELIST_FILE_NAME))
+        else:
+            paths.append(path)
+    return paths
+
+
+def sort_takelist(path: pathlib.Path, run_path: pathlib.Path) -> int:
+    ''' Writes the takes of one take list to run_path as json lines, sorted and without duplicates. Runs in a worker process '''
+    rows = {}
+    for row in read_takelist(path):
+        # Within a file the last row of a take wins, like replaying a journal
+        rows[take_sort_key(row)] = row
+
+    with open(run_path, 'w', encoding='utf-8') as runfile:
+        for key in sorted(rows):
+            runfile.write(json.dumps(rows[key], separators=(',', ':')) + '\n')
+    return len(rows)
+
+
+def read_run(run_path: pathlib.Path):
+    with open(run_path, 'r', encoding='utf-8') as runfile:
+        for line in runfile:
+            yield json.loads(line)
+
+
+def merge_takelists(paths, tmp_dir: pathlib.Path, jobs: int = None):
+    ''' Yields the takes of all the given take lists, sorted, with each take once '''
+    run_paths = [pathlib.Path(tmp_dir) / f"run{index}.jsonl" for index in range(len(paths))]
+    if jobs == 1 or len(paths) == 1:
+        row_counts = list(map(sort_takelist, paths, run_paths))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            row_counts = list(executor.map(sort_takelist, paths, run_paths))
+    for path, row_count in zip(paths, row_counts):
+        logger.info(f"Read {row_count} takes from {path}")
+
+    # heapq.merge keeps equal takes in the order of their runs, so the last one comes from the input given last
+    merged = heapq.merge(*map(read_run, run_paths), key=take_sort_key)
+    for _, rows in groupby(merged, take_sort_key):
+        yield list(rows)[-1]
+
+
+class TakeListStats(object):
+    ''' Per sequence counts, gathered from a stream of takes '''
+
+    def __init__(self):
+        self.sequences = {}
+
+    def add(self, row: dict):
+        stats = self.sequences.get(row['Sequence'])
+        if stats is None:
+            stats = self.sequences[row['Sequence']] = {'slates': set(), 'takes': 0, 'statuses': {}, 'seconds': 0.0}
+        stats['slates'].add(row['Slate'])
+        stats['takes'] += 1
+        status = row.get('Status') or ""
+        stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+        # Takes can be counted at different rates, so durations are added up in seconds
+        stats['seconds'] += (row.get('Duration') or 0) / nominal_fps(row.get('Rate') or 1)
+
+    def rows(self) -> list:
+        rows = []
+        for sequence, stats in sorted(self.sequences.items()):
+            ng_count = stats['statuses'].get(STATUS_NG, 0)
+            rows.append({
+                'Sequence': sequence,
+                'Slates': len(stats['slates']),
+                'Takes': stats['takes'],
+                'Circled': stats['statuses'].get(STATUS_CIRCLED, 0),
+                'Good': stats['statuses'].get(STATUS_GOOD, 0),
+                'NG': ng_count,
+                'NG ratio': round(ng_count / stats['takes'], 3),
+                'Duration': round(stats['seconds'], 3),
+            })
+        return rows
+
+    def print_table(self):
+        rows = [{**row, 'Duration': format_seconds(row['Duration'])} for row in self.rows()]
+        widths = {column: max([len(column)] + [len(str(row[column])) for row in rows]) for column in STATS_COLUMNS}
+        print("  ".join(column.ljust(widths[column]) for column in STATS_COLUMNS))
+        for row in rows:
+            print("  ".join(str(row[column]).ljust(widths[column]) for column in STATS_COLUMNS))
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, second = divmod(int(seconds), 60)
+    hours, minute = divmod(minutes, 60)
+    return f"{hours}:{minute:02d}:{second:02d}"
+
+
+def write_output(path: pathlib.Path, rows, fieldnames):
+    ''' Writes rows in the format picked by the suffix of path '''
+    suffix = path.suffix.lower()
+    if suffix == '.json':
+        write_takelist_json_rows(path, rows)
+    elif suffix == COLUMNS_SUFFIX:
+        write_takelist_columns(path, rows, fieldnames)
+    else:
+        write_takelist_csv(path, rows, fieldnames)
+
+
+def run(inputs, outputs=(), stats: bool = False, stats_path: pathlib.Path = None, jobs: int = None) -> TakeListStats:
+    ''' Merges the inputs into each of the outputs. Returns the per sequence stats if they were asked for '''
+    paths = expand_inputs(inputs)
+    if not paths:
+        raise ValueError("No take lists found in the given inputs")
+
+    start = time.perf_counter()
+    takelist_stats = TakeListStats() if stats or stats_path else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        merged_path = pathlib.Path(tmp_dir) / "merged.jsonl"
+        # The take list columns plus any extension columns the inputs have, in the order they are first seen
+        fieldnames = dict.fromkeys(CSV_HEADER_DATA)
+        with open(merged_path, 'w', encoding='utf-8') as mergedfile:
+            take_count = 0
+            for row in merge_takelists(paths, tmp_dir, jobs):
+                take_count += 1
+                if not fieldnames.keys() >= row.keys():
+                    fieldnames.update(dict.fromkeys(row))
+                if takelist_stats:
+                    takelist_stats.add(row)
+                mergedfile.write(json.dumps(row, separators=(',', ':')) + '\n')
+
+        # The merged takes are read back from disk for each output instead of being kept around
+        for output in outputs:
+            write_output(pathlib.Path(output), read_run(merged_path), list(fieldnames))
+            logger.info(f"Wrote {take_count} takes to {output}")
+
+    logger.info(f"Merged {len(paths)} take lists into {take_count} takes in {time.perf_counter() - start:.2f} s")
+
+    if stats:
+        takelist_stats.print_table()
+    if stats_path:
+        with open(stats_path, 'w', encoding='utf-8') as statsfile:
+            json.dump(takelist_stats.rows(), statsfile, indent=1)
+    return takelist_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merges, converts and summarizes take lists")
+    parser.add_argument('inputs', nargs='+', help="take list csv, json or jsonl files, or directories to search for takelist.csv files")
+    parser.add_argument('-o', '--output', action='append', default=[], type=pathlib.Path,
+                        help=f"file to write the merged take list to, as csv, json or columnar {COLUMNS_SUFFIX} by suffix. Can be given more than once")
+    parser.add_argument('--stats', action='store_true', help="print per sequence stats")
+    parser.add_argument('--stats-output', type=pathlib.Path, help="json file to write the per sequence stats to")
+    parser.add_argument('-j', '--jobs', type=int, help="worker processes reading the inputs, one per cpu by default")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        run(args.inputs, args.output, args.stats, args.stats_output, args.jobs)
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,669 @@
+''' Pure python core of the take list.
+
+Holds the sequence/slate/take tree and its lookups, and reads and writes it
+through the journal, sqlite and file helpers. Nothing in here imports Qt or
+Switchboard, so scripts and tools can load and export take lists on their own.
+TakeListModel wraps a TakeList for the view.
+'''
+from .takelist_io import read_takelist, write_takelist_csv, write_takelist_json
+from .takelist_journal import TakeListJournal
+from .takelist_perf import PERF_STATS
+from .takelist_timecode import TimecodeRange, frames_to_timecode, parse_timecode_columns
+from operator import attrgetter
+from types import MappingProxyType
+import logging, pathlib, sys, weakref
+
+TAKELIST_FILE_NAME = "takelist.csv"
+TAKELIST_JOURNAL_FILE_NAME = "takelist.journal"
+TAKELIST_SQLITE_FILE_NAME = "takelist.sqlite"
+
+# Where the take list is persisted: a csv snapshot plus a journal, or an sqlite database
+TAKELIST_BACKEND_JOURNAL = "journal"
+TAKELIST_BACKEND_SQLITE = "sqlite"
+TAKELIST_JSON_FILE_NAME = "takelist.json"
+
+# Propagates to the Switchboard logger when running inside Switchboard
+logger = logging.getLogger(__name__)
+
+
+# The glyph shown for each status code. Take lists saved by older versions hold the glyphs themselves
+STATUS_GLYPHS = (
+    ('S', "⭐"),
+    ('G', "✔️"),
+    ('NG', "❌"),
+)
+# Also maps the check mark without its emoji variation selector, which some editors drop
+LEGACY_STATUS_GLYPHS = {**{glyph: status for status, glyph in STATUS_GLYPHS}, "✔": 'G'}
+
+
+def intern_status(status):
+    ''' Status codes repeat across every take, so all takes share a single string per code.
+    Glyphs from older take lists are turned into their codes '''
+    if isinstance(status, str):
+        return sys.intern(LEGACY_STATUS_GLYPHS.get(status, status))
+    return status
+
+
+class TreeItem(object):
+    # Items are slotted so that season-long archives with 100k+ takes don't pay for a dict per item
+    __slots__ = ('parentItem', 'childItems', 'childLookup', 'rowNumber', 'dirty', 'rowCache')
+
+    # Maps a column name to a function returning that column's value for an item
+    COLUMN_GETTERS = {
+        'Name': lambda item: item.displayName(),
+        'Type': lambda item: item.type(),
+    }
+
+    def __init__(self, parent=None):
+        self.parentItem = parent
+        self.childItems = []
+        # Children keyed by their sequence name, slate name or take number
+        self.childLookup = {}
+        # Position of this item in its parent's childItems, kept up to date by the parent
+        self.rowNumber = 0
+        # Set while this item has changes that haven't been handed to the writer yet
+        self.dirty = False
+        # Per role values for every column, built by TakeListModel.data on first paint
+        self.rowCache = None
+
+    def appendRow(self, item):
+        item.rowNumber = len(self.childItems)
+        self.childItems.append(item)
+        self.childLookup[item.key()] = item
+
+    def insertRow(self, row, item):
+        self.childItems.insert(row, item)
+        self.childLookup[item.key()] = item
+        self.renumberRows(row)
+
+    def removeRow(self, row):
+        item = self.childItems.pop(row)
+        del self.childLookup[item.key()]
+        self.renumberRows(row)
+        return item
+
+    def clearRows(self):
+        items = self.childItems
+        self.childItems = []
+        self.childLookup = {}
+        return items
+
+    def renumberRows(self, first_row=0):
+        for row in range(first_row, len(self.childItems)):
+            self.childItems[row].rowNumber = row
+
+    def child(self, row):
+        return self.childItems[row]
+
+    def childByKey(self, key):
+        return self.childLookup.get(key)
+
+    def rowCount(self):
+        return len(self.childItems)
+
+    def columnCount(self):
+        return self.parentItem.columnCount()
+
+    def data(self, column):
+        getter = self.COLUMN_GETTERS.get(column)
+        if getter:
+            return getter(self)
+        return None
+
+    def displayData(self, column):
+        return self.data(column)
+
+    def parent(self):
+        return self.parentItem
+
+    def row(self):
+        if self.parentItem:
+            return self.rowNumber
+        logger.info(f"{self} hasa no parent. Returning 0 for row")
+        return 0
+    
+    def displayName(self):
+        return ""
+
+    def key(self):
+        return None
+
+    def keyPath(self) -> tuple:
+        ''' Returns () for the root, (sequence,), (sequence, slate) or (sequence, slate, take) '''
+        path = []
+        item = self
+        while item.parentItem is not None:
+            path.append(item.key())
+            item = item.parentItem
+        return tuple(reversed(path))
+    
+    def type(self):
+        return "Root"
+    
+    def toDict(self):
+        return {
+            "Children": [child.toDict() for child in self.childItems]    
+        }
+    
+    def iterRows(self):
+        ''' Lazily yields a fresh export row for every take below this item, without touching model state '''
+        for child in self.childItems:
+            yield from child.iterRows()
+
+    @PERF_STATS.timed("flatten")
+    def flatten(self):
+        return list(self.iterRows())
+
+
+class RootItem(TreeItem):
+    __slots__ = ('column_names',)
+
+    def __init__(self, column_names):
+        super().__init__(parent=None)
+        self.column_names = list(column_names)
+
+    def columnCount(self):
+        return len(self.column_names)
+
+
+# Takes never have children, so they all share these instead of allocating their own
+NO_CHILDREN = ()
+NO_CHILD_LOOKUP = MappingProxyType({})
+NO_EXTRA = NO_CHILD_LOOKUP
+
+
+class TakeItem(TreeItem):
+    # extra holds the values of registered extension columns, or None for the many takes that have none
+    __slots__ = ('take', 'timecode', 'duration', 'rate', 'status', 'notes', 'extra')
+
+    COLUMN_GETTERS = {
+        **TreeItem.COLUMN_GETTERS,
+        'Sequence': lambda item: item.parentItem.parentItem.sequence,
+        'Slate': lambda item: item.parentItem.slate,
+        'Take': attrgetter('take'),
+        'Timecode': attrgetter('timecode'),
+        'Duration': attrgetter('duration'),
+        'Rate': attrgetter('rate'),
+        'Status': attrgetter('status'),
+        'Notes': attrgetter('notes'),
+    }
+
+    # Columns that can be written back to a take, mapped to the slot holding them
+    COLUMN_ATTRIBUTES = {
+        'Timecode': 'timecode',
+        'Duration': 'duration',
+        'Rate': 'rate',
+        'Status': 'status',
+        'Notes': 'notes',
+    }
+
+    def __init__(self, slate_parent, take, timecode, duration, rate, status, notes, extra=None):
+        self.parentItem = slate_parent
+        self.childItems = NO_CHILDREN
+        self.childLookup = NO_CHILD_LOOKUP
+        self.rowNumber = 0
+        self.dirty = False
+        self.rowCache = None
+        self.take = take
+        self.timecode = timecode
+        # Frame counts at rate, formatted as timecodes only for display and csv
+        self.duration = duration
+        self.rate = rate
+        self.status = intern_status(status)
+        self.notes = notes
+        self.extra = extra or None
+    
+    def displayName(self):
+        return self.take
+
+    def data(self, column):
+        getter = self.COLUMN_GETTERS.get(column)
+        if getter:
+            return getter(self)
+        return self.extra.get(column) if self.extra else None
+
+    def key(self):
+        return self.take
+    
+    def type(self):
+        return "🎞️ Take"
+
+    def displayData(self, column):
+        if column == 'Timecode':
+            return frames_to_timecode(self.timecode, self.rate)
+        if column == 'Duration':
+            return frames_to_timecode(self.duration, self.rate)
+        return self.data(column)
+    
+    def setNotes(self, notes):
+        self.notes = notes
+        self.rowCache = None
+
+    def setStatus(self, status):
+        self.status = intern_status(status)
+        self.rowCache = None
+
+    def setColumn(self, column, value):
+        if column == 'Status':
+            value = intern_status(value)
+        attribute = TakeItem.COLUMN_ATTRIBUTES.get(column)
+        if attribute:
+            setattr(self, attribute, value)
+        else:
+            self.setExtra(column, value)
+        self.rowCache = None
+
+    def setExtra(self, column, value):
+        ''' Sets a registered extension column. Empty values are dropped, so the take only stores what it has '''
+        value = TAKE_COLUMNS.columns[column].parse(value)
+        if value is not None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[column] = value
+        elif self.extra:
+            self.extra.pop(column, None)
+            if not self.extra:
+                self.extra = None
+
+    def toDict(self):
+        return {
+            'Take': self.take,
+            'Timecode': self.timecode,
+            'Duration': self.duration,
+            'Rate': self.rate,
+            'Status': self.status,
+            'Notes': self.notes,
+            **(self.extra or NO_EXTRA)
+        }
+
+    def toRow(self):
+        ''' Returns a standalone csv row for this take, including its slate and sequence '''
+        slate_item = self.parentItem
+        return {
+            'Sequence': slate_item.parentItem.sequence,
+            'Slate': slate_item.slate,
+            **self.toDict()
+        }
+    
+    def iterRows(self):
+        yield self.toRow()
+
+
+class SlateItem(TreeItem):
+    __slots__ = ('slate', 'fetched')
+
+    COLUMN_GETTERS = {
+        **TreeItem.COLUMN_GETTERS,
+        'Sequence': lambda item: item.parentItem.sequence,
+        'Slate': attrgetter('slate'),
+    }
+
+    def __init__(self, sequence_parent, slate, fetched=True):
+        super().__init__(parent=sequence_parent)
+        self.slate = slate
+        # False while this slate's takes are still only in the backing store
+        self.fetched = fetched
+
+    def displayName(self):
+        return self.slate
+
+    def key(self):
+        return self.slate
+    
+    def type(self):
+        return "🎬 Slate"
+
+    def add_take(self, take: TakeItem):
+        self.appendRow(take)
+
+    def get_take(self, take: int):
+        return self.childByKey(take)
+    
+    def toDict(self):
+        return  {
+            "Slate": self.displayName(),
+            "Takes": [take.toDict() for take in self.childItems]
+        }
+    
+    def iterRows(self):
+        # Takes are always direct children, so build their rows here rather than one generator per take
+        sequence = self.parentItem.sequence
+        for take_item in self.childItems:
+            yield {
+                'Sequence': sequence,
+                'Slate': self.slate,
+                'Take': take_item.take,
+                'Timecode': take_item.timecode,
+                'Duration': take_item.duration,
+                'Rate': take_item.rate,
+                'Status': take_item.status,
+                'Notes': take_item.notes,
+                **(take_item.extra or NO_EXTRA)
+            }
+
+
+class SequenceItem(TreeItem):
+    __slots__ = ('sequence',)
+
+    COLUMN_GETTERS = {
+        **TreeItem.COLUMN_GETTERS,
+        'Sequence': attrgetter('sequence'),
+    }
+
+    def __init__(self, sequence, parent=None):
+        super().__init__(parent=parent)
+        self.sequence = sequence
+
+    def add_slate(self, slate: SlateItem):
+        self.appendRow(slate)
+
+    def displayName(self):
+        return self.sequence
+
+    def key(self):
+        return self.sequence
+        
+    def type(self):
+        return "🎥 Sequence"
+    
+    def get_slate(self, slate: str):
+        return self.childByKey(slate)
+    
+    def toDict(self):
+        return  {
+            "Sequence": self.displayName(),
+            "Slates": [slate.toDict() for slate in self.childItems]
+        }
+
+
+HEADER_DATA = {
+    # 'Sequence': 'Sequence for this take',
+    # 'Slate': 'Slate for this take',
+    # 'Take': 'Take number',
+    'Name': 'Name of this item',
+    'Type': 'Type of this item (sequence, slate, take)',
+    'Timecode': 'Timecode at the start of this take',
+    'Duration': 'Duration of this take',
+    'Status': 'Status flags for this take',
+    'Notes': 'Notes for this take',
+}
+
+CSV_HEADER_DATA = {
+    'Sequence': 'Sequence for this take',
+    'Slate': 'Slate for this take',
+    'Take': 'Take number',
+    'Timecode': 'Timecode at the start of this take',
+    'Duration': 'Duration of this take',
+    'Rate': 'Frame rate of the timecode and duration',
+    'Status': 'Status flags for this take',
+    'Notes': 'Notes for this take',
+}
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+class TakeColumn(object):
+    ''' A per take column registered at runtime, e.g. the lens or camera ID another device attaches to takes '''
+    __slots__ = ('name', 'value_type', 'description')
+
+    # Values are journaled and stored as json, so columns are limited to the types json has
+    VALUE_TYPES = (str, int, float, bool)
+
+    PARSERS = {
+        bool: parse_bool,
+    }
+
+    def __init__(self, name: str, value_type=None, description: str = ""):
+        TakeColumn.check_value_type(name, value_type)
+        self.name = name
+        # None keeps values as they are given, e.g. text read back from a csv column nobody registered
+        self.value_type = value_type
+        self.description = description
+
+    @staticmethod
+    def check_value_type(name: str, value_type):
+        if value_type is not None and value_type not in TakeColumn.VALUE_TYPES:
+            raise ValueError(f"Take column {name} can't hold {value_type.__name__} values, "
+                             f"only {', '.join(t.__name__ for t in TakeColumn.VALUE_TYPES)}")
+
+    def parse(self, value):
+        ''' Converts value to this column's type. Returns None for empty values '''
+        if value is None or value == "":
+            return None
+        if self.value_type is not None:
+            if type(value) is not self.value_type:
+                value = TakeColumn.PARSERS.get(self.value_type, self.value_type)(value)
+        elif not isinstance(value, TakeColumn.VALUE_TYPES):
+            # e.g. a pathlib.Path given for an untyped column
+            value = str(value)
+        if isinstance(value, str):
+            # The same camera IDs and lens names repeat on every take
+            value = sys.intern(value)
+        return value
+
+
+class TakeColumnRegistry(object):
+    ''' The extension columns takes can carry on top of CSV_HEADER_DATA, in the order they were registered.
+
+    csv_fieldnames is the union of the fixed and the registered columns. It is extended as columns are
+    registered, and stores and exports hold on to the same list, so no one has to scan takes for their
+    columns. Listeners are called with each new TakeColumn, e.g. so a model can insert the column.
+    Columns are registered from the GUI thread.
+    '''
+
+    def __init__(self):
+        self.columns = {}
+        self.csv_fieldnames = list(CSV_HEADER_DATA)
+        self.listeners = []
+
+    def register(self, name: str, value_type=None, description: str = "") -> TakeColumn:
+        ''' Registers an extension column, or returns the one already registered under name '''
+        column = self.columns.get(name)
+        if column:
+            if value_type is not None and column.value_type not in (None, value_type):
+                raise ValueError(f"Take column {name} is already registered as {column.value_type.__name__}")
+            TakeColumn.check_value_type(name, value_type)
+            column.value_type = column.value_type or value_type
+            column.description = column.description or description
+            return column
+        if name in CSV_HEADER_DATA or name in HEADER_DATA:
+            raise ValueError(f"{name} is a built in take list column")
+
+        column = self.columns[name] = TakeColumn(name, value_type, description)
+        self.csv_fieldnames.append(name)
+        logger.info(f"Registered take column {name}")
+        for listener in list(self.listeners):
+            callback = listener()
+            if callback is None:
+                self.listeners.remove(listener)
+            else:
+                callback(column)
+        return column
+
+    def ensure(self, name: str) -> TakeColumn:
+        ''' Returns the column registered under name, registering an untyped one for columns read back from disk '''
+        return self.columns.get(name) or self.register(name)
+
+    def add_listener(self, callback):
+        ''' Calls callback with every column registered from now on. Only weakly referenced, so listeners don't outlive their owners '''
+        self.listeners.append(weakref.WeakMethod(callback) if hasattr(callback, '__self__') else weakref.ref(callback))
+
+    def header_names(self) -> list:
+        return list(HEADER_DATA) + list(self.columns)
+
+    def parse_extra(self, row: dict):
+        ''' Returns the values of a row's extension columns, or None if it has none.
+
+        A value that doesn't parse as its column's type, e.g. '35mm' in an int column of a hand edited csv,
+        is kept as text rather than failing the whole load.
+        '''
+        if row.keys() <= CSV_HEADER_DATA.keys():
+            return None
+        extra = {}
+        for name in row:
+            if name in CSV_HEADER_DATA:
+                continue
+            column = self.ensure(name)
+            try:
+                value = column.parse(row[name])
+            except (TypeError, ValueError):
+                logger.warning(f"Keeping {row[name]!r} as text, it isn't a valid {column.value_type.__name__} for take column {name}")
+                value = UNTYPED_COLUMN.parse(row[name])
+            if value is not None:
+                extra[name] = value
+        return extra or None
+
+
+TAKE_COLUMNS = TakeColumnRegistry()
+UNTYPED_COLUMN = TakeColumn('')
+
+
+def register_take_column(name: str, value_type=str, description: str = "") -> TakeColumn:
+    ''' Lets devices attach their own metadata to takes, e.g. register_take_column('Lens', str, "Lens used for this take").
+
+    value_type is one of TakeColumn.VALUE_TYPES. Values of other types, like a pathlib.Path for a str column, are converted on the way in.
+    '''
+    return TAKE_COLUMNS.register(name, value_type, description)
+
+
+class TakeList(object):
+    ''' A take list without a view: the take tree plus loading, restoring and exporting it '''
+
+    def __init__(self):
+        self.rootItem = RootItem(column_names=TAKE_COLUMNS.header_names())
+
+    def clear(self):
+        self.rootItem = RootItem(column_names=TAKE_COLUMNS.header_names())
+
+    def get_sequence(self, sequence: str):
+        return self.rootItem.childByKey(sequence)
+
+    def get_slate(self, sequence: str, slate: str):
+        sequence_item = self.rootItem.childByKey(sequence)
+        if not sequence_item:
+            return None
+        return sequence_item.childByKey(slate)
+
+    def find_take(self, sequence: str, slate: str, take: int):
+        slate_item = self.get_slate(sequence, slate)
+        if not slate_item:
+            return None
+        return slate_item.childByKey(take)
+
+    def takes_between(self, start: str, end: str):
+        ''' Yields the rows of the takes starting between the start and end timecodes, inclusive '''
+        timecode_range = TimecodeRange(start, end)
+        for sequence_item in self.rootItem.childItems:
+            for slate_item in sequence_item.childItems:
+                for take_item in slate_item.childItems:
+                    if timecode_range.contains(take_item.timecode, take_item.rate):
+                        yield take_item.toRow()
+
+    def take_count(self) -> int:
+        return sum(slate_item.rowCount() for sequence_item in self.rootItem.childItems for slate_item in sequence_item.childItems)
+
+    @staticmethod
+    def create_take_item(slate_item: SlateItem, row: dict) -> TakeItem:
+        # Takes loaded from older take lists still have string timecodes
+        row = parse_timecode_columns(row)
+        # Most rows have no extension columns, so they skip the call
+        extra = None if row.keys() <= CSV_HEADER_DATA.keys() else TAKE_COLUMNS.parse_extra(row)
+        return TakeItem(slate_item, row['Take'], row.get('Timecode'), row['Duration'], row['Rate'], row.get('Status', ""), row.get('Notes', ""), extra)
+
+    def restore_take(self, row: dict):
+        ''' Adds a take read back from disk, or updates the take if it is already there '''
+        sequence_item = self.get_sequence(row['Sequence'])
+        if not sequence_item:
+            sequence_item = SequenceItem(row['Sequence'], self.rootItem)
+            self.rootItem.appendRow(sequence_item)
+
+        slate_item = sequence_item.get_slate(row['Slate'])
+        if not slate_item:
+            slate_item = SlateItem(sequence_item, row['Slate'])
+            sequence_item.appendRow(slate_item)
+
+        take_item = slate_item.get_take(row['Take'])
+        if not take_item:
+            take_item = TakeList.create_take_item(slate_item, row)
+            slate_item.appendRow(take_item)
+        else:
+            row = parse_timecode_columns(row)
+            for colname in TakeItem.COLUMN_ATTRIBUTES:
+                if colname in row:
+                    take_item.setColumn(colname, row[colname])
+            for colname in row:
+                if colname not in CSV_HEADER_DATA:
+                    TAKE_COLUMNS.ensure(colname)
+                    take_item.setColumn(colname, row[colname])
+        return take_item
+
+    def restore_slates(self, slates):
+        ''' Adds empty, unfetched slates for the given (sequence, slate) pairs '''
+        for sequence, slate in slates:
+            sequence_item = self.get_sequence(sequence)
+            if not sequence_item:
+                sequence_item = SequenceItem(sequence, self.rootItem)
+                self.rootItem.appendRow(sequence_item)
+            sequence_item.appendRow(SlateItem(sequence_item, slate, fetched=False))
+
+    def add_rows(self, rows) -> list:
+        ''' Adds the takes that aren't in the take list yet and returns their items. Takes already in it are left alone '''
+        added_takes = []
+        for row in rows:
+            if not self.find_take(row['Sequence'], row['Slate'], row['Take']):
+                added_takes.append(self.restore_take(row))
+        return added_takes
+
+    def remove_take(self, take_item: TakeItem):
+        ''' Removes a take, along with its slate and sequence if they are left empty '''
+        item = take_item
+        while item is not self.rootItem:
+            parent_item = item.parentItem
+            parent_item.removeRow(item.row())
+            if parent_item.childItems:
+                return
+            item = parent_item
+
+    def apply_records(self, records):
+        ''' Replays journal records on top of the take list '''
+        for record in records:
+            op = record.get('op')
+            if op == TakeListJournal.OP_TAKE:
+                self.restore_take(record['row'])
+            elif op == TakeListJournal.OP_EDIT:
+                take_item = self.find_take(*record['key'])
+                if take_item:
+                    if record['column'] not in TakeItem.COLUMN_ATTRIBUTES:
+                        TAKE_COLUMNS.ensure(record['column'])
+                    take_item.setColumn(record['column'], record['value'])
+            elif op == TakeListJournal.OP_REMOVE:
+                take_item = self.find_take(*record['key'])
+                if take_item:
+                    self.remove_take(take_item)
+
+    def restore(self, store):
+        ''' Rebuilds the take list from a TakeListJournal or TakeListSQLiteStore '''
+        self.clear()
+        for row in store.read_snapshot():
+            self.restore_take(row)
+        self.apply_records(store.read_records())
+
+    def load(self, path: pathlib.Path) -> list:
+        ''' Merges the takes from a take list csv or json file. Returns the new takes '''
+        return self.add_rows(read_takelist(path))
+
+    def iterRows(self):
+        return self.rootItem.iterRows()
+
+    def toDict(self) -> dict:
+        return self.rootItem.toDict()
+
+    def export_csv(self, path: pathlib.Path):
+        write_takelist_csv(path, self.rootItem.iterRows(), TAKE_COLUMNS.csv_fieldnames)
+
+    def export_json(self, path: pathlib.Path):
+        write_takelist_json(path, self.rootItem.toDict())
@@ -0,0 +1,171 @@
+''' Flattening of nested metadata into csv columns.
+
+Nested dicts and lists become one column per leaf, named by joining the keys and
+list indices on the way to it, e.g. {'lens': {'focal': 35}, 'files': ['a']} becomes
+{'lens_focal': 35, 'files_0': 'a'}. Columns come out in the order they appear in
+the record, so exports have the same column order every time.
+
+Metadata from a device mostly has the same shape on every take, so a
+FlattenSchema can be compiled from the first record and turned into a function
+that reads every leaf of a later record directly, without walking it or building
+any key strings. Records of a different shape get a schema of their own, and the
+schemas are kept by the record's top level keys, so a stream that alternates
+between a few shapes compiles each of them once. Streams with more shapes than
+are worth compiling fall back to flatten_dict.
+'''
+import itertools
+
+DEFAULT_SEPARATOR = '_'
+
+
+def flatten_dict(d: dict, parent_key: str = '', sep: str = DEFAULT_SEPARATOR) -> dict:
+    ''' Flattens one record, depth first and in insertion order, without recursing '''
+    flat = {}
+    # Each level keeps its own iterator, so a nested container is finished before its parent's next key
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = f"{prefix}{sep}{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((key, iter(v.items())))
+                break
+            if isinstance(v, list):
+                stack.append((key, enumerate(v)))
+                break
+            flat[key] = v
+        else:
+            stack.pop()
+    return flat
+
+
+def literal(value) -> bool:
+    ''' Whether value can be written into generated code as its repr '''
+    return type(value) in (str, int)
+
+
+class FlattenSchema(object):
+    ''' The columns of one record shape, compiled into a function that flattens records of that shape.
+
+    The compiled function checks the type and size of every dict and list it walks through, and
+    returns None when a record doesn't match. A leaf that turns into a dict or list is only noticed
+    when that changes the size of its parent, so FlattenSchema.flatten also checks the leaves unless
+    the caller knows the shape is fixed.
+    '''
+
+    def __init__(self, record: dict, parent_key: str = '', sep: str = DEFAULT_SEPARATOR):
+        self.parent_key = parent_key
+        self.sep = sep
+        # (container variable, key, column name) per leaf, and (variable, parent variable, key, type, size) per container
+        leaves = []
+        containers = []
+        stack = [(parent_key, 'c0', iter(record.items()))]
+        containers.append(('c0', None, None, dict, len(record)))
+        variables = itertools.count(1)
+        while stack:
+            prefix, variable, items = stack[-1]
+            for k, v in items:
+                key = f"{prefix}{sep}{k}" if prefix else k
+                if isinstance(v, (dict, list)):
+                    child = f"c{next(variables)}"
+                    containers.append((child, variable, k, type(v), len(v)))
+                    stack.append((key, child, iter(v.items()) if isinstance(v, dict) else enumerate(v)))
+                    break
+                leaves.append((variable, k, key))
+            else:
+                stack.pop()
+
+        self.fieldnames = [key for _, _, key in leaves]
+        self.function = self.compile(containers, leaves)
+
+    @staticmethod
+    def compile(containers, leaves):
+        # Keys that can't be written as literals, and the container types, are passed in as names instead
+        namespace = {}
+        def name_for(value):
+            if literal(value):
+                return repr(value)
+            name = f"k{len(namespace)}"
+            namespace[name] = value
+            return name
+
+        lines = ["def flatten(c0):"]
+        checks = []
+        for variable, parent, key, container_type, size in containers:
+            if parent is not None:
+                lines.append(f"    {variable} = {parent}[{name_for(key)}]")
+            checks.append(f"type({variable}) is not {name_for(container_type)} or len({variable}) != {size}")
+        lines.append(f"    if {' or '.join(checks)}:")
+        lines.append("        return None")
+        columns = ", ".join(f"{name_for(key)}: {variable}[{name_for(k)}]" for variable, k, key in leaves)
+        lines.append(f"    return {{{columns}}}")
+
+        exec(compile("\n".join(lines), "<FlattenSchema>", "exec"), namespace)
+        return namespace['flatten']
+
+    def flatten(self, record: dict, check_leaves: bool = True):
+        ''' Returns the flattened record, or None if it doesn't have this schema's shape '''
+        try:
+            flat = self.function(record)
+        except (KeyError, IndexError, TypeError):
+            return None
+        if flat is not None and check_leaves:
+            for value in flat.values():
+                if isinstance(value, (dict, list)):
+                    return None
+        return flat
+
+
+class Flattener(object):
+    ''' Flattens a stream of records, reusing the schemas compiled for the shapes seen so far.
+
+    Schemas are kept per tuple of top level keys, most recently used first, which is cheap to look
+    up and tells most shapes apart. Once MAX_SCHEMAS have been compiled, or MAX_SCHEMAS_PER_KEYS share
+    the same top level keys, records of a new shape are flattened with flatten_dict instead.
+
+    fieldnames collects the columns of every record flattened so far, in the order they first appeared.
+    '''
+
+    MAX_SCHEMAS = 64
+    MAX_SCHEMAS_PER_KEYS = 8
+
+    def __init__(self, parent_key: str = '', sep: str = DEFAULT_SEPARATOR, check_leaves: bool = True):
+        self.parent_key = parent_key
+        self.sep = sep
+        self.check_leaves = check_leaves
+        # {tuple of top level keys: [FlattenSchema, ...]}
+        self.schemas = {}
+        self.columns = {}
+        self.schemas_compiled = 0
+
+    @property
+    def fieldnames(self) -> list:
+        return list(self.columns)
+
+    def flatten(self, record: dict) -> dict:
+        keys = tuple(record)
+        schemas = self.schemas.get(keys, [])
+        for i, schema in enumerate(schemas):
+            flat = schema.flatten(record, self.check_leaves)
+            if flat is not None:
+                if i:
+                    schemas.insert(0, schemas.pop(i))
+                return flat
+
+        if self.schemas_compiled >= Flattener.MAX_SCHEMAS or len(schemas) >= Flattener.MAX_SCHEMAS_PER_KEYS:
+            flat = flatten_dict(record, self.parent_key, self.sep)
+            self.columns.update(dict.fromkeys(flat))
+            return flat
+
+        schema = FlattenSchema(record, self.parent_key, self.sep)
+        self.schemas[keys] = [schema] + schemas
+        self.schemas_compiled += 1
+        self.columns.update(dict.fromkeys(schema.fieldnames))
+        return schema.function(record)
+
+
+def flatten_records(records, parent_key: str = '', sep: str = DEFAULT_SEPARATOR) -> tuple:
+    ''' Flattens records for a csv writer. Returns the union of their columns, in first seen order, and the flattened rows '''
+    flattener = Flattener(parent_key, sep)
+    rows = [flattener.flatten(record) for record in records]
+    return flattener.fieldnames, rows
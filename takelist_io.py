@@ -0,0 +1,171 @@
+from .takelist_timecode import format_timecode_rows, parse_timecode_columns, parse_timecode_rows
+from itertools import groupby, islice
+from operator import itemgetter
+import csv, json, os, pathlib
+
+# Rows are converted to and from csv this many at a time, so timecodes are converted a column at a time
+CSV_CHUNK_SIZE = 4096
+
+# Columnar take lists are json lines: a header naming the columns, then one line of column arrays per chunk of rows
+COLUMNS_SUFFIX = '.jsonl'
+
+
+def parse_take(row: dict) -> dict:
+    try:
+        row['Take'] = int(row['Take'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return row
+
+
+def parse_row(row: dict) -> dict:
+    ''' Converts the string values read back from csv into the types the model uses '''
+    return parse_timecode_columns(parse_take(row))
+
+
+def read_takelist_csv(path: pathlib.Path):
+    ''' Streams the rows of a take list csv written by TakeListModel.save_data '''
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if not header:
+            return
+
+        # Plain csv.reader plus zip is a good deal faster than csv.DictReader on large files
+        while True:
+            chunk = list(islice(reader, CSV_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield from parse_timecode_rows([parse_take(dict(zip(header, values))) for values in chunk if values])
+
+
+def staging_path(path: pathlib.Path) -> pathlib.Path:
+    ''' Where a file is written before it atomically replaces path '''
+    return path.with_name(path.name + '.tmp')
+
+
+def stage_takelist_csv(path: pathlib.Path, rows, fieldnames) -> pathlib.Path:
+    ''' Writes a take list csv holding the given rows next to path, with their frame counts written as timecodes.
+    Returns the staged file, for the caller to os.replace over path '''
+    tmp_path = staging_path(pathlib.Path(path))
+    rows = iter(rows)
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        while True:
+            chunk = list(islice(rows, CSV_CHUNK_SIZE))
+            if not chunk:
+                break
+            writer.writerows(format_timecode_rows(chunk))
+    return tmp_path
+
+
+def write_takelist_csv(path: pathlib.Path, rows, fieldnames):
+    ''' Atomically replaces path with a take list csv holding the given rows, with their frame counts written as timecodes '''
+    os.replace(stage_takelist_csv(path, rows, fieldnames), path)
+
+
+def read_takelist_json(path: pathlib.Path):
+    ''' Yields the rows of a take list saved in the nested form produced by TreeItem.toDict '''
+    with open(path, 'r', encoding='utf-8') as jsonfile:
+        takelist = json.load(jsonfile)
+
+    for sequence in takelist.get("Children", []):
+        for slate in sequence.get("Slates", []):
+            for take in slate.get("Takes", []):
+                yield parse_timecode_columns({
+                    'Sequence': sequence["Sequence"],
+                    'Slate': slate["Slate"],
+                    **take
+                })
+
+
+def rows_to_takelist_dict(rows) -> dict:
+    ''' Nests flat take rows into the form produced by TreeItem.toDict '''
+    sequences = {}
+    for row in rows:
+        slates = sequences.setdefault(row['Sequence'], {})
+        take = {column: value for column, value in row.items() if column not in ('Sequence', 'Slate')}
+        slates.setdefault(row['Slate'], []).append(take)
+
+    return {
+        "Children": [
+            {
+                "Sequence": sequence,
+                "Slates": [{"Slate": slate, "Takes": takes} for slate, takes in slates.items()]
+            }
+            for sequence, slates in sequences.items()
+        ]
+    }
+
+
+def read_takelist_columns(path: pathlib.Path):
+    ''' Streams the rows of a columnar take list written by write_takelist_columns '''
+    with open(path, 'r', encoding='utf-8') as columnsfile:
+        header = json.loads(next(columnsfile, 'null'))
+        if not header:
+            return
+        fieldnames = header['fieldnames']
+        for line in columnsfile:
+            columns = json.loads(line)
+            for values in zip(*(columns[fieldname] for fieldname in fieldnames)):
+                yield dict(zip(fieldnames, values))
+
+
+def read_takelist(path: pathlib.Path):
+    ''' Yields the rows of a take list, in csv, json or columnar form depending on the file suffix '''
+    path = pathlib.Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.json':
+        return read_takelist_json(path)
+    if suffix == COLUMNS_SUFFIX:
+        return read_takelist_columns(path)
+    return read_takelist_csv(path)
+
+
+def write_takelist_json(path: pathlib.Path, takelist: dict):
+    with open(path, 'w', encoding='utf-8') as jsonfile:
+        json.dump(takelist, jsonfile, indent=1)
+
+
+def write_takelist_json_rows(path: pathlib.Path, rows):
+    ''' Streams rows into a take list json file in the nested form produced by TreeItem.toDict.
+
+    Unlike rows_to_takelist_dict, the rows of each sequence and slate have to be next to each
+    other, e.g. sorted, but they are never all held in memory at once.
+    '''
+    path = pathlib.Path(path)
+    tmp_path = staging_path(path)
+    with open(tmp_path, 'w', encoding='utf-8') as jsonfile:
+        jsonfile.write('{"Children": [')
+        for sequence_number, (sequence, sequence_rows) in enumerate(groupby(rows, itemgetter('Sequence'))):
+            jsonfile.write(f'{"," if sequence_number else ""}\n {{"Sequence": {json.dumps(sequence)}, "Slates": [')
+            for slate_number, (slate, slate_rows) in enumerate(groupby(sequence_rows, itemgetter('Slate'))):
+                jsonfile.write(f'{"," if slate_number else ""}\n  {{"Slate": {json.dumps(slate)}, "Takes": [')
+                for take_number, row in enumerate(slate_rows):
+                    take = {column: value for column, value in row.items() if column not in ('Sequence', 'Slate')}
+                    jsonfile.write(f'{"," if take_number else ""}\n   {json.dumps(take)}')
+                jsonfile.write(']}')
+            jsonfile.write(']}')
+        jsonfile.write(']}\n')
+    os.replace(tmp_path, path)
+
+
+def write_takelist_columns(path: pathlib.Path, rows, fieldnames):
+    ''' Atomically replaces path with a columnar take list.
+
+    Values are stored a column at a time and keep their types, so timecodes stay frame
+    counts and tools can read single columns without parsing every row.
+    '''
+    path = pathlib.Path(path)
+    tmp_path = staging_path(path)
+    fieldnames = list(fieldnames)
+    rows = iter(rows)
+    with open(tmp_path, 'w', encoding='utf-8') as columnsfile:
+        columnsfile.write(json.dumps({'fieldnames': fieldnames}) + '\n')
+        while True:
+            chunk = list(islice(rows, CSV_CHUNK_SIZE))
+            if not chunk:
+                break
+            columnsfile.write(json.dumps({fieldname: [row.get(fieldname) for row in chunk] for fieldname in fieldnames}, separators=(',', ':')) + '\n')
+    os.replace(tmp_path, path)
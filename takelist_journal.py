@@ -0,0 +1,119 @@
+from .takelist_io import read_takelist_csv, stage_takelist_csv, staging_path
+import json, os, pathlib
+
+
+class TakeListJournal(object):
+    ''' Append-only delta log that sits next to the canonical take list csv.
+
+    New takes, edits and removed takes are appended as one json record per line. The csv
+    snapshot is only rewritten when the journal is compacted, after which the
+    journal starts out empty again.
+
+    Compacting moves the journal aside to a generation file just before the new
+    snapshot replaces the old one, and deletes it afterwards. If a crash leaves the
+    generation file behind, whether the staged snapshot is still there tells if the
+    snapshot was replaced, so its records are either replayed or dropped, never
+    replayed over a snapshot that already holds them.
+    '''
+
+    OP_TAKE = "take"
+    OP_EDIT = "edit"
+    OP_REMOVE = "remove"
+
+    def __init__(self, snapshot_path: pathlib.Path, journal_path: pathlib.Path, fieldnames, compact_threshold: int = 500):
+        self.snapshot_path = pathlib.Path(snapshot_path)
+        self.journal_path = pathlib.Path(journal_path)
+        self.generation_path = self.journal_path.with_name(self.journal_path.name + '.old')
+        # Kept as given rather than copied, so columns registered later still make it into the snapshot
+        self.fieldnames = fieldnames
+        self.compact_threshold = compact_threshold
+        self.record_count = 0
+
+    def append(self, record: dict):
+        self.append_many([record])
+
+    def append_many(self, records):
+        ''' Appends all records with a single write '''
+        lines = [json.dumps(record, separators=(',', ':')) + '\n' for record in records]
+        with open(self.journal_path, 'a', encoding='utf-8') as journal_file:
+            journal_file.write(''.join(lines))
+        self.record_count += len(lines)
+
+    def append_take(self, row: dict):
+        self.append(TakeListJournal.take_record(row))
+
+    def append_edit(self, sequence: str, slate: str, take: int, column: str, value):
+        self.append(TakeListJournal.edit_record(sequence, slate, take, column, value))
+
+    @staticmethod
+    def take_record(row: dict) -> dict:
+        return {'op': TakeListJournal.OP_TAKE, 'row': row}
+
+    @staticmethod
+    def remove_record(sequence: str, slate: str, take: int) -> dict:
+        return {'op': TakeListJournal.OP_REMOVE, 'key': [sequence, slate, take]}
+
+    @staticmethod
+    def edit_record(sequence: str, slate: str, take: int, column: str, value) -> dict:
+        return {
+            'op': TakeListJournal.OP_EDIT,
+            'key': [sequence, slate, take],
+            'column': column,
+            'value': value
+        }
+
+    def needs_compaction(self) -> bool:
+        return self.record_count >= self.compact_threshold
+
+    def recover(self):
+        ''' Finishes or rolls back a compaction that a crash cut short '''
+        staged_path = staging_path(self.snapshot_path)
+        if self.generation_path.exists():
+            if staged_path.exists():
+                # The old snapshot is still in place, so it needs the moved records again, ahead of any newer ones
+                if self.journal_path.exists():
+                    with open(self.journal_path, 'rb') as journal_file, open(self.generation_path, 'ab') as generation_file:
+                        generation_file.write(journal_file.read())
+                os.replace(self.generation_path, self.journal_path)
+            else:
+                # The new snapshot went in and already holds every moved record
+                self.generation_path.unlink()
+        if staged_path.exists():
+            staged_path.unlink()
+
+    def read_snapshot(self):
+        ''' Yields the rows of the csv snapshot with their types restored '''
+        self.recover()
+        if not self.snapshot_path.exists():
+            return
+
+        yield from read_takelist_csv(self.snapshot_path)
+
+    def read_records(self):
+        ''' Yields the journal records written since the last compaction '''
+        self.recover()
+        self.record_count = 0
+        if not self.journal_path.exists():
+            return
+
+        with open(self.journal_path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the end of the journal. Everything before it is still valid.
+                    return
+                self.record_count += 1
+                yield record
+
+    def compact(self, rows):
+        ''' Rewrites the csv snapshot from the given rows and empties the journal '''
+        staged_path = stage_takelist_csv(self.snapshot_path, rows, self.fieldnames)
+
+        # Only drop the journal once the snapshot that supersedes it is in place
+        if self.journal_path.exists():
+            os.replace(self.journal_path, self.generation_path)
+        os.replace(staged_path, self.snapshot_path)
+        if self.generation_path.exists():
+            self.generation_path.unlink()
+        self.record_count = 0
@@ -1,16 +1,32 @@
-from PySide2.QtCore import QAbstractTableModel, QAbstractItemModel, QModelIndex, Qt, Slot
-from PySide2.QtGui import QColor, QStandardItem
-from switchboard.config import CONFIG
-from switchboard.switchboard_logging import ConsoleStream, LOGGER
-import os, pathlib, csv
+from PySide2.QtCore import QAbstractItemModel, QCoreApplication, QModelIndex, QTimer, Qt, Signal, Slot
+from PySide2.QtGui import QColor
+from PySide2.QtWidgets import QUndoStack
+from switchboard.switchboard_logging import LOGGER
+# The tree and everything else that doesn't need Qt lives in takelist_core. Its names are
+# re-exported here so existing imports from takelist_model keep working
+from .takelist_core import (CSV_HEADER_DATA, HEADER_DATA, NO_CHILD_LOOKUP, NO_CHILDREN, TAKELIST_BACKEND_JOURNAL,
+                            TAKELIST_BACKEND_SQLITE, TAKELIST_FILE_NAME, TAKELIST_JOURNAL_FILE_NAME, TAKELIST_JSON_FILE_NAME,
+                            TAKELIST_SQLITE_FILE_NAME, TAKE_COLUMNS, RootItem, SequenceItem, SlateItem, TakeColumn, TakeItem, TakeList,
+                            TreeItem, intern_status, register_take_column)
+from .takelist_journal import TakeListJournal
+from .takelist_sqlite import TakeListSQLiteStore
+from .takelist_writer import TakeListWriter
+from .takelist_io import read_takelist, rows_to_takelist_dict, write_takelist_json
+from .takelist_timecode import DEFAULT_FRAME_RATE
+from .takelist_flatten import flatten_dict
+from .takelist_perf import PERF_STATS
+from .takelist_undo import AddTakesCommand, EditTakeCommand
+from collections import OrderedDict
+import os, pathlib
 
 TEST_DATA = [
     {
         'Sequence': 'Shot1',
         'Slate': 'Run in place',
         'Take': 1,
-        'Timecode': '00:00:00:00',
-        'Duration': 0.0,
+        'Timecode': 0,
+        'Duration': 0,
+        'Rate': DEFAULT_FRAME_RATE,
         'Status': 'G',
         'Notes': 'Good take',
     },
@@ -18,8 +34,9 @@ TEST_DATA = [
         'Sequence': 'Shot1',
         'Slate': 'Run in place',
         'Take': 2,
-        'Timecode': '00:00:00:00',
-        'Duration': 0.0,
+        'Timecode': 0,
+        'Duration': 0,
+        'Rate': DEFAULT_FRAME_RATE,
         'Status': 'NG',
         'Notes': 'Bad take',
     },
@@ -27,277 +44,128 @@ TEST_DATA = [
         'Sequence': 'Shot1',
         'Slate': 'Run in place',
         'Take': 3,
-        'Timecode': '00:00:00:00',
-        'Duration': 0.0,
+        'Timecode': 0,
+        'Duration': 0,
+        'Rate': DEFAULT_FRAME_RATE,
         'Status': 'S',
         'Notes': 'Best take',
     }
 ]
 
-TAKELIST_FILE_NAME = "takelist.csv"
-
-# def flatten_dict(d, parent_key='', sep='_'):
-#     """
-#     Flatten a nested dictionary and concatenate keys with separators.
-#     """
-#     items = []
-#     LOGGER.info(d)
-#     for k, v in d.items():
-#         new_key = f"{parent_key}{sep}{k}" if parent_key else k
-#         if isinstance(v, dict):
-#             items.extend(flatten_dict(v, new_key, sep=sep).items())
-#         else:
-#             items.append((new_key, v))
-#     return dict(items)
-
-# def flatten_dict_list(dict_list):
-#     """
-#     Flatten a list of dictionaries and create headers for each nested dictionary.
-#     """
-#     flat_list = [flatten_dict(val) for key,val in dict_list.items()]
-#     headers = set(key for item in flat_list for key in item.keys())
-#     return headers, [[item.get(header, '') for header in headers] for item in flat_list]
-
-def flatten_dict(d, parent_key='', sep='_'):
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            for i, item in enumerate(v):
-                item_key = f"{new_key}{sep}{i}"
-                items.extend(flatten_dict({item_key: item}, sep=sep).items())
-        else:
-            items.append((new_key, v))
-    return dict(items)
-
-
-class TreeItem(object):
-    def __init__(self, data, column_names=[], parent=None):
-        self.parentItem = parent
-        self.itemData = data
-        self.childItems = []
-        self.column_names = column_names
-
-    def appendRow(self, item):
-        self.childItems.append(item)
-
-    def child(self, row):
-        return self.childItems[row]
-
-    def rowCount(self):
-        return len(self.childItems)
-
-    def columnCount(self):
-        if self.parent():
-            return self.parent().columnCount()
-        return len(self.column_names)
-
-    def data(self, column):
-        if column == "Name":
-            return self.displayName()
-        
-        if column == "Type":
-            return self.type()
-
-        try:
-            return self.itemData[column]
-        except KeyError:
-            if self.parent():
-                return self.parent().data(column)
-        return None
-
-    def parent(self):
-        return self.parentItem
-
-    def row(self):
-        if self.parentItem:
-            return self.parentItem.childItems.index(self)
-        LOGGER.info(f"{self} hasa no parent. Returning 0 for row")
-        return 0
-    
-    def displayName(self):
-        return ""
-    
-    def type(self):
-        return "Root"
-    
-    def toDict(self):
-        return {
-            "Children": [child.toDict() for child in self.childItems]    
-        }
-    
-    def flatten(self):
-        flattened_children = []
-        for child in self.childItems:
-            flattened_children += child.flatten()
-        return flattened_children
-
-
-
-class TakeItem(TreeItem):
-    def __init__(self, slate_parent, take, timecode, duration, status, notes):
-        take_data = {
-            'Take': take,
-            'Timecode': timecode,
-            'Duration': duration,
-            'Status': status,
-            'Notes': notes
-        }
-        super().__init__(data=take_data, parent=slate_parent)
-    
-    def displayName(self):
-        return self.data("Take")
-    
-    def type(self):
-        return "🎞️ Take"
-    
-    def setNotes(self, notes):
-        self.itemData["Notes"] = notes
-
-    def setStatus(self, status):
-        self.itemData["Status"] = status
-
-    def toDict(self):
-        return self.itemData
-    
-    def flatten(self):
-        return self.itemData
-
-
-class SlateItem(TreeItem):
-    def __init__(self, sequence_parent, slate):
-        slate_data = {
-            'Slate': slate
-        }
-        super().__init__(data=slate_data, parent=sequence_parent)
-        # self.slate = slate
-        # self.takes = []
-
-    def displayName(self):
-        return self.data("Slate")
-    
-    def type(self):
-        return "🎬 Slate"
-
-    def add_take(self, take: TakeItem):
-        self.appendRow(take)
-
-    def get_take(self, take: int):
-        for row in range(self.rowCount()):
-            if take == self.child(row).data("Take"):
-                return self.child(row)
-        return None
-    
-    def toDict(self):
-        return  {
-            "Slate": self.displayName(),
-            "Takes": [take.toDict() for take in self.childItems]
-        }
-    
-    def flatten(self):
-        flattened_children = []
-        for child in self.childItems:
-            flattened = child.flatten()
-            flattened["Slate"] = self.displayName()
-            flattened_children.append(flattened)
-        return flattened_children
-
-
-class SequenceItem(TreeItem):
-    def __init__(self, sequence, parent=None):
-        sequence_data = {
-            'Sequence': sequence
-        }
-        super().__init__(data=sequence_data, parent=parent)
-
-    def add_slate(self, slate: SlateItem):
-        self.appendRow(slate)
-
-    def displayName(self):
-        return self.data("Sequence")
-        
-    def type(self):
-        return "🎥 Sequence"
-    
-    def get_slate(self, slate: str):
-        for row in range(self.rowCount()):
-            if slate == self.child(row).data("Slate"):
-                return self.child(row)
-        return None
-    
-    def toDict(self):
-        return  {
-            "Sequence": self.displayName(),
-            "Slates": [slate.toDict() for slate in self.childItems]
-        }
-    
-    def flatten(self):
-        flattened_children = []
-        for child in self.childItems:
-            flattened = child.flatten()
-            LOGGER.info(f"Flattened slate row: {flattened}")
-  
-            for flattened_child in flattened:
-                flattened_child["Sequence"] = self.displayName()
-                LOGGER.info(f"Current flattened child is {flattened_child}")
-                flattened_children.append(flattened_child)
-        LOGGER.info(f"Flattened sequence row: {flattened_children}")
-        return flattened_children
-
-
-
-HEADER_DATA = {
-    # 'Sequence': 'Sequence for this take',
-    # 'Slate': 'Slate for this take',
-    # 'Take': 'Take number',
-    'Name': 'Name of this item',
-    'Type': 'Type of this item (sequence, slate, take)',
-    'Timecode': 'Timecode at the start of this take',
-    'Duration': 'Duration of this take',
-    'Status': 'Status flags for this take',
-    'Notes': 'Notes for this take',
-}
-
-CSV_HEADER_DATA = {
-    'Sequence': 'Sequence for this take',
-    'Slate': 'Slate for this take',
-    'Take': 'Take number',
-    'Timecode': 'Timecode at the start of this take',
-    'Duration': 'Duration of this take',
-    'Status': 'Status flags for this take',
-    'Notes': 'Notes for this take',
-}
 
 class TakeListModel(QAbstractItemModel):
+    # Emitted with the new TakeItems whenever takes are added, with the (sequence, slate, take) keys of
+    # removed takes, and with a TakeItem and column name whenever a take is edited, so other stations
+    # can be told about the change
+    takes_added = Signal(list)
+    takes_removed = Signal(list)
+    take_edited = Signal(object, str)
+
     COLOR_BEST = QColor(0x0d,0x81,0x0d)
     COLOR_GOOD = QColor(0x27,0x66,0xb8)
     COLOR_NORMAL = QColor(0x3d, 0x3d, 0x3d)
     COLOR_BAD = QColor(0xb8,0x27,0x27)
+    COLOR_STATUS_TEXT = QColor(0xff, 0xff, 0xff)
 
-    def __init__(self, parent):
+    # Status cell colors and tooltips, looked up once per row when its cache is built
+    STATUS_COLORS = {
+        'S': COLOR_BEST,
+        'G': COLOR_GOOD,
+        'NG': COLOR_BAD,
+    }
+    STATUS_TOOLTIPS = {
+        'S': 'Best take',
+        'G': 'Good take',
+        'NG': 'No good',
+    }
+
+    # Changes made within this many milliseconds of each other are saved with a single write
+    AUTOSAVE_DELAY_MS = 1000
+    # How many slates can have their takes loaded at once when the model is lazy
+    FETCHED_SLATE_BUDGET = 64
+    # How often the perf stats summary is logged while perf stats are enabled
+    PERF_STATS_INTERVAL_MS = 10000
+    # How many edits and added takes can be undone. The oldest are dropped beyond that
+    UNDO_LIMIT = 500
+
+    def __init__(self, parent, persistent: bool = True, autosave_delay_ms: int = AUTOSAVE_DELAY_MS, backend: str = TAKELIST_BACKEND_JOURNAL, lazy: bool = False, undo_limit: int = UNDO_LIMIT):
         QAbstractItemModel.__init__(self, parent)
+
+        if lazy and backend != TAKELIST_BACKEND_SQLITE:
+            raise ValueError("Lazy loading needs the sqlite backend to fetch takes from")
        
         #self._data = []#TEST_DATA
-        self.colnames = list(HEADER_DATA.keys())
-        self.tooltips = list(HEADER_DATA.values())
-        self.rootItem = TreeItem({}, column_names=HEADER_DATA.keys())
-
-        self.dataChanged.connect(self.save_data)
+        self.colnames = TAKE_COLUMNS.header_names()
+        self.tooltips = list(HEADER_DATA.values()) + [column.description for column in TAKE_COLUMNS.columns.values()]
+        self.takelist = TakeList()
+        # Extension columns registered from now on are inserted as they come, see on_take_column_registered
+        TAKE_COLUMNS.add_listener(self.on_take_column_registered)
+        self.resetting = False
+
+        # Edits are appended to the store as they happen instead of rewriting the whole csv
+        self.backend = backend
+        self.store = None
+
+        # Lazy models only load a slate's takes once it is expanded. Fetched slates are kept in least
+        # recently used order, mapped to whether the view has collapsed them and they may be evicted
+        self.lazy = lazy
+        self.fetched_slates = OrderedDict()
+        self.fetched_slate_budget = TakeListModel.FETCHED_SLATE_BUDGET
+        # Journal and snapshot writes happen on this writer's thread, off the GUI thread
+        self.writer = None
+        # Models that aren't persistent never touch the project directory, e.g. in benchmarks
+        self.persistent = persistent
+
+        # Takes added since the last save, and the cells edited since then as {(key, column): value}.
+        # New takes are journaled as whole rows and edits as small edit records once the autosave timer runs out
+        self.dirty_takes = []
+        self.dirty_edits = {}
+        self.saves_requested = 0
+        self.saves_performed = 0
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(autosave_delay_ms)
+        self.autosave_timer.timeout.connect(self.save_dirty_takes)
+
+        # Every edit and every batch of added takes is a small command on this stack, see takelist_undo
+        self.undo_stack = QUndoStack(self)
+        self.undo_stack.setUndoLimit(undo_limit)
+
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.flush)
+
+        self.perf_stats_timer = QTimer(self)
+        self.perf_stats_timer.timeout.connect(self.log_perf_stats)
 
     # ~ QAbstractTableModel interface begin
 
+    @property
+    def rootItem(self) -> RootItem:
+        return self.takelist.rootItem
+
     def get_sequence(self, sequence: str):
-        for row in range(self.rootItem.rowCount()):
-            if sequence == self.rootItem.child(row).data("Sequence"):
-                return self.rootItem.child(row)
-        return None
+        return self.takelist.get_sequence(sequence)
+
+    def get_slate(self, sequence: str, slate: str):
+        return self.takelist.get_slate(sequence, slate)
+
+    def find_take(self, sequence: str, slate: str, take: int):
+        return self.takelist.find_take(sequence, slate, take)
+
+    def takes_between(self, start: str, end: str):
+        ''' Yields the rows of the takes starting between the start and end timecodes, inclusive '''
+        if self.lazy:
+            self.flush()
+            yield from self.get_store().query(timecode_between=(start, end))
+            return
+        yield from self.takelist.takes_between(start, end)
 
     def rowCount(self, parent=QModelIndex()):
-        # if parent.column() > 0:
-        #     return 0
-        
+        # Only the first column has children, like QTreeView expects
+        if parent.column() > 0:
+            return 0
+
         if not parent.isValid():
             parentItem = self.rootItem
         else:
@@ -310,20 +178,100 @@ class TakeListModel(QAbstractItemModel):
         # return len(self.devicedatas)
 
     def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
         if not parent.isValid():
             parentItem = self.rootItem
         else:
             parentItem = parent.internalPointer()
         
         # LOGGER.info(f"Requesting hasChildren for parent {parentItem}. Row count is {parentItem.rowCount()}")
+        if isinstance(parentItem, SlateItem) and not parentItem.fetched:
+            return True
         return parentItem.rowCount() > 0
 
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if not parent.isValid():
+            return False
+        item = parent.internalPointer()
+        return isinstance(item, SlateItem) and not item.fetched
+
+    def fetchMore(self, parent: QModelIndex):
+        if self.canFetchMore(parent):
+            self.fetch_slate(parent.internalPointer())
+
+    def fetch_slate(self, slate_item: SlateItem):
+        ''' Materializes a slate's takes from the backing store '''
+        store = self.get_store()
+        # Edits of takes evicted earlier, and everything handed to the writer, must be in the store before reading them back
+        if self.dirty_edits:
+            self.save_dirty_takes()
+        self.writer.flush()
+        take_items = [self.create_take_item(slate_item, row) for row in store.query(sequence=slate_item.parentItem.sequence, slate=slate_item.slate)]
+
+        slate_item.fetched = True
+        self.insert_items(slate_item, take_items)
+        self.fetched_slates[slate_item] = False
+        self.evict_slates()
+
+    def evict_slates(self):
+        ''' Drops the takes of the least recently used collapsed slates until the fetch budget is met '''
+        for slate_item, evictable in list(self.fetched_slates.items()):
+            if len(self.fetched_slates) <= self.fetched_slate_budget:
+                return
+            if not evictable or self.has_unsaved_changes(slate_item):
+                continue
+
+            del self.fetched_slates[slate_item]
+            if slate_item.rowCount():
+                self.beginRemoveRows(self.createIndex(slate_item.row(), 0, slate_item), 0, slate_item.rowCount() - 1)
+                slate_item.clearRows()
+                self.endRemoveRows()
+            slate_item.fetched = False
+
+    def has_unsaved_changes(self, slate_item: SlateItem) -> bool:
+        ''' Whether any take of the slate has changes that haven't been handed to the writer yet '''
+        if any(take_item.dirty for take_item in slate_item.childItems):
+            return True
+        slate_key = (slate_item.parentItem.sequence, slate_item.slate)
+        return any(key[:2] == slate_key for key, _ in self.dirty_edits)
+
+    def slate_expanded(self, index: QModelIndex):
+        item = index.internalPointer() if index.isValid() else None
+        if item in self.fetched_slates:
+            self.fetched_slates[item] = False
+            self.fetched_slates.move_to_end(item)
+
+    def slate_collapsed(self, index: QModelIndex):
+        item = index.internalPointer() if index.isValid() else None
+        if item in self.fetched_slates:
+            self.fetched_slates[item] = True
+            self.evict_slates()
+
     def columnCount(self, parent=QModelIndex()):
         if parent and parent.isValid():
             return parent.internalPointer().columnCount()
         else:
             return len(self.colnames)
 
+    def on_take_column_registered(self, column: TakeColumn):
+        ''' Appends a newly registered extension column without resetting the model '''
+        first_column = len(self.colnames)
+        if not self.resetting:
+            self.beginInsertColumns(QModelIndex(), first_column, first_column)
+        self.colnames.append(column.name)
+        self.tooltips.append(column.description)
+        self.rootItem.column_names.append(column.name)
+        # Cached rows only hold the columns there were when they were built
+        for sequence_item in self.rootItem.childItems:
+            sequence_item.rowCache = None
+            for slate_item in sequence_item.childItems:
+                slate_item.rowCache = None
+                for take_item in slate_item.childItems:
+                    take_item.rowCache = None
+        if not self.resetting:
+            self.endInsertColumns()
+
     def headerData(self, column, orientation, role):
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
@@ -338,18 +286,29 @@ class TakeListModel(QAbstractItemModel):
 
         return None
     
-    def findChildRowIndex(self, sequence: str, slate: str, take: int):
-        sequence_item = self.get_sequence(sequence)
-        if not sequence_item:
-            return None
-        slate_item = sequence_item.get_slate(slate)
-        if not slate_item:
-            return None
-        for row in range(slate_item.rowCount()):
-            if take == slate_item.child(row).data("Take"):
-                self.createIndex(row, 0, row)
-        return None
+    def path_for_index(self, index: QModelIndex) -> tuple:
+        ''' Returns a stable id for an index: (), (sequence,), (sequence, slate) or (sequence, slate, take) '''
+        if not index.isValid():
+            return ()
+        return index.internalPointer().keyPath()
+
+    def index_for_path(self, path: tuple) -> QModelIndex:
+        item = self.rootItem
+        for key in path:
+            item = item.childByKey(key)
+            if not item:
+                return QModelIndex()
+        if item is self.rootItem:
+            return QModelIndex()
+        return self.createIndex(item.row(), 0, item)
+
+    def findChildRowIndex(self, sequence: str, slate: str, take: int) -> QModelIndex:
+        take_item = self.find_take(sequence, slate, take)
+        if not take_item:
+            return QModelIndex()
+        return self.createIndex(take_item.row(), 0, take_item)
 
+    @PERF_STATS.timed("index")
     def index(self, row, column, parent):            
         #LOGGER.info(f"Requesting tree index for row  {row}, col {self.colnames[column]}")                
         if not self.hasIndex(row, column, parent):
@@ -367,6 +326,7 @@ class TakeListModel(QAbstractItemModel):
         else:
             return QModelIndex()
 
+    @PERF_STATS.timed("parent")
     def parent(self, index):
         # LOGGER.info(f"Requesting parent index for index{index}")                
 
@@ -391,6 +351,8 @@ class TakeListModel(QAbstractItemModel):
         return parent_index
 
     def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.NoItemFlags
         column = index.column()
         row = index.row()
         colname = self.colnames[column]
@@ -398,57 +360,169 @@ class TakeListModel(QAbstractItemModel):
             return Qt.ItemIsEditable | Qt.ItemIsSelectable | Qt.ItemIsEnabled
         return Qt.ItemIsEnabled
 
-    def add_take(self, sequence: str, slate:str, take: int, description: str, quality: str, timecode: str):
-        # self._data.append({
-        #     'Sequence': sequence,
-        #     'Slate': slate,   
-        #     'Take': take,
-        #     'Timecode': timecode,
-        #     'Duration': 0.0,
-        #     'Status': 'G',
-        #     'Notes': description
-        # })
-        root_index = self.createIndex(0, 0, self.rootItem)
-        sequence_item = self.get_sequence(sequence)
-
-        if not sequence_item:
-            sequence_item = SequenceItem(sequence, self.rootItem)
-            sequence_index = self.createIndex(self.rootItem.row(), 0, self.rootItem)
-            self.beginInsertRows(sequence_index, self.rootItem.rowCount(), self.rootItem.rowCount()+1)
-            self.rootItem.appendRow(sequence_item)
-            self.endInsertRows()
-            #self.dataChanged.emit(sequence_index, sequence_index, sequence_item)
-            LOGGER.info(f"Adding sequence {sequence}")                
-
-        slate_item = sequence_item.get_slate(slate)
-        if not slate_item:
-            slate_item = SlateItem(sequence_item, slate)
-            slate_index = self.createIndex(sequence_item.row(), 0, slate_item)
-            self.beginInsertRows(slate_index, sequence_item.rowCount(), sequence_item.rowCount()+1)
-            sequence_item.appendRow(slate_item)
-            self.endInsertRows()
-            #self.dataChanged.emit(slate_index, slate_index, slate_item)
-            LOGGER.info(f"Adding slate {slate}")                
-
-        take_item = slate_item.get_take(take)
-        if not take_item:
-            self.layoutAboutToBeChanged.emit()
-            take_item = TakeItem(slate_item, take, timecode, 0, "", description)
-            slate_index = self.createIndex(slate_item.row(), 0, slate_item)
-            # LOGGER.info(f"Slate index {slate_index}. RowCount {slate_item.rowCount()}")
-            self.beginInsertRows(slate_index, slate_item.rowCount(), slate_item.rowCount()+1)
-            slate_item.appendRow(take_item)
-            take_index = self.createIndex(take_item.row(), 0, take_item)
-            self.endInsertRows()
-            LOGGER.info(f"Adding take {take}. Take index is {take_index}")
-            #self.dataChanged.emit(sequence_item.row(), sequence_index, [Qt.DisplayRole])
-            #self.dataChanged.emit(QModelIndex(), QModelIndex(), [Qt.DisplayRole])
-            self.layoutChanged.emit()
-        else:
-            print("Take already exists in slate")
-            #take_item = slate_item[take]
-            
-        #self.endInsertRows()
+    @PERF_STATS.timed("add_take")
+    def add_take(self, sequence: str, slate:str, take: int, description: str, quality: str, timecode: int = None, duration: int = 0, rate=DEFAULT_FRAME_RATE,
+                 metadata: dict = None):
+        ''' Adds a single take. timecode and duration are frame counts at rate. metadata holds values for registered extension columns '''
+        self.add_takes([{
+            'Sequence': sequence,
+            'Slate': slate,
+            'Take': take,
+            'Timecode': timecode,
+            'Duration': duration,
+            'Rate': rate,
+            'Status': quality,
+            'Notes': description,
+            **(metadata or {})
+        }])
+
+    def update_take(self, sequence: str, slate: str, take: int, values: dict):
+        ''' Sets editable columns of an existing take through setData. Empty values are left alone '''
+        take_index = self.findChildRowIndex(sequence, slate, take)
+        if not take_index.isValid():
+            LOGGER.warning(f"Can't update take {take} of {sequence}/{slate}, it isn't in the take list")
+            return
+
+        for colname, value in values.items():
+            if value:
+                self.setData(take_index.siblingAtColumn(self.colnames.index(colname)), value)
+
+    @PERF_STATS.timed("add_takes")
+    def add_takes(self, rows):
+        ''' Adds takes as a single step that can be undone. Returns the new TakeItems '''
+        added_takes = self.insert_takes(rows)
+        if added_takes:
+            self.undo_stack.push(AddTakesCommand(self, [take_item.keyPath() for take_item in added_takes]))
+        return added_takes
+
+    def insert_takes(self, rows):
+        ''' Adds many takes at once, e.g. when restoring a day's takes from disk or from another station.
+
+        Takes are grouped by sequence and slate so that each contiguous block of new rows is inserted
+        with a single beginInsertRows, and all new takes are persisted once at the end.
+        '''
+        grouped_rows = {}
+        row_count = 0
+        for row in rows:
+            row_count += 1
+            grouped_rows.setdefault(row['Sequence'], {}).setdefault(row['Slate'], []).append(row)
+
+        added_takes = []
+        new_sequence_items = []
+        for sequence, slates in grouped_rows.items():
+            sequence_item = self.get_sequence(sequence)
+            if not sequence_item:
+                # New subtrees are built completely before they are inserted, so each costs a single insert
+                sequence_item = SequenceItem(sequence, self.rootItem)
+                new_sequence_items.append(sequence_item)
+
+            new_slate_items = []
+            for slate, slate_rows in slates.items():
+                slate_item = sequence_item.get_slate(slate)
+                if slate_item:
+                    if not slate_item.fetched:
+                        # Existing takes have to be loaded first, or they couldn't be told apart from new ones
+                        self.fetch_slate(slate_item)
+                    take_items = self.create_take_items(slate_item, slate_rows)
+                    self.insert_items(slate_item, take_items)
+                else:
+                    slate_item = SlateItem(sequence_item, slate)
+                    new_slate_items.append(slate_item)
+                    take_items = self.create_take_items(slate_item, slate_rows)
+                    for take_item in take_items:
+                        slate_item.appendRow(take_item)
+                added_takes += take_items
+
+            if sequence_item in new_sequence_items:
+                for slate_item in new_slate_items:
+                    sequence_item.appendRow(slate_item)
+            else:
+                self.insert_items(sequence_item, new_slate_items)
+
+        self.insert_items(self.rootItem, new_sequence_items)
+
+        if len(added_takes) < row_count:
+            LOGGER.warning(f"Skipped {row_count - len(added_takes)} takes that already exist")
+
+        if added_takes:
+            LOGGER.info(f"Added {len(added_takes)} takes")
+            self.mark_dirty(added_takes)
+            self.takes_added.emit(added_takes)
+        return added_takes
+
+    def create_take_items(self, slate_item: SlateItem, rows):
+        ''' Creates items for the given takes that aren't in slate_item yet '''
+        take_items = {}
+        for row in rows:
+            take = row['Take']
+            if take in take_items or slate_item.get_take(take):
+                continue
+            take_items[take] = self.create_take_item(slate_item, row)
+        return list(take_items.values())
+
+    def create_take_item(self, slate_item: SlateItem, row: dict) -> TakeItem:
+        return TakeList.create_take_item(slate_item, row)
+
+    def remove_takes(self, keys) -> list:
+        ''' Removes the (sequence, slate, take) takes along with any slates and sequences left empty.
+
+        Returns the rows of the removed takes, and journals and announces their removal.
+        '''
+        removed_rows = []
+        # Takes are usually removed in the order they were added, so going backwards mostly takes them off the end
+        for key in reversed(keys):
+            slate_item = self.get_slate(key[0], key[1])
+            if slate_item and not slate_item.fetched:
+                self.fetch_slate(slate_item)
+            take_item = slate_item.get_take(key[2]) if slate_item else None
+            if not take_item:
+                continue
+
+            removed_rows.append(take_item.toRow())
+            if take_item.dirty:
+                take_item.dirty = False
+                self.dirty_takes.remove(take_item)
+            self.remove_item(take_item)
+
+        removed_rows.reverse()
+        if removed_rows and self.dirty_edits:
+            # The takes are gone, so their pending edits have nothing left to apply to
+            removed_keys = {(row['Sequence'], row['Slate'], row['Take']) for row in removed_rows}
+            self.dirty_edits = {edit: value for edit, value in self.dirty_edits.items() if edit[0] not in removed_keys}
+        if removed_rows and self.persistent:
+            self.get_writer().append([TakeListJournal.remove_record(row['Sequence'], row['Slate'], row['Take']) for row in removed_rows])
+        if removed_rows:
+            self.takes_removed.emit([(row['Sequence'], row['Slate'], row['Take']) for row in removed_rows])
+        return removed_rows
+
+    def remove_item(self, item: TreeItem, notify: bool = True):
+        ''' Removes an item, then its parents for as long as they are left without children '''
+        while item is not self.rootItem:
+            parent_item = item.parentItem
+            if notify:
+                parent_index = QModelIndex() if parent_item is self.rootItem else self.createIndex(parent_item.row(), 0, parent_item)
+                self.beginRemoveRows(parent_index, item.row(), item.row())
+                parent_item.removeRow(item.row())
+                self.endRemoveRows()
+            else:
+                parent_item.removeRow(item.row())
+            self.fetched_slates.pop(item, None)
+
+            if parent_item.childItems:
+                return
+            item = parent_item
+
+    def insert_items(self, parent_item: TreeItem, items):
+        ''' Appends a contiguous block of items to parent_item with a single row insertion '''
+        if not items:
+            return
+
+        first_row = parent_item.rowCount()
+        parent_index = QModelIndex() if parent_item is self.rootItem else self.createIndex(parent_item.row(), 0, parent_item)
+        self.beginInsertRows(parent_index, first_row, first_row + len(items) - 1)
+        for item in items:
+            parent_item.appendRow(item)
+        self.endInsertRows()
 
     def setData(self, index: QModelIndex, value, role=Qt.EditRole):
         if role == Qt.EditRole:
@@ -473,100 +547,287 @@ class TakeListModel(QAbstractItemModel):
                 #     item.child(0, column).setData(value)
 
                 colname = self.colnames[column]
-                if colname == "Notes":
-                    item.setNotes(value)
-                elif colname == "Status":
-                    item.setStatus(value)
+                old_value = item.data(colname)
+                if old_value == value:
+                    return True
+
+                # The command applies the edit as it is pushed
+                self.undo_stack.push(EditTakeCommand(self, item.keyPath(), colname, old_value, value))
+                return True
             
-            self.dataChanged.emit(index, item)
+            self.dataChanged.emit(index, index)
             return True
         return False
 
+    def apply_edit(self, key: tuple, colname: str, value):
+        ''' Sets one column of the (sequence, slate, take) take without going through the undo stack '''
+        slate_item = self.get_slate(key[0], key[1])
+        if slate_item and not slate_item.fetched:
+            self.fetch_slate(slate_item)
+        take_item = slate_item.get_take(key[2]) if slate_item else None
+        if not take_item:
+            LOGGER.warning(f"Can't set {colname} of take {key[2]} of {key[0]}/{key[1]}, it isn't in the take list")
+            return
+
+        if colname == "Notes":
+            take_item.setNotes(value)
+        elif colname == "Status":
+            take_item.setStatus(value)
+        else:
+            take_item.setColumn(colname, value)
+        self.mark_edited(take_item, colname)
+
+        index = self.createIndex(take_item.row(), self.colnames.index(colname), take_item)
+        self.dataChanged.emit(index, index)
+        self.take_edited.emit(take_item, colname)
+
     def get_root_dir(self) -> pathlib.Path:
+        from switchboard.config import CONFIG
         return pathlib.Path(CONFIG.SWITCHBOARD_DIR)
 
     def project_takelist_path(self) -> pathlib.Path:
+        from switchboard.config import CONFIG
         project_dir = self.get_root_dir() / 'projects' / CONFIG.PROJECT_NAME.get_value()
         os.makedirs(project_dir, exist_ok=True)
         return project_dir /TAKELIST_FILE_NAME
 
+    def get_store(self):
+        ''' Returns the journal or sqlite store for the current project, creating it if necessary '''
+        takelist_path = self.project_takelist_path()
+        if not self.store or self.store.snapshot_path != takelist_path:
+            if self.writer:
+                # Otherwise the old writer's thread and exit hook outlive it, and flush a stale store at exit
+                self.writer.close()
+                self.writer.deleteLater()
+            if self.backend == TAKELIST_BACKEND_SQLITE:
+                self.store = TakeListSQLiteStore(takelist_path.with_name(TAKELIST_SQLITE_FILE_NAME), takelist_path, TAKE_COLUMNS.csv_fieldnames)
+            else:
+                self.store = TakeListJournal(takelist_path, takelist_path.with_name(TAKELIST_JOURNAL_FILE_NAME), TAKE_COLUMNS.csv_fieldnames)
+            self.writer = TakeListWriter(self.store, self)
+            self.writer.write_failed.connect(self.on_write_failed)
+        return self.store
+
+    def get_writer(self) -> TakeListWriter:
+        self.get_store()
+        return self.writer
+
+    def set_autosave_delay(self, autosave_delay_ms: int):
+        self.autosave_timer.setInterval(autosave_delay_ms)
+
+    def mark_dirty(self, take_items):
+        ''' Queues the given takes for the next autosave and restarts its timer '''
+        if not self.persistent:
+            return
+
+        for take_item in take_items:
+            if not take_item.dirty:
+                take_item.dirty = True
+                self.dirty_takes.append(take_item)
+
+        self.saves_requested += 1
+        self.autosave_timer.start()
+
+    def mark_edited(self, take_item: TakeItem, colname: str):
+        ''' Queues an edit record for one column of a take for the next autosave '''
+        if not self.persistent:
+            return
+
+        if not take_item.dirty:
+            # A take that hasn't been saved yet is written as a whole row, which already has the edit.
+            # Only the last value of a cell edited repeatedly before the save is written
+            key = take_item.keyPath()
+            self.dirty_edits[(key, colname)] = take_item.toDict().get(colname)
+        self.saves_requested += 1
+        self.autosave_timer.start()
+
+    def autosave_counters(self) -> dict:
+        return {
+            'requested': self.saves_requested,
+            'performed': self.saves_performed,
+            'pending': len(self.dirty_takes) + len(self.dirty_edits)
+        }
+
+    def clear_dirty(self):
+        for take_item in self.dirty_takes:
+            take_item.dirty = False
+        self.dirty_takes = []
+        self.dirty_edits = {}
+
+    @Slot()
+    def save_dirty_takes(self):
+        ''' Journals every take added and every cell edited since the last save with a single write '''
+        self.autosave_timer.stop()
+        if not self.dirty_takes and not self.dirty_edits:
+            return
+
+        writer = self.get_writer()
+        if writer.needs_compaction(len(self.dirty_takes) + len(self.dirty_edits)):
+            # Rewriting the snapshot once is cheaper than journaling a large batch and then compacting it
+            self.save_data()
+            return
+
+        records = [TakeListJournal.take_record(take_item.toRow()) for take_item in self.dirty_takes]
+        records += [TakeListJournal.edit_record(*key, colname, value) for (key, colname), value in self.dirty_edits.items()]
+        self.clear_dirty()
+        writer.append(records)
+        self.saves_performed += 1
+
     @Slot()
+    def flush(self):
+        ''' Saves any pending changes and blocks until all queued take list writes are on disk '''
+        self.save_dirty_takes()
+        if self.writer:
+            self.writer.flush()
+
+    @Slot(str)
+    def on_write_failed(self, message: str):
+        LOGGER.error(message)
+
+    def set_perf_stats_enabled(self, enabled: bool, interval_ms: int = PERF_STATS_INTERVAL_MS):
+        ''' Toggles timing of the model's hot paths, with a summary logged every interval_ms '''
+        PERF_STATS.reset()
+        PERF_STATS.enabled = enabled
+        if enabled:
+            self.perf_stats_timer.start(interval_ms)
+        else:
+            self.perf_stats_timer.stop()
+
+    @Slot()
+    def log_perf_stats(self):
+        LOGGER.info(PERF_STATS.format_summary())
+        PERF_STATS.reset()
+
+    @Slot()
+    @PERF_STATS.timed("save_data")
     def save_data(self):
-        result = self.rootItem.flatten()
-        LOGGER.info(result)
+        ''' Rewrites the canonical take list csv and empties the journal '''
+        if self.lazy:
+            # The tree only holds the fetched slates, so the store stays the source of truth
+            self.save_dirty_takes()
+            self.get_writer().export()
+            return
+
+        self.autosave_timer.stop()
+        self.clear_dirty()
+
+        # The writer thread must not read the live tree, so it gets its own copy of the rows
+        self.get_writer().compact(self.rootItem.flatten())
+        self.saves_performed += 1
+
+    def load_takes(self, path: pathlib.Path) -> int:
+        ''' Merges the takes from a take list csv or json file into the model. Returns the number of new takes '''
+        added_takes = self.add_takes(read_takelist(path))
+        LOGGER.info(f"Loaded {len(added_takes)} takes from {path}")
+        return len(added_takes)
+
+    def load_takes_from_json(self, path: pathlib.Path = None) -> int:
+        if not path:
+            path = self.project_takelist_path().with_name(TAKELIST_JSON_FILE_NAME)
+        return self.load_takes(path)
+
+    def export_csv(self, path: pathlib.Path):
+        ''' Streams the take list into a csv file a chunk at a time, without building an intermediate list '''
+        if self.lazy:
+            self.flush()
+            self.get_store().export_csv(path)
+            return
+
+        self.takelist.export_csv(path)
+
+    def save_takes_to_json(self, path: pathlib.Path = None):
+        if not path:
+            path = self.project_takelist_path().with_name(TAKELIST_JSON_FILE_NAME)
+        if self.lazy:
+            self.flush()
+            write_takelist_json(path, rows_to_takelist_dict(self.get_store().query()))
+            return
+        self.takelist.export_json(path)
+
+    def restore_data(self):
+        ''' Rebuilds the take list from the last snapshot plus the journal written after it, or from the sqlite store '''
+        store = self.get_store()
+        self.writer.flush()
+
+        self.beginResetModel()
+        # Columns first seen in the restored takes are covered by the reset
+        self.resetting = True
+        self.clear_dirty()
+        self.fetched_slates.clear()
+        self.undo_stack.clear()
+        if self.lazy:
+            # Takes are only fetched later, so their columns have to be known up front
+            for name in store.extra_columns():
+                TAKE_COLUMNS.ensure(name)
+            self.takelist.clear()
+            self.takelist.restore_slates(store.slates())
+            self.takelist.apply_records(store.read_records())
+        else:
+            self.takelist.restore(store)
+        self.resetting = False
+        self.endResetModel()
+        self.writer.record_count = store.record_count
+
+        LOGGER.info(f"Restored take list using the {self.backend} backend, replaying {store.record_count} journal records")
+
+    def restore_slates(self, slates):
+        ''' Inserts empty, unfetched slates without emitting any row signals '''
+        self.takelist.restore_slates(slates)
 
-        with open(self.project_takelist_path(), 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADER_DATA)
-            writer.writeheader()
-            for row in result:
-                writer.writerow(row)
-            #for row in self._data:
-            #    writer.writerow(row)
+    def restore_take(self, row: dict):
+        ''' Inserts a take read back from disk without emitting any row signals '''
+        self.takelist.restore_take(row)
 
+    @PERF_STATS.timed("data")
     def data(self, index: QModelIndex, role:Qt.ItemDataRole=Qt.DisplayRole):
-        # LOGGER.info(f"Getting data for index {index}")    
         if not index.isValid():
-            # LOGGER.info(f"Index {index} not valid")    
             return None
 
         item = index.internalPointer()
-        #LOGGER.info(f"Getting data for item {item}")    
+        row_cache = item.rowCache
+        if row_cache is None:
+            row_cache = item.rowCache = self.build_row_cache(item)
 
-        colname = self.colnames[index.column()]
-        #LOGGER.info(f"Getting data for colname {colname}")
-
-        if role == Qt.DisplayRole:
-            item_data = None
-            try:
-                item_data = item.data(colname)
-            except KeyError as e:
-                LOGGER.error(f"KeyError: {e}. Item is {item}")
-                return ""
-                return LOGGER.error(f"KeyError: {e}. Item is {item}")
-            finally:
-                if item_data:
-                    return item_data
-                else:
-                    return ""
-
-        # elif role == Qt.ForegroundRole:
-        #     return self.foreground_color_for_column(colname=colname, value=value,
-        #                                  data=data)
-        '''
-        elif role == Qt.BackgroundRole:
-            return self.background_color_for_column(colname=colname, value=value,
-                                         data=data)
-
-        elif role == Qt.TextAlignmentRole:
-            # if colname in ('CpuUtilization', 'GpuUtilization'):
-            #     return Qt.AlignLeft
-            return Qt.AlignRight
+        role_values = row_cache.get(role)
+        if role_values is None:
+            return None
+        return role_values[index.column()]
+
+    def build_row_cache(self, item: TreeItem) -> dict:
+        ''' Computes every cached role for every column of an item. Dropped again whenever the item changes '''
+        display = []
+        foreground = []
+        background = []
+        tooltips = []
+        for colname in self.colnames:
+            value = item.data(colname)
+            display_value = item.displayData(colname)
+            display.append("" if display_value is None else display_value)
+            foreground.append(self.foreground_color_for_column(colname, value))
+            background.append(self.background_color_for_column(colname, value))
+            if colname == 'Status':
+                tooltips.append(TakeListModel.STATUS_TOOLTIPS.get(value))
+            elif colname == 'Notes' and value:
+                tooltips.append(value)
+            else:
+                tooltips.append(None)
 
-        return None
-        '''
+        return {
+            Qt.DisplayRole: tuple(display),
+            Qt.ForegroundRole: tuple(foreground),
+            Qt.BackgroundRole: tuple(background),
+            Qt.ToolTipRole: tuple(tooltips),
+        }
 
     # ~ QAbstractTableModel interface end
 
-    def foreground_color_for_column(self, colname, value, data):
-        ''' Returns the foreground color for the given cell '''
-        if colname == 'Status':
-            if value == 'NG':
-                return TakeListModel.COLOR_BAD
-            elif value == 'S':
-                return TakeListModel.COLOR_BEST
-            elif value == 'G':
-                return TakeListModel.COLOR_GOOD
-            
-        return TakeListModel.COLOR_NORMAL
+    def foreground_color_for_column(self, colname, value):
+        ''' Returns the foreground color for the given cell, or None for the default '''
+        if colname == 'Status' and value in TakeListModel.STATUS_COLORS:
+            return TakeListModel.COLOR_STATUS_TEXT
+        return None
 
-    def background_color_for_column(self, colname, value, data):
-        ''' Returns the background color for the given cell '''
+    def background_color_for_column(self, colname, value):
+        ''' Returns the background color for the given cell, or None for the default '''
         if colname == 'Status':
-            if value == 'NG':
-                return TakeListModel.COLOR_BAD
-            elif value == 'S':
-                return TakeListModel.COLOR_BEST
-            elif value == 'G':
-                return TakeListModel.COLOR_GOOD
-            
-        return TakeListModel.COLOR_NORMAL
+            return TakeListModel.STATUS_COLORS.get(value)
+        return None
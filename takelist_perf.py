@@ -0,0 +1,67 @@
+from collections import deque
+from functools import wraps
+import time
+
+
+class PerfStats(object):
+    ''' Call counters and latency samples for the take list hot paths.
+
+    Disabled by default, in which case a timed function costs one attribute
+    check on top of the call. Only the most recent samples of each function
+    are kept, so percentiles describe recent behaviour.
+    '''
+
+    def __init__(self, max_samples: int = 4096):
+        self.enabled = False
+        self.max_samples = max_samples
+        self.calls = {}
+        self.samples = {}
+
+    def timed(self, name: str):
+        ''' Decorator recording the call count and latency of the decorated function under name '''
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, duration: float):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.max_samples)
+        samples.append(duration)
+
+    def reset(self):
+        self.calls = {}
+        self.samples = {}
+
+    def summary(self) -> dict:
+        ''' Returns calls, p50 and p99 in seconds for each function timed since the last reset '''
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[name] = {
+                'calls': self.calls[name],
+                'p50': ordered[len(ordered) // 2],
+                'p99': ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)]
+            }
+        return result
+
+    def format_summary(self) -> str:
+        lines = [
+            f"{name}: {stats['calls']} calls, p50 {stats['p50'] * 1e6:.1f} us, p99 {stats['p99'] * 1e6:.1f} us"
+            for name, stats in sorted(self.summary().items())
+        ]
+        return "Take list perf stats\n  " + "\n  ".join(lines) if lines else "Take list perf stats: no calls"
+
+
+PERF_STATS = PerfStats()
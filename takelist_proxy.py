@@ -0,0 +1,279 @@
+from PySide2.QtCore import QModelIndex, QSortFilterProxyModel, Slot
+from .takelist_core import TakeItem
+from .takelist_model import TakeListModel
+from .takelist_timecode import TimecodeRange, nominal_fps
+from bisect import bisect_left
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Sort order of the status codes, best takes first
+STATUS_RANK = {
+    'S': 0,
+    'G': 1,
+    'NG': 2,
+}
+
+# Columns holding frame counts at the take's rate
+FRAME_COLUMNS = ('Timecode', 'Duration')
+
+
+def tokenize(text) -> set:
+    if not text:
+        return set()
+    return set(TOKEN_PATTERN.findall(str(text).casefold()))
+
+
+class TakeListProxyModel(QSortFilterProxyModel):
+    ''' Sort/filter proxy for the take list that works off precomputed indexes.
+
+    Takes are indexed by status and by the words in their notes, and the tree
+    itself indexes them by sequence and slate. Changing a filter intersects
+    those indexes once to find the accepted takes and their
+    slates and sequences, so filterAcceptsRow is a set lookup. Sorting compares
+    typed values (int takes, status rank) read straight from the items instead
+    of going through TakeListModel.data. Timecodes and durations compare in
+    seconds, so takes shot at different rates sort chronologically.
+    '''
+
+    def __init__(self, parent=None):
+        QSortFilterProxyModel.__init__(self, parent)
+
+        self.status_index = {}
+        self.token_index = {}
+        self.sorted_tokens = []
+        self.sorted_tokens_stale = False
+        # The status and tokens each take was indexed under, so they can be unindexed when it changes
+        self.indexed_takes = {}
+
+        self.status_filter = None
+        self.sequence_filter = None
+        self.slate_filter = None
+        self.notes_filter = []
+        self.timecode_filter = None
+        # Accepted takes plus their slates and sequences, or None when no filter is set
+        self.accepted_items = None
+
+    def setSourceModel(self, source_model: TakeListModel):
+        # Connected before the base class connects its own handlers, so the indexes
+        # are already up to date by the time it filters new or changed rows
+        source_model.rowsInserted.connect(self.on_source_rows_inserted)
+        source_model.rowsAboutToBeRemoved.connect(self.on_source_rows_about_to_be_removed)
+        source_model.dataChanged.connect(self.on_source_data_changed)
+        source_model.modelReset.connect(self.rebuild_indexes)
+        super().setSourceModel(source_model)
+        self.rebuild_indexes()
+
+    # ~ Indexes
+
+    @Slot()
+    def rebuild_indexes(self):
+        self.status_index = {}
+        self.token_index = {}
+        self.indexed_takes = {}
+        for take_item in self.iter_takes(self.sourceModel().rootItem):
+            self.index_take(take_item)
+        self.sorted_tokens_stale = True
+        self.refilter()
+
+    def iter_takes(self, item):
+        if isinstance(item, TakeItem):
+            yield item
+            return
+        for child in item.childItems:
+            yield from self.iter_takes(child)
+
+    def index_take(self, take_item: TakeItem):
+        tokens = tokenize(take_item.notes)
+        self.indexed_takes[take_item] = (take_item.status, tokens)
+        self.status_index.setdefault(take_item.status, set()).add(take_item)
+        for token in tokens:
+            items = self.token_index.get(token)
+            if items is None:
+                items = self.token_index[token] = set()
+                self.sorted_tokens_stale = True
+            items.add(take_item)
+
+    def unindex_take(self, take_item: TakeItem):
+        status, tokens = self.indexed_takes.pop(take_item)
+        self.status_index[status].discard(take_item)
+        for token in tokens:
+            items = self.token_index[token]
+            items.discard(take_item)
+            if not items:
+                del self.token_index[token]
+                self.sorted_tokens_stale = True
+
+    def takes_with_token_prefix(self, prefix: str) -> set:
+        ''' Returns the takes with a word in their notes starting with prefix, so matches show while typing '''
+        if self.sorted_tokens_stale:
+            self.sorted_tokens = sorted(self.token_index)
+            self.sorted_tokens_stale = False
+
+        result = set()
+        for position in range(bisect_left(self.sorted_tokens, prefix), len(self.sorted_tokens)):
+            token = self.sorted_tokens[position]
+            if not token.startswith(prefix):
+                break
+            result |= self.token_index[token]
+        return result
+
+    @Slot(QModelIndex, int, int)
+    def on_source_rows_inserted(self, parent: QModelIndex, first: int, last: int):
+        parent_item = parent.internalPointer() if parent.isValid() else self.sourceModel().rootItem
+        parent_hidden = self.accepted_items is not None and parent.isValid() and parent_item not in self.accepted_items
+        for row in range(first, last + 1):
+            for take_item in self.iter_takes(parent_item.child(row)):
+                self.index_take(take_item)
+                if self.accepted_items is not None and self.take_matches(take_item):
+                    self.accept_take(take_item)
+
+        if parent_hidden and parent_item in self.accepted_items:
+            # The rows went in below a parent that was filtered out until now
+            self.invalidateFilter()
+
+    @Slot(QModelIndex, int, int)
+    def on_source_rows_about_to_be_removed(self, parent: QModelIndex, first: int, last: int):
+        parent_item = parent.internalPointer() if parent.isValid() else self.sourceModel().rootItem
+        for row in range(first, last + 1):
+            for take_item in self.iter_takes(parent_item.child(row)):
+                self.unindex_take(take_item)
+                if self.accepted_items is not None:
+                    self.accepted_items.discard(take_item)
+
+    @Slot(QModelIndex, QModelIndex)
+    def on_source_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=None):
+        parent = top_left.parent()
+        parent_item = parent.internalPointer() if parent.isValid() else self.sourceModel().rootItem
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            take_item = parent_item.child(row)
+            if not isinstance(take_item, TakeItem):
+                continue
+
+            self.unindex_take(take_item)
+            self.index_take(take_item)
+            if self.accepted_items is not None and self.take_matches(take_item) != (take_item in self.accepted_items):
+                # Whether its slate and sequence stay visible depends on the other takes, so refilter from the indexes
+                self.refilter()
+                return
+
+    # ~ Filters
+
+    def set_status_filter(self, statuses):
+        ''' Only shows takes with one of the given status codes. None shows every status '''
+        self.status_filter = set(statuses) if statuses is not None else None
+        self.refilter()
+
+    def set_sequence_filter(self, sequence: str):
+        self.sequence_filter = sequence or None
+        self.refilter()
+
+    def set_slate_filter(self, slate: str):
+        self.slate_filter = slate or None
+        self.refilter()
+
+    def set_notes_filter(self, text: str):
+        ''' Only shows takes with notes containing words starting with each of the words in text '''
+        self.notes_filter = sorted(tokenize(text))
+        self.refilter()
+
+    def set_timecode_filter(self, start: str, end: str):
+        ''' Only shows takes starting between the start and end timecodes, inclusive. Either can be left empty '''
+        self.timecode_filter = TimecodeRange(start, end) if start or end else None
+        self.refilter()
+
+    def has_filter(self) -> bool:
+        return (self.status_filter is not None or self.sequence_filter or self.slate_filter or bool(self.notes_filter)
+                or self.timecode_filter is not None)
+
+    def refilter(self):
+        if not self.has_filter():
+            self.accepted_items = None
+            self.invalidateFilter()
+            return
+
+        # The tree already groups takes by sequence and slate, so it serves as the index for those filters
+        candidates = self.takes_in_location()
+        if self.status_filter is not None:
+            matches = set().union(*(self.status_index.get(status, ()) for status in self.status_filter))
+            candidates = matches if candidates is None else candidates & matches
+        for prefix in self.notes_filter:
+            matches = self.takes_with_token_prefix(prefix)
+            candidates = matches if candidates is None else candidates & matches
+        if candidates is None:
+            candidates = self.indexed_takes.keys()
+
+        self.accepted_items = set()
+        for take_item in candidates:
+            if self.take_matches_timecode(take_item):
+                self.accept_take(take_item)
+        self.invalidateFilter()
+
+    def takes_in_location(self):
+        ''' Returns the takes of the slates matching the sequence and slate filters, or None if neither is set '''
+        if not self.sequence_filter and not self.slate_filter:
+            return None
+        root_item = self.sourceModel().rootItem
+        sequence_items = [root_item.childByKey(self.sequence_filter)] if self.sequence_filter else root_item.childItems
+        takes = set()
+        for sequence_item in sequence_items:
+            if sequence_item is None:
+                continue
+            slate_items = [sequence_item.childByKey(self.slate_filter)] if self.slate_filter else sequence_item.childItems
+            for slate_item in slate_items:
+                if slate_item is not None:
+                    takes.update(slate_item.childItems)
+        return takes
+
+    def take_matches_timecode(self, take_item: TakeItem) -> bool:
+        return self.timecode_filter is None or self.timecode_filter.contains(take_item.timecode, take_item.rate)
+
+    def take_matches_location(self, take_item: TakeItem) -> bool:
+        slate_item = take_item.parentItem
+        if self.slate_filter and slate_item.slate != self.slate_filter:
+            return False
+        if self.sequence_filter and slate_item.parentItem.sequence != self.sequence_filter:
+            return False
+        return True
+
+    def take_matches(self, take_item: TakeItem) -> bool:
+        ''' Checks a single take against the filters, for takes that changed after the last refilter '''
+        if self.status_filter is not None and take_item.status not in self.status_filter:
+            return False
+        if not self.take_matches_location(take_item) or not self.take_matches_timecode(take_item):
+            return False
+        _, tokens = self.indexed_takes[take_item]
+        return all(any(token.startswith(prefix) for token in tokens) for prefix in self.notes_filter)
+
+    def accept_take(self, take_item: TakeItem):
+        ''' Adds a take and its slate and sequence to the accepted items '''
+        self.accepted_items.add(take_item)
+        item = take_item.parentItem
+        while item.parentItem and item not in self.accepted_items:
+            self.accepted_items.add(item)
+            item = item.parentItem
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self.accepted_items is None:
+            return True
+        parent_item = source_parent.internalPointer() if source_parent.isValid() else self.sourceModel().rootItem
+        return parent_item.child(source_row) in self.accepted_items
+
+    # ~ Sorting
+
+    def lessThan(self, source_left: QModelIndex, source_right: QModelIndex) -> bool:
+        colname = self.sourceModel().colnames[source_left.column()]
+        return self.sort_key(source_left.internalPointer(), colname) < self.sort_key(source_right.internalPointer(), colname)
+
+    @staticmethod
+    def sort_key(item, colname: str) -> tuple:
+        value = item.data(colname)
+        if colname == 'Status':
+            return (0, STATUS_RANK.get(value, len(STATUS_RANK)))
+        if colname in FRAME_COLUMNS and isinstance(value, int) and isinstance(item, TakeItem) and item.rate:
+            return (0, value / nominal_fps(item.rate))
+        if isinstance(value, (int, float)):
+            return (0, value)
+        if value is None:
+            return (2, "")
+        return (1, str(value).casefold())
@@ -0,0 +1,216 @@
+from .takelist_journal import TakeListJournal
+from .takelist_io import write_takelist_csv
+from .takelist_timecode import TimecodeRange
+import contextlib, json, pathlib, sqlite3, threading
+
+
+class TakeListSQLiteStore(object):
+    ''' Optional SQLite backend for the take list, used in place of the csv snapshot and journal.
+
+    Each project gets its own database holding a single takes table indexed on
+    (sequence, slate, take) and on status. Every batch of records is applied in
+    one transaction, and the database runs in WAL mode so that another process
+    can read it while Switchboard writes. The csv take list is still exported
+    whenever the store is compacted, i.e. on an explicit save. Extension columns
+    registered at runtime are kept together as a json object in the extra column,
+    which stays NULL for takes without any.
+
+    Each thread gets its own connection to a database file. An in-memory database
+    only exists within its connection, so ":memory:" is opened once and shared by
+    every thread, with each use of it serialized by a lock.
+    '''
+
+    # Maps the take list csv columns to the takes table columns
+    COLUMNS = {
+        'Sequence': 'sequence',
+        'Slate': 'slate',
+        'Take': 'take',
+        'Timecode': 'timecode',
+        'Duration': 'duration',
+        'Rate': 'rate',
+        'Status': 'status',
+        'Notes': 'notes',
+    }
+
+    # Timecode and duration are frame counts at the take's rate, which is NUMERIC so whole rates read back as ints
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS takes ("
+        " sequence TEXT NOT NULL,"
+        " slate TEXT NOT NULL,"
+        " take INTEGER NOT NULL,"
+        " timecode INTEGER,"
+        " duration INTEGER,"
+        " rate NUMERIC,"
+        " status TEXT,"
+        " notes TEXT,"
+        " extra TEXT,"
+        " PRIMARY KEY (sequence, slate, take))",
+        "CREATE INDEX IF NOT EXISTS takes_status ON takes (status)",
+        "CREATE INDEX IF NOT EXISTS takes_timecode ON takes (timecode)",
+    )
+    SCHEMA_VERSION = 2
+
+    INSERT = ("INSERT INTO takes (sequence, slate, take, timecode, duration, rate, status, notes, extra)"
+              " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, database_path: pathlib.Path, snapshot_path: pathlib.Path, fieldnames):
+        self.database_path = database_path if database_path == ":memory:" else pathlib.Path(database_path)
+        self.snapshot_path = pathlib.Path(snapshot_path)
+        # Kept as given rather than copied, so columns registered later still make it into the export
+        self.fieldnames = fieldnames
+        # Rows are updated in place, so the store never needs compacting to stay small
+        self.compact_threshold = float('inf')
+        self.record_count = 0
+
+        # sqlite connections can't be shared between threads, and the writer runs on its own thread
+        self.local = threading.local()
+        if self.database_path == ":memory:":
+            self.shared_connection = self.open_connection(check_same_thread=False)
+            self.lock = threading.RLock()
+        else:
+            self.shared_connection = None
+            self.lock = contextlib.nullcontext()
+            self.connection()
+
+    def connection(self) -> sqlite3.Connection:
+        if self.shared_connection is not None:
+            return self.shared_connection
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.open_connection()
+        return connection
+
+    def open_connection(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.database_path), check_same_thread=check_same_thread)
+        connection.row_factory = sqlite3.Row
+        if self.database_path != ":memory:":
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            self.migrate(connection)
+            for statement in TakeListSQLiteStore.SCHEMA:
+                connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {TakeListSQLiteStore.SCHEMA_VERSION}")
+        return connection
+
+    def fetch(self, sql: str, values=()):
+        ''' Runs a query. The rows of a shared connection are fetched up front, so the lock isn't held while they are used '''
+        with self.lock:
+            cursor = self.connection().execute(sql, values)
+            return cursor.fetchall() if self.shared_connection is not None else cursor
+
+    def migrate(self, connection: sqlite3.Connection):
+        ''' Adds the extra column to version 1 databases '''
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == 1:
+            connection.execute("ALTER TABLE takes ADD COLUMN extra TEXT")
+
+    def append(self, record: dict):
+        self.append_many([record])
+
+    def append_many(self, records):
+        ''' Applies journal style take, edit and remove records in a single transaction '''
+        with self.lock, self.connection() as connection:
+            for record in records:
+                op = record.get('op')
+                if op == TakeListJournal.OP_TAKE:
+                    self.upsert_row(connection, record['row'])
+                elif op == TakeListJournal.OP_EDIT:
+                    sequence, slate, take = record['key']
+                    column = TakeListSQLiteStore.COLUMNS.get(record['column'])
+                    if column:
+                        connection.execute(f"UPDATE takes SET {column} = ? WHERE sequence = ? AND slate = ? AND take = ?",
+                                           (record['value'], sequence, slate, take))
+                    else:
+                        self.update_extra(connection, record['key'], record['column'], record['value'])
+                elif op == TakeListJournal.OP_REMOVE:
+                    connection.execute("DELETE FROM takes WHERE sequence = ? AND slate = ? AND take = ?", record['key'])
+
+    def update_extra(self, connection: sqlite3.Connection, key, column: str, value):
+        ''' Sets one extension column of a take, inside the caller's transaction '''
+        found = connection.execute("SELECT extra FROM takes WHERE sequence = ? AND slate = ? AND take = ?", key).fetchone()
+        if not found:
+            return
+        extra = json.loads(found['extra']) if found['extra'] else {}
+        if value is None or value == "":
+            extra.pop(column, None)
+        else:
+            extra[column] = value
+        connection.execute("UPDATE takes SET extra = ? WHERE sequence = ? AND slate = ? AND take = ?",
+                           (json.dumps(extra) if extra else None, *key))
+
+    def upsert_row(self, connection: sqlite3.Connection, row: dict):
+        # An upsert rather than INSERT OR REPLACE, which would move the take to the end of the rowid order
+        connection.execute(
+            TakeListSQLiteStore.INSERT + " ON CONFLICT (sequence, slate, take) DO UPDATE SET"
+            " timecode = excluded.timecode, duration = excluded.duration, rate = excluded.rate,"
+            " status = excluded.status, notes = excluded.notes, extra = excluded.extra",
+            self.row_values(row))
+
+    @staticmethod
+    def row_values(row: dict) -> tuple:
+        extra = {column: value for column, value in row.items() if column not in TakeListSQLiteStore.COLUMNS and value not in (None, "")}
+        return (row['Sequence'], row['Slate'], row['Take'], row.get('Timecode'), row.get('Duration'), row.get('Rate'),
+                row.get('Status'), row.get('Notes'), json.dumps(extra) if extra else None)
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def read_snapshot(self):
+        yield from self.query()
+
+    def read_records(self):
+        # Records are applied to the table as they arrive, so there is never anything left to replay
+        return iter(())
+
+    def query(self, sequence: str = None, slate: str = None, take: int = None, status: str = None, timecode_between=None):
+        ''' Yields the takes matching all of the given values, in insertion order.
+
+        timecode_between is an inclusive ("HH:MM:SS:FF", "HH:MM:SS:FF") range of start timecodes, compared in
+        frames at each take's rate, which runs through midnight if it starts later than it ends.
+        '''
+        conditions = []
+        values = []
+        for column, value in (('sequence', sequence), ('slate', slate), ('take', take), ('status', status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        if timecode_between is not None:
+            timecode_range = TimecodeRange(*timecode_between)
+            rate_conditions = []
+            for (rate,) in self.fetch("SELECT DISTINCT rate FROM takes"):
+                start, end = timecode_range.frames_at(rate)
+                # A range through midnight matches either side of it
+                rate_conditions.append(f"(rate = ? AND (timecode >= ? {'OR' if start > end else 'AND'} timecode <= ?))")
+                values += [rate, start, end]
+            conditions.append(f"({' OR '.join(rate_conditions) or '0'})")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        for row in self.fetch(f"SELECT * FROM takes{where} ORDER BY rowid", values):
+            take = {name: row[column] for name, column in TakeListSQLiteStore.COLUMNS.items()}
+            if row['extra']:
+                take.update(json.loads(row['extra']))
+            yield take
+
+    def extra_columns(self) -> list:
+        ''' Returns the names of the extension columns any take in the store has a value for '''
+        names = {}
+        for (extra,) in self.fetch("SELECT DISTINCT extra FROM takes WHERE extra IS NOT NULL"):
+            names.update(dict.fromkeys(json.loads(extra)))
+        return list(names)
+
+    def slates(self):
+        ''' Yields (sequence, slate) for every slate in the store, in the order they were first recorded '''
+        for row in self.fetch("SELECT sequence, slate FROM takes GROUP BY sequence, slate ORDER BY MIN(rowid)"):
+            yield row['sequence'], row['slate']
+
+    def compact(self, rows):
+        ''' Replaces the stored takes with the given rows and exports them to the csv take list '''
+        rows = list(rows)
+        with self.lock, self.connection() as connection:
+            connection.execute("DELETE FROM takes")
+            connection.executemany(TakeListSQLiteStore.INSERT, [self.row_values(row) for row in rows])
+        self.export_csv(self.snapshot_path)
+
+    def export_csv(self, path: pathlib.Path):
+        write_takelist_csv(path, self.query(), self.fieldnames)
@@ -0,0 +1,377 @@
+''' Take list sync between Switchboard stations.
+
+A small hub, TakeListSyncServer, relays new takes, removed takes and Notes/Status
+edits between the stations connected to it as json lines. Every synced field carries a version,
+a Lamport counter plus the name of the station that wrote it, and the highest
+version wins no matter which order the changes arrive in. The hub numbers every
+change it accepts, so a station that reconnects only asks for the changes after
+the last number it saw instead of the whole take list.
+
+A take carries the version it was added with. Removing it only wins over the
+take it was made against, and the hub remembers the removal, so a take added
+again later with a newer version comes back while a station replaying an older
+copy of it doesn't.
+
+Run the hub on its own with
+    python -m switchboard.devices.takelist.takelist_sync --port 8765
+'''
+from .takelist_journal import TakeListJournal
+from collections import OrderedDict
+import argparse, asyncio, itertools, json, logging, threading, uuid
+
+DEFAULT_SYNC_HOST = "127.0.0.1"
+DEFAULT_SYNC_PORT = 8765
+
+# The take columns that are kept in sync once a take exists
+SYNC_COLUMNS = ('Status', 'Notes')
+
+# take, edit and remove messages reuse the journal record layout, plus versions and routing fields
+OP_TAKE = TakeListJournal.OP_TAKE
+OP_EDIT = TakeListJournal.OP_EDIT
+OP_REMOVE = TakeListJournal.OP_REMOVE
+OP_HELLO = "hello"
+OP_WELCOME = "welcome"
+OP_ACK = "ack"
+
+# Loses against every version written by a station, for takes that were recorded before syncing started
+NO_VERSION = [0, ""]
+
+logger = logging.getLogger(__name__)
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def decode(line: bytes) -> dict:
+    return json.loads(line)
+
+
+def take_key(row: dict) -> tuple:
+    return (row['Sequence'], row['Slate'], row['Take'])
+
+
+def is_newer(version, current) -> bool:
+    ''' Versions are [counter, station] pairs. Ties on the counter go to the station name, so every station agrees '''
+    return current is None or tuple(version) > tuple(current)
+
+
+def take_message(row: dict, versions: dict, added) -> dict:
+    return {**TakeListJournal.take_record(row), 'versions': versions, 'added': added}
+
+
+def edit_message(key, column: str, value, version) -> dict:
+    return {**TakeListJournal.edit_record(*key, column, value), 'version': version}
+
+
+def remove_message(key, version) -> dict:
+    return {**TakeListJournal.remove_record(*key), 'version': version}
+
+
+class VersionClock(object):
+    ''' Lamport clock that stamps the versions of a station's own changes '''
+
+    def __init__(self, station: str):
+        self.station = station
+        self.counter = 0
+
+    def tick(self) -> list:
+        self.counter += 1
+        return [self.counter, self.station]
+
+    def observe(self, version):
+        ''' Moves the clock past a version seen from another station, so our next change wins over it '''
+        if version[0] > self.counter:
+            self.counter = version[0]
+
+
+class TakeListSyncServer(object):
+    ''' Hub that merges and relays take list changes between stations.
+
+    Only the latest state of each take is kept, ordered by the number of the
+    change that last touched it, so catching up sends each changed take once
+    however often it was edited. Removed takes are kept without their row, so
+    catching up sends their removal instead.
+    '''
+
+    def __init__(self, host: str = DEFAULT_SYNC_HOST, port: int = DEFAULT_SYNC_PORT):
+        self.host = host
+        self.port = port
+        # Changes to sequence numbers from an earlier run of the hub mean nothing to this one
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        # {(sequence, slate, take): {'row': ..., 'versions': ..., 'added': ..., 'removed': ..., 'seq': ...}}, oldest change first
+        self.takes = OrderedDict()
+        self.writers = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_station, self.host, self.port)
+        # Port 0 picks a free port, which tests need to know
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def handle_station(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            hello = decode(await reader.readline())
+            since = hello.get('since', 0) if hello.get('epoch') == self.epoch else 0
+
+            # Nothing awaits between writing the catch-up and joining the broadcast, so no change can slip in between
+            writer.write(encode({'op': OP_WELCOME, 'epoch': self.epoch, 'seq': self.seq}))
+            for message in self.changes_since(since):
+                writer.write(encode(message))
+            self.writers.add(writer)
+            await writer.drain()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.receive(decode(line), writer)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def changes_since(self, since: int) -> list:
+        ''' Returns a take or remove message for every take changed after change number since, oldest first '''
+        changes = []
+        for key in reversed(self.takes):
+            state = self.takes[key]
+            if state['seq'] <= since:
+                break
+            if state['removed'] is not None:
+                message = remove_message(key, state['removed'])
+            else:
+                message = take_message(state['row'], state['versions'], state['added'])
+            changes.append({**message, 'seq': state['seq']})
+        changes.reverse()
+        return changes
+
+    def receive(self, message: dict, writer: asyncio.StreamWriter):
+        op = message.get('op')
+        if op == OP_TAKE:
+            accepted = self.merge_take(message)
+        elif op == OP_EDIT:
+            accepted = self.merge_edit(message)
+        elif op == OP_REMOVE:
+            accepted = self.merge_remove(message)
+        else:
+            return
+
+        if not accepted:
+            # Nothing to relay, but the sender can stop resending it
+            writer.write(encode({'op': OP_ACK, 'id': message.get('id')}))
+            return
+
+        message['seq'] = self.seq
+        line = encode(message)
+        for station_writer in self.writers:
+            station_writer.write(line)
+
+    def touch(self, key: tuple, state: dict):
+        self.seq += 1
+        state['seq'] = self.seq
+        self.takes[key] = state
+        self.takes.move_to_end(key)
+
+    def merge_take(self, message: dict) -> bool:
+        row = message['row']
+        versions = message.get('versions', {})
+        added = message.get('added', NO_VERSION)
+        key = take_key(row)
+        state = self.takes.get(key)
+        if state is None or state['removed'] is not None:
+            if state is not None and not is_newer(added, state['removed']):
+                # Removed after this copy of the take was added
+                return False
+            self.touch(key, {'row': dict(row), 'versions': dict(versions), 'added': added, 'removed': None})
+            return True
+
+        if is_newer(added, state['added']):
+            state['added'] = added
+        changed = False
+        for column, version in versions.items():
+            if is_newer(version, state['versions'].get(column)):
+                state['row'][column] = row.get(column)
+                state['versions'][column] = version
+                changed = True
+        if changed:
+            self.touch(key, state)
+        return changed
+
+    def merge_edit(self, message: dict) -> bool:
+        key = tuple(message['key'])
+        state = self.takes.get(key)
+        column = message['column']
+        if state is None or state['removed'] is not None or not is_newer(message['version'], state['versions'].get(column)):
+            return False
+
+        state['row'][column] = message['value']
+        state['versions'][column] = message['version']
+        self.touch(key, state)
+        return True
+
+    def merge_remove(self, message: dict) -> bool:
+        key = tuple(message['key'])
+        version = message['version']
+        state = self.takes.get(key)
+        # Takes never seen here are remembered as removed too, in case a station that still has them publishes them later
+        if state is not None and not (is_newer(version, state['added']) and is_newer(version, state['removed'])):
+            return False
+
+        self.touch(key, {'row': None, 'versions': {}, 'added': NO_VERSION, 'removed': version})
+        return True
+
+
+class TakeListSyncConnection(object):
+    ''' A station's connection to the hub, run on its own thread with its own event loop.
+
+    Changes are sent with an id and kept until the hub relays them back or
+    acknowledges them, and are resent after a reconnect. on_message is called
+    on the connection thread for every change made by another station,
+    on_confirmed for every change of ours the hub has taken in, and on_resync
+    when the hub has restarted or is seen for the first time, so the station can
+    publish everything it has. A stopped connection can be started again, and
+    catches up from the last change it has seen.
+    '''
+
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 10.0
+
+    def __init__(self, station: str, host: str = DEFAULT_SYNC_HOST, port: int = DEFAULT_SYNC_PORT, on_message=None, on_confirmed=None,
+                 on_resync=None):
+        self.station = station
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.on_confirmed = on_confirmed
+        self.on_resync = on_resync
+
+        self.epoch = None
+        self.seq = 0
+        self.ids = itertools.count(1)
+        self.pending = OrderedDict()
+        self.writer = None
+        self.connected = threading.Event()
+
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="TakeListSync", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.task:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread:
+            self.thread.join()
+
+    def send(self, message: dict):
+        ''' Thread safe. Queues a take, edit or remove message for the hub '''
+        self.loop.call_soon_threadsafe(self.queue_message, message)
+
+    def queue_message(self, message: dict):
+        message_id = next(self.ids)
+        message['origin'] = self.station
+        message['id'] = message_id
+        self.pending[message_id] = message
+        if self.writer:
+            self.writer.write(encode(message))
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.keep_connected())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            # The loop is kept open, so changes sent while stopped are queued until started again
+            pass
+
+    async def keep_connected(self):
+        delay = TakeListSyncConnection.RECONNECT_DELAY
+        while True:
+            try:
+                await self.connect()
+                delay = TakeListSyncConnection.RECONNECT_DELAY
+            except (ConnectionError, OSError, ValueError, asyncio.IncompleteReadError) as e:
+                logger.debug(f"Take list sync connection to {self.host}:{self.port} failed: {e}")
+            finally:
+                self.writer = None
+                self.connected.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TakeListSyncConnection.MAX_RECONNECT_DELAY)
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(encode({'op': OP_HELLO, 'station': self.station, 'epoch': self.epoch, 'since': self.seq}))
+            welcome = decode(await reader.readline())
+            if welcome.get('epoch') != self.epoch:
+                self.epoch = welcome['epoch']
+                self.seq = 0
+                if self.on_resync:
+                    self.on_resync()
+
+            self.writer = writer
+            for message in self.pending.values():
+                writer.write(encode(message))
+            self.connected.set()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                self.receive(decode(line))
+        finally:
+            writer.close()
+
+    def receive(self, message: dict):
+        if message.get('op') == OP_ACK:
+            self.confirm(message.get('id'))
+            return
+
+        self.seq = max(self.seq, message.get('seq', 0))
+        if message.get('origin') == self.station:
+            # Our own change coming back from the hub. It has already been applied here
+            self.confirm(message.get('id'))
+            return
+        if self.on_message:
+            self.on_message(message)
+
+    def confirm(self, message_id):
+        message = self.pending.pop(message_id, None)
+        if message and self.on_confirmed:
+            self.on_confirmed(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relays take list changes between Switchboard stations")
+    parser.add_argument('--host', default=DEFAULT_SYNC_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_SYNC_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Take list sync hub listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(TakeListSyncServer(args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+from PySide2.QtCore import QObject, Signal, Slot
+from switchboard.switchboard_logging import LOGGER
+from .takelist_model import TakeListModel
+from .takelist_sync import (DEFAULT_SYNC_HOST, DEFAULT_SYNC_PORT, NO_VERSION, OP_EDIT, OP_REMOVE, OP_TAKE, SYNC_COLUMNS,
+                            TakeListSyncConnection, VersionClock, edit_message, is_newer, remove_message, take_key, take_message)
+import os, socket
+
+
+class TakeListSyncClient(QObject):
+    ''' Keeps a TakeListModel in sync with the other stations connected to a TakeListSyncServer.
+
+    Takes added, removed and edited locally are sent to the hub as deltas, which
+    includes undoing the addition of takes. Changes from other stations are applied
+    through the model's insert_takes, remove_takes and apply_edit, so they are
+    persisted like local ones, but aren't sent back out or put on the undo stack.
+    '''
+
+    # Relay the connection thread's callbacks onto the GUI thread
+    message_received = Signal(dict)
+    message_confirmed = Signal(dict)
+    resync_requested = Signal()
+
+    def __init__(self, model: TakeListModel, host: str = DEFAULT_SYNC_HOST, port: int = DEFAULT_SYNC_PORT, station: str = None, parent: QObject = None):
+        QObject.__init__(self, parent)
+
+        self.model = model
+        self.station = station or f"{socket.gethostname()}-{os.getpid()}"
+        self.clock = VersionClock(self.station)
+        # Version of every synced field, keyed by (sequence, slate, take, column). Fields never synced have none
+        self.versions = {}
+        # Version each take was added with, and of every removal made here that the hub hasn't taken in yet,
+        # keyed by (sequence, slate, take). The hub keeps removals itself once it has them
+        self.added = {}
+        self.removed = {}
+        self.applying_remote = False
+
+        self.connection = TakeListSyncConnection(self.station, host, port,
+                                                 on_message=self.message_received.emit,
+                                                 on_confirmed=self.message_confirmed.emit,
+                                                 on_resync=self.resync_requested.emit)
+        self.message_received.connect(self.apply_message)
+        self.message_confirmed.connect(self.on_message_confirmed)
+        self.resync_requested.connect(self.publish_all)
+        self.model.takes_added.connect(self.on_takes_added)
+        self.model.takes_removed.connect(self.on_takes_removed)
+        self.model.take_edited.connect(self.on_take_edited)
+
+    def start(self):
+        LOGGER.info(f"Syncing the take list as {self.station} via {self.connection.host}:{self.connection.port}")
+        self.connection.start()
+
+    def stop(self):
+        self.connection.stop()
+
+    # ~ Local changes
+
+    @Slot(list)
+    def on_takes_added(self, take_items):
+        if self.applying_remote:
+            return
+        version = self.clock.tick()
+        for take_item in take_items:
+            row = take_item.toRow()
+            key = take_key(row)
+            for column in SYNC_COLUMNS:
+                self.versions[key + (column,)] = version
+            self.added[key] = version
+            self.removed.pop(key, None)
+            self.connection.send(take_message(row, {column: version for column in SYNC_COLUMNS}, version))
+
+    @Slot(list)
+    def on_takes_removed(self, keys):
+        if self.applying_remote:
+            return
+        version = self.clock.tick()
+        for key in keys:
+            self.forget(key)
+            self.removed[key] = version
+            self.connection.send(remove_message(key, version))
+
+    @Slot(object, str)
+    def on_take_edited(self, take_item, column: str):
+        if self.applying_remote or column not in SYNC_COLUMNS:
+            return
+        key = take_key(take_item.toRow())
+        version = self.versions[key + (column,)] = self.clock.tick()
+        self.connection.send(edit_message(key, column, take_item.data(column), version))
+
+    @Slot(dict)
+    def on_message_confirmed(self, message: dict):
+        ''' Drops the tombstone of a removal once the hub has relayed it, or turned it down for a newer copy of the take '''
+        if message.get('op') == OP_REMOVE:
+            key = tuple(message['key'])
+            if self.removed.get(key) == message['version']:
+                del self.removed[key]
+
+    @Slot()
+    def publish_all(self):
+        ''' Sends every take, and removals the hub hasn't taken in yet, to a hub that hasn't seen this station yet.
+        Fields never synced lose against everything else '''
+        if self.model.lazy:
+            self.model.flush()
+            rows = self.model.get_store().query()
+        else:
+            rows = self.model.rootItem.iterRows()
+
+        for row in rows:
+            key = take_key(row)
+            versions = {column: self.versions.get(key + (column,), NO_VERSION) for column in SYNC_COLUMNS}
+            self.connection.send(take_message(row, versions, self.added.get(key, NO_VERSION)))
+        for key, version in self.removed.items():
+            self.connection.send(remove_message(key, version))
+
+    # ~ Remote changes
+
+    @Slot(dict)
+    def apply_message(self, message: dict):
+        self.applying_remote = True
+        try:
+            op = message.get('op')
+            if op == OP_TAKE:
+                self.apply_take(message['row'], message.get('versions', {}), message.get('added', NO_VERSION))
+            elif op == OP_EDIT:
+                self.apply_field(tuple(message['key']), message['column'], message['value'], message['version'])
+            elif op == OP_REMOVE:
+                self.apply_remove(tuple(message['key']), message['version'])
+        finally:
+            self.applying_remote = False
+
+    def apply_take(self, row: dict, versions: dict, added):
+        key = take_key(row)
+        self.clock.observe(added)
+        if not is_newer(added, self.removed.get(key)):
+            # Removed here after this copy of the take was added
+            return
+
+        # Changes from other stations go around the undo stack, which only holds this station's own changes
+        if self.model.find_take(*key) is None and self.model.insert_takes([dict(row)]):
+            for column, version in versions.items():
+                self.clock.observe(version)
+                self.versions[key + (column,)] = version
+            self.added[key] = added
+            self.removed.pop(key, None)
+            return
+
+        if is_newer(added, self.added.get(key, NO_VERSION)):
+            self.added[key] = added
+
+        # Already known here, so only fields written after ours are taken over
+        for column, version in versions.items():
+            self.apply_field(key, column, row.get(column), version)
+
+    def apply_field(self, key: tuple, column: str, value, version):
+        self.clock.observe(version)
+        if column not in SYNC_COLUMNS or not is_newer(version, self.versions.get(key + (column,), NO_VERSION)):
+            return
+
+        slate_item = self.model.get_slate(key[0], key[1])
+        if slate_item and not slate_item.fetched:
+            self.model.fetch_slate(slate_item)
+        take_item = self.model.find_take(*key)
+        if not take_item:
+            return
+        self.versions[key + (column,)] = version
+        if take_item.data(column) != value:
+            self.model.apply_edit(key, column, value)
+
+    def apply_remove(self, key: tuple, version):
+        self.clock.observe(version)
+        if not (is_newer(version, self.added.get(key, NO_VERSION)) and is_newer(version, self.removed.get(key))):
+            # The take was added again here after the other station removed it
+            return
+        self.forget(key)
+        self.removed.pop(key, None)
+        self.model.remove_takes([key])
+
+    def forget(self, key: tuple):
+        ''' Drops the versions of a removed take '''
+        self.added.pop(key, None)
+        for column in SYNC_COLUMNS:
+            self.versions.pop(key + (column,), None)
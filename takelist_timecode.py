@@ -0,0 +1,224 @@
+''' Timecode handling for the take list.
+
+Takes keep their timecode and duration as integer frame counts plus the frame
+rate they were counted at, so sorting, filtering and duration math never touch
+strings. "HH:MM:SS:FF" strings only appear at the edges: in the csv take list
+and in the view. Drop frame timecode isn't supported, so 29.97 is counted as
+30 non-drop frames per second.
+'''
+from abc import ABC, abstractmethod
+import datetime, itertools, pathlib
+
+DEFAULT_FRAME_RATE = 24
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# "00" to "99", so formatting a timecode is a few list lookups instead of four format calls
+TWO_DIGITS = [f"{value:02d}" for value in range(100)]
+
+
+def nominal_fps(rate) -> int:
+    ''' Frames counted per timecode second '''
+    return int(round(rate))
+
+
+def frames_per_day(rate) -> int:
+    return SECONDS_PER_DAY * nominal_fps(rate)
+
+
+def parse_rate(rate):
+    ''' Reads a frame rate back from csv. Whole rates stay ints so they are written back as e.g. "24" '''
+    if rate is None or rate == "":
+        return DEFAULT_FRAME_RATE
+    rate = float(rate)
+    return int(rate) if rate.is_integer() else rate
+
+
+def timecode_to_frames(timecode: str, rate=DEFAULT_FRAME_RATE):
+    ''' Converts "HH:MM:SS:FF" to a frame count. Returns None for an empty timecode '''
+    if not timecode:
+        return None
+    hours, minutes, seconds, frames = timecode.replace(';', ':').split(':')
+    fps = nominal_fps(rate)
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * fps + int(frames)
+
+
+def frames_to_timecode(frames, rate=DEFAULT_FRAME_RATE) -> str:
+    ''' Converts a frame count to "HH:MM:SS:FF". Returns an empty string when there is no timecode '''
+    if frames is None:
+        return ""
+    seconds, frame = divmod(frames, nominal_fps(rate))
+    minutes, second = divmod(seconds, 60)
+    hours, minute = divmod(minutes, 60)
+    hours = TWO_DIGITS[hours] if hours < 100 else str(hours)
+    return f"{hours}:{TWO_DIGITS[minute]}:{TWO_DIGITS[second]}:{TWO_DIGITS[frame]}"
+
+
+def duration_to_frames(duration, rate=DEFAULT_FRAME_RATE) -> int:
+    ''' Reads a duration back as frames. Older take lists stored it as seconds rather than as a timecode '''
+    if duration is None or duration == "":
+        return 0
+    if isinstance(duration, str):
+        if ':' in duration:
+            return timecode_to_frames(duration, rate)
+        duration = float(duration)
+    return int(round(duration * rate)) if isinstance(duration, float) else duration
+
+
+def repeat_rate(rates):
+    ''' Lets the bulk conversions take either a single rate or one rate per value '''
+    if isinstance(rates, (int, float)):
+        return itertools.repeat(rates)
+    return rates
+
+
+def timecodes_to_frames(timecodes, rates=DEFAULT_FRAME_RATE) -> list:
+    ''' Bulk version of timecode_to_frames, for importing whole take lists '''
+    multipliers = {}
+    frames = []
+    append = frames.append
+    for timecode, rate in zip(timecodes, repeat_rate(rates)):
+        if not timecode:
+            append(None)
+            continue
+        multiplier = multipliers.get(rate)
+        if multiplier is None:
+            fps = nominal_fps(rate)
+            multiplier = multipliers[rate] = (3600 * fps, 60 * fps, fps)
+        hours, minutes, seconds, frame = timecode.replace(';', ':').split(':')
+        append(int(hours) * multiplier[0] + int(minutes) * multiplier[1] + int(seconds) * multiplier[2] + int(frame))
+    return frames
+
+
+def frames_to_timecodes(frames, rates=DEFAULT_FRAME_RATE) -> list:
+    ''' Bulk version of frames_to_timecode, for exporting whole take lists '''
+    fps_by_rate = {}
+    timecodes = []
+    append = timecodes.append
+    for frame_count, rate in zip(frames, repeat_rate(rates)):
+        if frame_count is None:
+            append("")
+            continue
+        fps = fps_by_rate.get(rate)
+        if fps is None:
+            fps = fps_by_rate[rate] = nominal_fps(rate)
+        seconds, frame = divmod(frame_count, fps)
+        minutes, second = divmod(seconds, 60)
+        hours, minute = divmod(minutes, 60)
+        hours = TWO_DIGITS[hours] if hours < 100 else str(hours)
+        append(f"{hours}:{TWO_DIGITS[minute]}:{TWO_DIGITS[second]}:{TWO_DIGITS[frame]}")
+    return timecodes
+
+
+def parse_timecode_columns(row: dict) -> dict:
+    ''' Converts the Timecode, Duration and Rate of a row to frames and a rate if they are still strings '''
+    rate = row.get('Rate')
+    if rate is None or isinstance(rate, str):
+        rate = row['Rate'] = parse_rate(rate)
+    timecode = row.get('Timecode')
+    if isinstance(timecode, str):
+        row['Timecode'] = timecode_to_frames(timecode, rate)
+    duration = row.get('Duration')
+    if duration is None or isinstance(duration, (str, float)):
+        row['Duration'] = duration_to_frames(duration, rate)
+    return row
+
+
+def parse_timecode_rows(rows: list) -> list:
+    ''' Bulk version of parse_timecode_columns for rows read from csv, converting a column at a time '''
+    rates = [parse_rate(row.get('Rate')) for row in rows]
+    timecodes = timecodes_to_frames([row.get('Timecode') for row in rows], rates)
+    for row, rate, timecode in zip(rows, rates, timecodes):
+        row['Rate'] = rate
+        row['Timecode'] = timecode
+        row['Duration'] = duration_to_frames(row.get('Duration'), rate)
+    return rows
+
+
+def format_timecode_rows(rows: list) -> list:
+    ''' Replaces the frame counts of the given rows with timecode strings, in place, for writing them to csv '''
+    rates = [row.get('Rate', DEFAULT_FRAME_RATE) for row in rows]
+    timecodes = frames_to_timecodes([row.get('Timecode') for row in rows], rates)
+    durations = frames_to_timecodes([row.get('Duration') for row in rows], rates)
+    for row, timecode, duration in zip(rows, timecodes, durations):
+        row['Timecode'] = timecode
+        row['Duration'] = duration
+    return rows
+
+
+class TimecodeRange(object):
+    ''' Inclusive range of start timecodes. Either end can be left empty to leave the range open on that side.
+    A range whose start is later than its end runs through midnight, e.g. a night shoot from 23:00 to 01:00.
+
+    The ends are converted to frames once for each rate they are compared at, so checking a take is
+    two integer comparisons.
+    '''
+
+    def __init__(self, start: str, end: str):
+        self.start = start
+        self.end = end
+        self.bounds = {}
+
+    def frames_at(self, rate) -> tuple:
+        bounds = self.bounds.get(rate)
+        if bounds is None:
+            start = timecode_to_frames(self.start, rate)
+            end = timecode_to_frames(self.end, rate)
+            bounds = self.bounds[rate] = (0 if start is None else start, float('inf') if end is None else end)
+        return bounds
+
+    def contains(self, frames, rate) -> bool:
+        if frames is None:
+            return False
+        start, end = self.frames_at(rate)
+        if start > end:
+            return frames >= start or frames <= end
+        return start <= frames <= end
+
+
+class TimecodeClock(ABC):
+    ''' Source of the timecode stamped on takes when recording starts and stops '''
+
+    def __init__(self, rate=DEFAULT_FRAME_RATE):
+        self.rate = rate
+
+    @abstractmethod
+    def frames(self) -> int:
+        ''' The current timecode as a frame count at self.rate '''
+
+    def timecode(self) -> str:
+        return frames_to_timecode(self.frames(), self.rate)
+
+    def duration(self, start_frames: int, stop_frames: int) -> int:
+        ''' Frames between start and stop, for takes that run past midnight too '''
+        return (stop_frames - start_frames) % frames_per_day(self.rate)
+
+
+class SystemClock(TimecodeClock):
+    ''' Time of day timecode from the local system clock '''
+
+    def frames(self) -> int:
+        now = datetime.datetime.now()
+        seconds = (now.hour * 60 + now.minute) * 60 + now.second + now.microsecond / 1000000
+        return int(seconds * nominal_fps(self.rate))
+
+
+class LTCFileClock(TimecodeClock):
+    ''' Stand-in for an LTC reader that plays back timecodes from a text file, one "HH:MM:SS:FF" per line.
+
+    Each read returns the next timecode in the file, and the last one is repeated once they
+    run out, so recordings can be replayed against known timecodes.
+    '''
+
+    def __init__(self, path: pathlib.Path, rate=DEFAULT_FRAME_RATE):
+        super().__init__(rate)
+        with open(path, 'r', encoding='utf-8') as timecode_file:
+            timecodes = [line.strip() for line in timecode_file]
+        self.timecodes = [timecode for timecode in timecodes if timecode and not timecode.startswith('#')]
+        self.position = 0
+
+    def frames(self) -> int:
+        if not self.timecodes:
+            return 0
+        timecode = self.timecodes[min(self.position, len(self.timecodes) - 1)]
+        self.position += 1
+        return timecode_to_frames(timecode, self.rate)
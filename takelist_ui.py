@@ -1,6 +1,8 @@
-from PySide2.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QPushButton
-from PySide2.QtCore import Slot, QSortFilterProxyModel, QCoreApplication
+from PySide2.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QFileDialog, QLineEdit, QComboBox, QToolButton
+from PySide2.QtCore import Slot, QCoreApplication, Qt
+from PySide2.QtGui import QKeySequence
 from .takelist_model import TakeListModel
+from .takelist_proxy import TakeListProxyModel
 from .takelist_view import TakeListView 
 from switchboard.switchboard_logging import ConsoleStream, LOGGER
 from switchboard import switchboard_dialog as sb_dialog
@@ -10,11 +12,12 @@ class TakeListUI(QWidget):
         QWidget.__init__(self, parent)
 
         self.model = model
-        self.proxymodel = QSortFilterProxyModel()
+        self.proxymodel = TakeListProxyModel()
         self.proxymodel.setSourceModel(self.model)
 
         layout = QVBoxLayout(self)
         layout.addLayout(self.create_button_row_layout())
+        layout.addLayout(self.create_filter_row_layout())
         layout.addWidget(TakeListView(self, self.proxymodel))
 
     def create_button_row_layout(self) -> QHBoxLayout:
@@ -25,18 +28,52 @@ class TakeListUI(QWidget):
             'Save the current take list to a csv file')
         save_take_btn.clicked.connect(self.on_save_take_btn_clicked)
 
-        layout_buttons.addWidget(save_take_btn)
-
         load_take_btn = QPushButton('Open take list')
-        save_take_btn.setToolTip(
-            'Loads a take list from a csv file')
-        save_take_btn.clicked.connect(self.on_load_take_btn_clicked)
+        load_take_btn.setToolTip(
+            'Loads a take list from a csv or json file')
+        load_take_btn.clicked.connect(self.on_load_take_btn_clicked)
 
         layout_buttons.addWidget(save_take_btn)
         layout_buttons.addWidget(load_take_btn)
 
+        # Ctrl+Z and Ctrl+Shift+Z work anywhere in the take list tab
+        undo_stack = self.model.undo_stack
+        for action, shortcut in ((undo_stack.createUndoAction(self), QKeySequence.Undo),
+                                 (undo_stack.createRedoAction(self), QKeySequence.Redo)):
+            action.setShortcut(shortcut)
+            action.setShortcutContext(Qt.WidgetWithChildrenShortcut)
+            self.addAction(action)
+            button = QToolButton()
+            button.setDefaultAction(action)
+            layout_buttons.addWidget(button)
+
         return layout_buttons
 
+    def create_filter_row_layout(self) -> QHBoxLayout:
+        layout_filters = QHBoxLayout()
+
+        self.status_filter_combo = QComboBox()
+        self.status_filter_combo.addItem("All", None)
+        self.status_filter_combo.addItem("⭐", ["S"])
+        self.status_filter_combo.addItem("⭐ ✔️", ["S", "G"])
+        self.status_filter_combo.addItem("❌", ["NG"])
+        self.status_filter_combo.setToolTip('Only show takes with this status')
+        self.status_filter_combo.currentIndexChanged.connect(self.on_status_filter_changed)
+
+        notes_filter_edit = QLineEdit()
+        notes_filter_edit.setPlaceholderText('Search notes')
+        notes_filter_edit.setClearButtonEnabled(True)
+        notes_filter_edit.textChanged.connect(self.proxymodel.set_notes_filter)
+
+        layout_filters.addWidget(self.status_filter_combo)
+        layout_filters.addWidget(notes_filter_edit)
+
+        return layout_filters
+
+    @Slot(int)
+    def on_status_filter_changed(self, index: int):
+        self.proxymodel.set_status_filter(self.status_filter_combo.itemData(index))
+
     @Slot()
     def on_save_take_btn_clicked(self):
         print("Save  Clicked")
@@ -44,4 +81,6 @@ class TakeListUI(QWidget):
 
     @Slot()
     def on_load_take_btn_clicked(self):
-        print("Load Clicked")
+        path, _ = QFileDialog.getOpenFileName(self, 'Open take list', str(self.model.project_takelist_path().parent), 'Take lists (*.csv *.json)')
+        if path:
+            self.model.load_takes(path)
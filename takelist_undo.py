@@ -0,0 +1,45 @@
+from PySide2.QtWidgets import QUndoCommand
+
+
+class EditTakeCommand(QUndoCommand):
+    ''' A single edit to one column of a take. Only the take's key and the two values are kept '''
+
+    def __init__(self, model, key: tuple, column: str, old_value, new_value):
+        QUndoCommand.__init__(self, f"Set {column} of take {key[2]} in {key[0]}/{key[1]}")
+        self.model = model
+        self.key = key
+        self.column = column
+        self.old_value = old_value
+        self.new_value = new_value
+
+    def redo(self):
+        self.model.apply_edit(self.key, self.column, self.new_value)
+
+    def undo(self):
+        self.model.apply_edit(self.key, self.column, self.old_value)
+
+
+class AddTakesCommand(QUndoCommand):
+    ''' Takes added in one go, e.g. a recorded take or a loaded take list.
+
+    The takes are already in the model when the command is pushed, so only their
+    keys are kept. Their rows are only held while the command is undone, so that
+    redoing it can put the same takes back.
+    '''
+
+    def __init__(self, model, keys):
+        text = f"Add take {keys[0][2]} to {keys[0][0]}/{keys[0][1]}" if len(keys) == 1 else f"Add {len(keys)} takes"
+        QUndoCommand.__init__(self, text)
+        self.model = model
+        self.keys = keys
+        self.rows = None
+
+    def redo(self):
+        if self.rows is None:
+            # Pushed right after the takes were added
+            return
+        self.model.insert_takes(self.rows)
+        self.rows = None
+
+    def undo(self):
+        self.rows = self.model.remove_takes(self.keys)
@@ -1,5 +1,6 @@
 from PySide2.QtWidgets import QWidget, QTableView, QTreeView, QSizePolicy, QHeaderView, QComboBox, QItemDelegate, QStyleOptionViewItem
-from PySide2.QtCore import QModelIndex, QAbstractItemModel, Qt, Slot
+from PySide2.QtCore import QModelIndex, QAbstractItemModel, QAbstractProxyModel, Qt, Slot
+from .takelist_core import STATUS_GLYPHS
 from .takelist_model import TakeListModel
 from switchboard.switchboard_logging import ConsoleStream, LOGGER
 
@@ -7,12 +8,19 @@ class TakeListView(QTreeView):
     def __init__(self, parent: QWidget, model: TakeListModel):
         QTreeView.__init__(self, parent)
         
-        self.expanded_items = set()
+        # Expanded sequences and slates, keyed by their (sequence,) or (sequence, slate) path so the
+        # state survives resets and re-sorts that invalidate model indexes
+        self.expanded_paths = set()
 
         self.model = model
-        self.model.dataChanged.connect(self.refresh)
-        self.model.layoutChanged.connect(self.refresh)
         self.setModel(self.model)
+        self.model.layoutChanged.connect(self.refresh)
+        self.model.modelReset.connect(self.refresh)
+
+        # Tracks expanded state incrementally, and lets a lazy take list model load slates on expand
+        # and evict them again once collapsed
+        self.expanded.connect(self.on_expanded)
+        self.collapsed.connect(self.on_collapsed)
 
         status_col_idx = [self.model.headerData(col, Qt.Horizontal) for col in range(self.model.columnCount())].index("Status")
         self.setItemDelegateForColumn(status_col_idx, TakeListStatusItemDelegate(self, self.model))
@@ -32,85 +40,77 @@ class TakeListView(QTreeView):
 
     @Slot()
     def refresh(self):
-        LOGGER.info("Refreshing take list view")
-        # Restore the expanded state after layout change
-        #self.restoreExpandedState()
-        #self.resizeColumnsToContents()
-        #self.expandRecursively(QModelIndex())
-
-    def layoutAboutToBeChanged(self):
-        # Save the expanded state before layout change
-        self.saveExpandedState()
-        super(TakeListView, self).layoutAboutToBeChanged()
-
-    def layoutChanged(self):
-        super(TakeListView, self).layoutChanged()
+        # Restore the expanded state after a layout change or reset
         self.restoreExpandedState()
 
-    #def dataChanged(self, topLeft, bottomRight, roles=None):
-        #LOGGER.info("Data changed")
-        #super(TakeListView, self).dataChanged(topLeft, bottomRight, roles)
-        #self.saveExpandedState()
+    def source_model(self) -> TakeListModel:
+        if isinstance(self.model, QAbstractProxyModel):
+            return self.model.sourceModel()
+        return self.model
+
+    def source_index(self, index: QModelIndex) -> QModelIndex:
+        if isinstance(self.model, QAbstractProxyModel):
+            return self.model.mapToSource(index)
+        return index
+
+    def view_index(self, source_index: QModelIndex) -> QModelIndex:
+        if isinstance(self.model, QAbstractProxyModel):
+            return self.model.mapFromSource(source_index)
+        return source_index
+
+    @Slot(QModelIndex)
+    def on_expanded(self, index: QModelIndex):
+        source_index = self.source_index(index)
+        self.expanded_paths.add(self.source_model().path_for_index(source_index))
+        self.source_model().slate_expanded(source_index)
+
+    @Slot(QModelIndex)
+    def on_collapsed(self, index: QModelIndex):
+        source_index = self.source_index(index)
+        self.expanded_paths.discard(self.source_model().path_for_index(source_index))
+        self.source_model().slate_collapsed(source_index)
 
     def rowsInserted(self, parent, start, end):
         super(TakeListView, self).rowsInserted(parent, start, end)
-        self.saveExpandedState()
 
-    def saveExpandedState(self):
-        # Save the expanded state of items
-        self.expanded_items.clear()
-        root = self.model.index(0, 0)
-        self.saveExpandedStateRecursive(root)
-
-    def saveExpandedStateRecursive(self, index):
-        if not index.isValid():
+        # Only sequences and slates can be expanded, so inserted takes cost nothing here
+        parent_path = self.source_model().path_for_index(self.source_index(parent))
+        if len(parent_path) >= 2:
             return
 
-        if self.isExpanded(index):
-            LOGGER.info(f"Saving expanded state for {index}")
-            self.expanded_items.add(index)
-
-        for row in range(self.model.rowCount(index)):
-            child_index = self.model.index(row, 0, index)
-            self.saveExpandedStateRecursive(child_index)
+        for row in range(start, end + 1):
+            index = self.model.index(row, 0, parent)
+            if self.source_model().path_for_index(self.source_index(index)) in self.expanded_paths:
+                self.setExpanded(index, True)
 
     def restoreExpandedState(self):
-        # Restore the expanded state of items
-        for index in self.expanded_items:
-            LOGGER.info(f"Restoring expanded state for {index}")
-            self.setExpanded(index, True)
+        # Only visits the remembered paths, not the whole tree
+        source_model = self.source_model()
+        for path in list(self.expanded_paths):
+            index = self.view_index(source_model.index_for_path(path))
+            if index.isValid() and not self.isExpanded(index):
+                self.setExpanded(index, True)
             
 
 class TakeListStatusItemDelegate(QItemDelegate):
+    # The editor shows the glyphs, but the model only ever gets the codes, which its status colors,
+    # tooltips and the status filter are keyed on
+
     def __init__(self, parent: QWidget, model: TakeListModel):
         QItemDelegate.__init__(self, parent)
         self.model = model
 
     def createEditor(self, parent: QWidget, option: QStyleOptionViewItem, index: QModelIndex) -> QWidget:
         dropdown = QComboBox(parent)
-        dropdown.addItem("⭐")
-        # dropdown.model().item(0).setBackground(TakeListModel.COLOR_BEST)
-        dropdown.addItem("✔️")
-        # dropdown.model().item(1).setBackground(TakeListModel.COLOR_GOOD)
-        dropdown.addItem("❌")
-        # dropdown.model().item(2).setBackground(TakeListModel.COLOR_BAD)
+        for status, glyph in STATUS_GLYPHS:
+            dropdown.addItem(glyph, status)
+            dropdown.setItemData(dropdown.count() - 1, TakeListModel.STATUS_TOOLTIPS.get(status), Qt.ToolTipRole)
         return dropdown
-        # return super().createEditor(parent, option, index)
 
     def setEditorData(self, editor: QWidget, index: QModelIndex) -> None:
-        value = self.model.data(index, Qt.DisplayRole)
-        print(f"Setting editor value to {value}")
-        editor.setCurrentText(value)
-        #return super().setEditorData(editor, index)
+        editor.setCurrentIndex(editor.findData(index.data(Qt.DisplayRole)))
 
     def setModelData(self, editor: QWidget, model: QAbstractItemModel, index: QModelIndex) -> None:
-        value = None
-        try:
-            value = editor.currentData()
-            print(f"Setting model value to {value}")
-        except Exception as e:
-            print(e)
-        if value:
-            self.model.setData(index, value)
-        else:
-            return super().setModelData(editor, model, index)
\ No newline at end of file
+        status = editor.currentData()
+        if status is not None:
+            model.setData(index, status)
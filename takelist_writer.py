@@ -0,0 +1,126 @@
+from PySide2.QtCore import QObject, Signal
+import atexit, queue, threading, time
+
+
+class TakeListWriter(QObject):
+    ''' Writes take list records and snapshots to a store on a background thread.
+
+    The GUI thread hands over records and snapshot rows that it no longer
+    touches, so the writer never reads the live tree. Everything queued while a
+    write is in progress is coalesced into the next write. Only the newest
+    snapshot is written, together with the records queued after it.
+
+    A writer that is no longer needed has to be closed, which stops its thread.
+    '''
+
+    write_finished = Signal(str)
+    write_failed = Signal(str)
+
+    JOB_APPEND = "append"
+    JOB_COMPACT = "compact"
+    JOB_EXPORT = "export"
+    JOB_STOP = "stop"
+
+    # How often flush checks that the worker is still alive while waiting for it
+    FLUSH_POLL_INTERVAL = 0.1
+
+    def __init__(self, store, parent: QObject = None):
+        ''' store is either a TakeListJournal or a TakeListSQLiteStore '''
+        QObject.__init__(self, parent)
+
+        self.store = store
+        # Records appended since the last compaction, counted as they are queued rather than written
+        self.record_count = store.record_count
+        self.jobs = queue.Queue()
+
+        self.thread = threading.Thread(target=self.run, name="TakeListWriter", daemon=True)
+        self.thread.start()
+
+        # The worker is a daemon thread, so make sure queued writes land before the interpreter exits
+        atexit.register(self.flush)
+
+    def append(self, records):
+        records = list(records)
+        self.record_count += len(records)
+        self.jobs.put((TakeListWriter.JOB_APPEND, records))
+
+    def compact(self, rows):
+        self.record_count = 0
+        self.jobs.put((TakeListWriter.JOB_COMPACT, list(rows)))
+
+    def export(self):
+        ''' Exports the store to its csv take list once everything queued before has been written '''
+        self.jobs.put((TakeListWriter.JOB_EXPORT, None))
+
+    def needs_compaction(self, extra_records: int = 0) -> bool:
+        return self.record_count + extra_records >= self.store.compact_threshold
+
+    def flush(self, timeout: float = None) -> bool:
+        ''' Blocks until everything queued so far has been written, or until timeout seconds have passed.
+
+        Returns False if the writes didn't finish, so shutdown can't hang on a worker that has died.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.jobs.all_tasks_done:
+            while self.jobs.unfinished_tasks:
+                if not self.thread.is_alive():
+                    return False
+                wait = TakeListWriter.FLUSH_POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return False
+                self.jobs.all_tasks_done.wait(wait)
+        return True
+
+    def close(self, timeout: float = None) -> bool:
+        ''' Writes everything queued so far, then stops the worker thread. Returns False if the writes didn't finish '''
+        atexit.unregister(self.flush)
+        flushed = self.flush(timeout)
+        self.jobs.put((TakeListWriter.JOB_STOP, None))
+        self.thread.join(timeout)
+        return flushed
+
+    def run(self):
+        while True:
+            jobs = [self.jobs.get()]
+            while True:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self.write(jobs)
+            except Exception as e:
+                # Anything a write raises is reported instead of ending the thread, which would drop every later write
+                self.write_failed.emit(f"Could not write take list {self.store.snapshot_path}: {e}")
+            else:
+                self.write_finished.emit(str(self.store.snapshot_path))
+            finally:
+                for _ in jobs:
+                    self.jobs.task_done()
+
+            if any(job_type == TakeListWriter.JOB_STOP for job_type, _ in jobs):
+                return
+
+    def write(self, jobs):
+        snapshot = None
+        records = []
+        export = False
+        for job_type, payload in jobs:
+            if job_type == TakeListWriter.JOB_COMPACT:
+                # A newer snapshot supersedes everything queued before it
+                snapshot = payload
+                records = []
+            elif job_type == TakeListWriter.JOB_EXPORT:
+                export = True
+            elif job_type == TakeListWriter.JOB_APPEND:
+                records += payload
+
+        if snapshot is not None:
+            self.store.compact(snapshot)
+        if records:
+            self.store.append_many(records)
+        if export:
+            self.store.export_csv(self.store.snapshot_path)
@@ -0,0 +1,19 @@
+''' Shared setup for the take list tests.
+
+The tests run headless: Qt is pointed at its offscreen platform before anything
+imports it. They import the take list as it is installed in Switchboard, so run
+them from the Switchboard python environment, e.g.
+    python -m pytest tests
+'''
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def qapp():
+    ''' The application every test runs in, created once for the session '''
+    from PySide2.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,154 @@
+''' Benchmarks for the main take list operations at 1k, 10k and 100k takes.
+
+Uses pytest-benchmark, which keeps the results between runs. Save a run and
+compare a later one against it with
+    python -m pytest tests/test_benchmark.py --benchmark-autosave
+    python -m pytest tests/test_benchmark.py --benchmark-compare --benchmark-compare-fail=min:20%
+
+Pass --benchmark-skip to run the rest of the tests without these.
+'''
+import itertools, os, subprocess
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from PySide2.QtCore import QModelIndex, Qt
+from switchboard.devices.takelist.takelist_benchmark import (BenchmarkModel, IMPORT_MODULES, QT_FREE_MODULES, generate_device_metadata,
+                                                             generate_take_rows, measure_import_time, restored_model)
+from switchboard.devices.takelist.takelist_core import CSV_HEADER_DATA
+from switchboard.devices.takelist.takelist_flatten import flatten_records
+from switchboard.devices.takelist.takelist_io import write_takelist_csv
+from switchboard.devices.takelist.takelist_model import TakeListModel
+from switchboard.devices.takelist.takelist_proxy import TakeListProxyModel
+
+SIZES = (1000, 10000, 100000)
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: f"{size // 1000}k")
+def take_rows(request):
+    return list(generate_take_rows(request.param))
+
+
+def copy_rows(rows) -> list:
+    return [dict(row) for row in rows]
+
+
+def run(benchmark, target, setup, rows):
+    ''' Times target against a fresh setup per round. The largest runs take long enough that one round is already stable '''
+    return benchmark.pedantic(target, setup=setup, rounds=3 if len(rows) < 100000 else 1)
+
+
+def add_takes_one_by_one(model, rows):
+    add_take = model.add_take
+    for row in rows:
+        add_take(row['Sequence'], row['Slate'], row['Take'], row['Notes'], row['Status'], row['Timecode'], row['Duration'], row['Rate'])
+
+
+def test_add_take(benchmark, take_rows):
+    def setup():
+        return (TakeListModel(None, persistent=False), copy_rows(take_rows)), {}
+    run(benchmark, add_takes_one_by_one, setup, take_rows)
+
+
+def test_add_take_sorted_proxy(benchmark, take_rows):
+    ''' add_take with a sorted TakeListProxyModel attached, like the take list widget has '''
+    def setup():
+        model = TakeListModel(None, persistent=False)
+        proxy = TakeListProxyModel()
+        proxy.setSourceModel(model)
+        proxy.sort(0, Qt.AscendingOrder)
+        return (model, copy_rows(take_rows), proxy), {}
+    run(benchmark, lambda model, rows, proxy: add_takes_one_by_one(model, rows), setup, take_rows)
+
+
+def traverse(model):
+    ''' Walks the whole tree through index(), parent() and data() the way a view does '''
+    column_count = model.columnCount()
+    stack = [QModelIndex()]
+    while stack:
+        parent = stack.pop()
+        for row in range(model.rowCount(parent)):
+            for column in range(column_count):
+                index = model.index(row, column, parent)
+                model.data(index, Qt.DisplayRole)
+            index = model.index(row, 0, parent)
+            model.parent(index)
+            if model.hasChildren(index):
+                stack.append(index)
+
+
+def test_traverse(benchmark, take_rows):
+    run(benchmark, traverse, lambda: ((restored_model(copy_rows(take_rows)),), {}), take_rows)
+
+
+def test_flatten(benchmark, take_rows):
+    run(benchmark, lambda model: model.rootItem.flatten(), lambda: ((restored_model(copy_rows(take_rows)),), {}), take_rows)
+
+
+def test_save_data(benchmark, take_rows, tmp_path):
+    ''' A full save, from flattening the tree to the csv snapshot being on disk '''
+    rounds = itertools.count()
+
+    def setup():
+        model = BenchmarkModel(str(tmp_path / f"round{next(rounds)}"))
+        os.makedirs(model.root_dir)
+        model.restore_data()
+        model.beginResetModel()
+        for row in copy_rows(take_rows):
+            model.restore_take(row)
+        model.endResetModel()
+        return (model,), {}
+
+    def save(model):
+        model.save_data()
+        model.flush()
+    run(benchmark, save, setup, take_rows)
+
+
+def proxy_setup(take_rows):
+    def setup():
+        model = restored_model(copy_rows(take_rows))
+        proxy = TakeListProxyModel()
+        proxy.setSourceModel(model)
+        return (model, proxy), {}
+    return setup
+
+
+def test_proxy_sort(benchmark, take_rows):
+    def sort(model, proxy):
+        proxy.sort(model.colnames.index('Timecode'), Qt.DescendingOrder)
+        proxy.sort(model.colnames.index('Status'), Qt.AscendingOrder)
+    run(benchmark, sort, proxy_setup(take_rows), take_rows)
+
+
+def test_proxy_filter(benchmark, take_rows):
+    def filter_while_typing(model, proxy):
+        proxy.set_status_filter(["S", "G"])
+        for text in ("f", "fo", "foc", "focus", "focus b"):
+            proxy.set_notes_filter(text)
+        proxy.set_notes_filter("")
+        proxy.set_status_filter(None)
+    run(benchmark, filter_while_typing, proxy_setup(take_rows), take_rows)
+
+
+def test_load(benchmark, take_rows, tmp_path):
+    csv_path = tmp_path / "load.csv"
+    write_takelist_csv(csv_path, copy_rows(take_rows), CSV_HEADER_DATA)
+    run(benchmark, lambda model: model.load_takes(csv_path), lambda: ((TakeListModel(None, persistent=False),), {}), take_rows)
+
+
+def test_flatten_metadata(benchmark, take_rows):
+    run(benchmark, flatten_records, lambda: (([generate_device_metadata(row) for row in take_rows],), {}), take_rows)
+
+
+@pytest.mark.parametrize('module', IMPORT_MODULES)
+def test_import_time(benchmark, module):
+    ''' Imports module in a fresh interpreter. The timings include starting the interpreter, which stays the same between runs '''
+    try:
+        _, loads_qt = measure_import_time(module, repeat=1)
+    except subprocess.CalledProcessError:
+        pytest.skip(f"{module} can't be imported outside Switchboard")
+    if module in QT_FREE_MODULES:
+        assert not loads_qt, f"{module} imports PySide2"
+    benchmark.pedantic(measure_import_time, args=(module, 1), rounds=5)
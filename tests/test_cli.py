@@ -0,0 +1,95 @@
+''' Tests for the take list command line tool '''
+import json, sys
+
+import pytest
+
+from switchboard.devices.takelist.takelist_cli import main, run
+from switchboard.devices.takelist.takelist_core import CSV_HEADER_DATA
+from switchboard.devices.takelist.takelist_io import read_takelist, write_takelist_csv, write_takelist_json_rows
+
+
+def take_row(sequence: str, slate: str, take: int, status: str = "G", notes: str = "", duration: int = 48, rate=24) -> dict:
+    return {'Sequence': sequence, 'Slate': slate, 'Take': take, 'Timecode': 0, 'Duration': duration, 'Rate': rate,
+            'Status': status, 'Notes': notes}
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    ''' Two projects' take lists in a directory, plus a json take list that overrides one of their takes '''
+    first = tmp_path / "projects" / "day1" / "takelist.csv"
+    second = tmp_path / "projects" / "day2" / "takelist.csv"
+    first.parent.mkdir(parents=True)
+    second.parent.mkdir(parents=True)
+    write_takelist_csv(first, [take_row("Shot2", "Slate1", 1, "NG"), take_row("Shot1", "Slate1", 2), take_row("Shot1", "Slate1", 1, "S")],
+                       CSV_HEADER_DATA)
+    write_takelist_csv(second, [take_row("Shot1", "Slate1", 2, "NG", "Boom in shot"), take_row("Shot1", "Slate2", 1, duration=60, rate=30)],
+                       CSV_HEADER_DATA)
+
+    corrections = tmp_path / "corrections.json"
+    write_takelist_json_rows(corrections, [take_row("Shot1", "Slate1", 2, "S", "Circled after review")])
+    return [tmp_path / "projects", corrections]
+
+
+EXPECTED = [
+    take_row("Shot1", "Slate1", 1, "S"),
+    take_row("Shot1", "Slate1", 2, "S", "Circled after review"),
+    take_row("Shot1", "Slate2", 1, duration=60, rate=30),
+    take_row("Shot2", "Slate1", 1, "NG"),
+]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_merge_dedupes_with_last_input_winning(inputs, tmp_path, jobs):
+    output = tmp_path / "merged.csv"
+    run(inputs, [output], jobs=jobs)
+    assert list(read_takelist(output)) == EXPECTED
+
+
+def test_later_directory_input_wins(inputs, tmp_path):
+    output = tmp_path / "merged.csv"
+    run([inputs[0]], [output], jobs=1)
+    # day2 is found after day1, so its version of Shot1/Slate1/2 wins
+    assert list(read_takelist(output))[1] == take_row("Shot1", "Slate1", 2, "NG", "Boom in shot")
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.json', '.jsonl'])
+def test_output_formats(inputs, tmp_path, suffix):
+    output = tmp_path / f"merged{suffix}"
+    run(inputs, [output], jobs=1)
+    assert list(read_takelist(output)) == EXPECTED
+
+
+def test_json_output_is_nested(inputs, tmp_path):
+    output = tmp_path / "merged.json"
+    run(inputs, [output], jobs=1)
+    with open(output, encoding='utf-8') as jsonfile:
+        takelist = json.load(jsonfile)
+    assert [(sequence['Sequence'], [slate['Slate'] for slate in sequence['Slates']]) for sequence in takelist['Children']] == [
+        ("Shot1", ["Slate1", "Slate2"]), ("Shot2", ["Slate1"])]
+
+
+def test_stats(inputs, tmp_path):
+    stats_path = tmp_path / "stats.json"
+    run(inputs, stats_path=stats_path, jobs=1)
+    with open(stats_path, encoding='utf-8') as statsfile:
+        assert json.load(statsfile) == [
+            {'Sequence': "Shot1", 'Slates': 2, 'Takes': 3, 'Circled': 2, 'Good': 1, 'NG': 0, 'NG ratio': 0.0, 'Duration': 6.0},
+            {'Sequence': "Shot2", 'Slates': 1, 'Takes': 1, 'Circled': 0, 'Good': 0, 'NG': 1, 'NG ratio': 1.0, 'Duration': 2.0},
+        ]
+
+
+def test_main_prints_stats(inputs, tmp_path, monkeypatch, capsys):
+    output = tmp_path / "merged.jsonl"
+    monkeypatch.setattr(sys, 'argv', ["takelist_cli", *map(str, inputs), "-o", str(output), "--stats", "--jobs", "1"])
+    main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ['Sequence', 'Slates', 'Takes', 'Circled', 'Good', 'NG', 'NG', 'ratio', 'Duration']
+    assert lines[1].split() == ['Shot1', '2', '3', '2', '1', '0', '0.0', '0:00:06']
+    assert lines[2].split() == ['Shot2', '1', '1', '0', '0', '1', '1.0', '0:00:02']
+    assert list(read_takelist(output)) == EXPECTED
+
+
+def test_no_inputs_found(tmp_path):
+    with pytest.raises(ValueError):
+        run([tmp_path], jobs=1)
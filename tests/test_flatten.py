@@ -0,0 +1,66 @@
+''' Tests for the nested metadata flattener '''
+import csv, pathlib, runpy
+
+import pytest
+
+from switchboard.devices.takelist.takelist_flatten import FlattenSchema, Flattener, flatten_dict, flatten_records
+
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+RECORDS = [
+    {'camera': "A", 'lens': {'focal': 35, 'iris': 2.8}, 'files': ["a.mov", "a.wav"]},
+    {'camera': "B", 'lens': {'focal': 50}, 'files': ["b.mov"]},
+    {'camera': "A", 'lens': {'focal': 35, 'iris': 4.0}, 'files': ["c.mov", "c.wav"]},
+    {'camera': "C", 'files': [], 'notes': {'line': [{'by': "script"}, {'by': "director"}]}},
+    {'camera': "B", 'lens': {'focal': 85}, 'files': ["d.mov"]},
+    {1: "integer key", 'lens': {(1, 2): "tuple key"}},
+]
+
+
+def test_matches_flatten_dict_on_mixed_shapes():
+    flattener = Flattener()
+    assert [flattener.flatten(record) for record in RECORDS] == [flatten_dict(record) for record in RECORDS]
+    assert flattener.schemas_compiled == 4
+
+
+def test_field_order():
+    fieldnames, rows = flatten_records(RECORDS[:2] + RECORDS[3:4])
+    # An empty list has no leaves, so it adds no column
+    assert fieldnames == ['camera', 'lens_focal', 'lens_iris', 'files_0', 'files_1', 'notes_line_0_by', 'notes_line_1_by']
+    assert list(rows[0]) == ['camera', 'lens_focal', 'lens_iris', 'files_0', 'files_1']
+
+
+def test_alternating_shapes_compile_once():
+    flattener = Flattener()
+    for record in RECORDS[:2] * 50:
+        flattener.flatten(record)
+    assert flattener.schemas_compiled == 2
+
+
+def test_falls_back_to_flatten_dict_after_too_many_shapes():
+    records = [{f"key{i}": i, 'nested': {'size': i}} for i in range(Flattener.MAX_SCHEMAS + 10)]
+    flattener = Flattener()
+    assert [flattener.flatten(record) for record in records] == [flatten_dict(record) for record in records]
+    assert flattener.schemas_compiled == Flattener.MAX_SCHEMAS
+    assert len(flattener.fieldnames) == len(records) + 1
+
+
+@pytest.mark.parametrize('check_leaves', [True, False])
+def test_leaf_that_turns_into_a_dict(check_leaves):
+    schema = FlattenSchema({'lens': {'focal': 35, 'iris': 2.8}})
+    record = {'lens': {'focal': {'min': 24, 'max': 70}, 'iris': 2.8}}
+    if check_leaves:
+        assert schema.flatten(record) is None
+        assert Flattener().flatten(record) == {'lens_focal_min': 24, 'lens_focal_max': 70, 'lens_iris': 2.8}
+    else:
+        # A caller that knows the shape is fixed gets the dict back as it is
+        assert schema.flatten(record, check_leaves=False) == {'lens_focal': {'min': 24, 'max': 70}, 'lens_iris': 2.8}
+
+
+def test_regenerates_output_csv(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(PACKAGE_DIR))
+    monkeypatch.chdir(tmp_path)
+    runpy.run_path(str(PACKAGE_DIR / "dictwriter.py"))
+
+    with open(tmp_path / "output.csv", newline='') as generated, open(PACKAGE_DIR / "output.csv", newline='') as expected:
+        assert list(csv.reader(generated)) == list(csv.reader(expected))
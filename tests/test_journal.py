@@ -0,0 +1,114 @@
+''' Tests for journaling take list changes and restoring from the journal '''
+import json, os, pathlib
+
+import pytest
+
+from switchboard.devices.takelist import takelist_journal
+from switchboard.devices.takelist.takelist_benchmark import BenchmarkModel
+from switchboard.devices.takelist.takelist_core import TAKELIST_BACKEND_SQLITE
+from switchboard.devices.takelist.takelist_journal import TakeListJournal
+
+
+def journal_records(model) -> list:
+    with open(model.get_store().journal_path, 'r', encoding='utf-8') as journal_file:
+        return [json.loads(line) for line in journal_file]
+
+
+@pytest.fixture
+def model(tmp_path):
+    model = BenchmarkModel(str(tmp_path))
+    model.restore_data()
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    model.add_take("Shot1", "Slate1", 2, "", "G", 0)
+    model.flush()
+    return model
+
+
+def test_edits_are_journaled_as_deltas(model):
+    model.apply_edit(("Shot1", "Slate1", 1), 'Notes', "Soft")
+    model.apply_edit(("Shot1", "Slate1", 1), 'Notes', "Soft focus")
+    model.apply_edit(("Shot1", "Slate1", 2), 'Status', "NG")
+    model.flush()
+
+    records = journal_records(model)
+    assert [record['op'] for record in records] == [TakeListJournal.OP_TAKE] * 2 + [TakeListJournal.OP_EDIT] * 2
+    # Only the last value of a cell edited twice before the save is written
+    assert records[2:] == [TakeListJournal.edit_record("Shot1", "Slate1", 1, 'Notes', "Soft focus"),
+                           TakeListJournal.edit_record("Shot1", "Slate1", 2, 'Status', "NG")]
+
+
+def test_edit_of_unsaved_take_is_part_of_its_row(model):
+    model.add_take("Shot1", "Slate1", 3, "", "G", 0)
+    model.apply_edit(("Shot1", "Slate1", 3), 'Notes', "Pickup")
+    model.flush()
+
+    records = journal_records(model)
+    assert records[-1] == TakeListJournal.take_record(model.find_take("Shot1", "Slate1", 3).toRow())
+    assert records[-1]['row']['Notes'] == "Pickup"
+
+
+def test_edits_of_removed_takes_are_dropped(model):
+    model.apply_edit(("Shot1", "Slate1", 2), 'Notes', "Boom in shot")
+    model.remove_takes([("Shot1", "Slate1", 2)])
+    model.flush()
+
+    assert journal_records(model)[-1] == TakeListJournal.remove_record("Shot1", "Slate1", 2)
+
+
+@pytest.mark.parametrize('backend', [None, TAKELIST_BACKEND_SQLITE])
+def test_restore_replays_edits(tmp_path, backend):
+    kwargs = {'backend': backend} if backend else {}
+    model = BenchmarkModel(str(tmp_path), **kwargs)
+    model.restore_data()
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    model.flush()
+    model.apply_edit(("Shot1", "Slate1", 1), 'Notes', "Soft focus")
+    model.apply_edit(("Shot1", "Slate1", 1), 'Status', "S")
+    model.flush()
+
+    restored = BenchmarkModel(str(tmp_path), **kwargs)
+    restored.restore_data()
+    take_item = restored.find_take("Shot1", "Slate1", 1)
+    assert (take_item.notes, take_item.status) == ("Soft focus", "S")
+
+
+def test_crash_before_snapshot_replaced_replays_journal(model, monkeypatch):
+    ''' The journal is moved aside, then the process dies before the new snapshot goes in '''
+    model.apply_edit(("Shot1", "Slate1", 1), 'Notes', "Soft focus")
+    model.flush()
+    store = model.get_store()
+
+    def crash(source, destination):
+        if pathlib.Path(destination) == store.snapshot_path:
+            raise SystemExit
+        os_replace(source, destination)
+    os_replace = os.replace
+    monkeypatch.setattr(takelist_journal.os, 'replace', crash)
+    with pytest.raises(SystemExit):
+        store.compact([])
+    monkeypatch.undo()
+
+    restored = BenchmarkModel(model.root_dir)
+    restored.restore_data()
+    assert restored.find_take("Shot1", "Slate1", 1).notes == "Soft focus"
+    assert restored.find_take("Shot1", "Slate1", 2)
+    assert not store.generation_path.exists()
+
+
+def test_crash_after_snapshot_replaced_drops_journal(model, monkeypatch):
+    ''' The new snapshot is in, then the process dies before the moved journal is deleted '''
+    model.apply_edit(("Shot1", "Slate1", 1), 'Notes', "Soft focus")
+    model.flush()
+    # Edited again but not journaled yet when the take list is saved, so only the snapshot has the newer value
+    model.find_take("Shot1", "Slate1", 1).setNotes("Sharp")
+    store = model.get_store()
+
+    monkeypatch.setattr(pathlib.Path, 'unlink', lambda path, missing_ok=False: None)
+    store.compact(model.rootItem.flatten())
+    monkeypatch.undo()
+    assert store.generation_path.exists()
+
+    restored = BenchmarkModel(model.root_dir)
+    restored.restore_data()
+    assert restored.find_take("Shot1", "Slate1", 1).notes == "Sharp"
+    assert not store.generation_path.exists()
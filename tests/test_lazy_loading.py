@@ -0,0 +1,98 @@
+''' Tests for loading the takes of a lazy take list model a slate at a time '''
+import pytest
+
+from switchboard.devices.takelist.takelist_benchmark import BenchmarkModel
+from switchboard.devices.takelist.takelist_core import TAKELIST_BACKEND_SQLITE, TAKELIST_SQLITE_FILE_NAME
+from switchboard.devices.takelist.takelist_journal import TakeListJournal
+from switchboard.devices.takelist.takelist_sqlite import TakeListSQLiteStore
+
+SLATES = ("Slate1", "Slate2", "Slate3")
+
+
+@pytest.fixture
+def model(tmp_path):
+    ''' A lazy model over a store with three slates of three takes, with room for two fetched slates '''
+    store = TakeListSQLiteStore(tmp_path / TAKELIST_SQLITE_FILE_NAME, tmp_path / "takelist.csv", ['Sequence', 'Slate', 'Take'])
+    store.append_many([TakeListJournal.take_record({'Sequence': "Shot1", 'Slate': slate, 'Take': take, 'Timecode': 0, 'Duration': 0,
+                                                    'Rate': 24, 'Status': "G", 'Notes': ""})
+                       for slate in SLATES for take in (1, 2, 3)])
+
+    model = BenchmarkModel(str(tmp_path), backend=TAKELIST_BACKEND_SQLITE, lazy=True)
+    model.fetched_slate_budget = 2
+    model.restore_data()
+    return model
+
+
+def slate_index(model, slate: str):
+    slate_item = model.get_slate("Shot1", slate)
+    return model.createIndex(slate_item.row(), 0, slate_item)
+
+
+def fetch(model, slate: str):
+    ''' Expands a slate the way the view does '''
+    index = slate_index(model, slate)
+    if model.canFetchMore(index):
+        model.fetchMore(index)
+    model.slate_expanded(index)
+
+
+def fetched(model) -> list:
+    return [slate for slate in SLATES if model.get_slate("Shot1", slate).fetched]
+
+
+def test_takes_are_fetched_when_a_slate_is_expanded(model):
+    index = slate_index(model, "Slate1")
+    assert model.rowCount(index) == 0
+    assert model.hasChildren(index)
+    assert model.canFetchMore(index)
+
+    model.fetchMore(index)
+    assert model.rowCount(index) == 3
+    assert not model.canFetchMore(index)
+    assert [take_item.take for take_item in model.get_slate("Shot1", "Slate1").childItems] == [1, 2, 3]
+    assert fetched(model) == ["Slate1"]
+
+
+def test_least_recently_used_slate_is_evicted(model):
+    fetch(model, "Slate1")
+    fetch(model, "Slate2")
+    # Slate1 was used last, and both are collapsed again
+    model.slate_expanded(slate_index(model, "Slate1"))
+    model.slate_collapsed(slate_index(model, "Slate2"))
+    model.slate_collapsed(slate_index(model, "Slate1"))
+
+    fetch(model, "Slate3")
+    assert fetched(model) == ["Slate1", "Slate3"]
+    assert model.rowCount(slate_index(model, "Slate2")) == 0
+    assert model.canFetchMore(slate_index(model, "Slate2"))
+
+
+def test_expanded_slates_are_not_evicted(model):
+    fetch(model, "Slate1")
+    fetch(model, "Slate2")
+    fetch(model, "Slate3")
+    assert fetched(model) == list(SLATES)
+
+
+@pytest.mark.parametrize('change', ['edit', 'new take'])
+def test_slates_with_unsaved_changes_are_not_evicted(model, change):
+    for slate in SLATES:
+        fetch(model, slate)
+    if change == 'edit':
+        model.apply_edit(("Shot1", "Slate1", 2), 'Notes', "Boom in shot")
+    else:
+        model.add_take("Shot1", "Slate1", 4, "Pickup", "G", 0)
+
+    # Collapsing the slate before its change is saved keeps its takes loaded
+    model.slate_collapsed(slate_index(model, "Slate1"))
+    assert fetched(model) == list(SLATES)
+
+    # Once saved, the slate can go, and the change is read back from the store when it is fetched again
+    model.save_dirty_takes()
+    model.slate_collapsed(slate_index(model, "Slate1"))
+    assert fetched(model) == ["Slate2", "Slate3"]
+    fetch(model, "Slate1")
+    if change == 'edit':
+        assert model.find_take("Shot1", "Slate1", 2).notes == "Boom in shot"
+    else:
+        assert model.find_take("Shot1", "Slate1", 4).notes == "Pickup"
@@ -0,0 +1,163 @@
+''' Checks that adding takes emits the minimal, consistent row insertion signals, with and without a sorted proxy attached '''
+import pytest
+
+from PySide2.QtCore import QModelIndex, Qt, qInstallMessageHandler
+from switchboard.devices.takelist.takelist_benchmark import generate_takes
+from switchboard.devices.takelist.takelist_model import TakeListModel
+from switchboard.devices.takelist.takelist_proxy import TakeListProxyModel
+
+
+class ModelSignalRecorder(object):
+    ''' Records the structural signals a model emits and checks each row insertion against the model's row counts '''
+    SIGNALS = ('rowsAboutToBeInserted', 'rowsInserted', 'rowsRemoved', 'dataChanged',
+               'layoutAboutToBeChanged', 'layoutChanged', 'modelReset')
+
+    def __init__(self, model):
+        self.model = model
+        self.counts = dict.fromkeys(ModelSignalRecorder.SIGNALS, 0)
+        # (parent item, first, last) per rowsInserted
+        self.inserted = []
+        self.errors = []
+        self.pending_insert = None
+
+        for signal_name in ModelSignalRecorder.SIGNALS:
+            getattr(model, signal_name).connect(self.make_counter(signal_name))
+        model.rowsAboutToBeInserted.connect(self.on_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self.on_rows_inserted)
+
+    def make_counter(self, signal_name):
+        def count(*args):
+            self.counts[signal_name] += 1
+        return count
+
+    def on_rows_about_to_be_inserted(self, parent, first, last):
+        row_count = self.model.rowCount(parent)
+        self.pending_insert = row_count
+        if last < first or first > row_count:
+            self.errors.append(f"rowsAboutToBeInserted({first}, {last}) with {row_count} existing rows")
+
+    def on_rows_inserted(self, parent, first, last):
+        self.inserted.append((self.item(parent), first, last))
+        if self.model.rowCount(parent) != self.pending_insert + last - first + 1:
+            self.errors.append(f"rowsInserted({first}, {last}) but row count went from {self.pending_insert} to {self.model.rowCount(parent)}")
+
+    def item(self, index: QModelIndex):
+        ''' The take list item at index. A proxy index only points at the proxy's own mapping, so it is mapped to the source first '''
+        if hasattr(self.model, 'mapToSource'):
+            index = self.model.mapToSource(index)
+        return index.internalPointer() if index.isValid() else None
+
+    def structural_counts(self) -> dict:
+        return {name: count for name, count in self.counts.items() if count}
+
+
+@pytest.fixture
+def model():
+    return TakeListModel(None, persistent=False)
+
+
+@pytest.fixture
+def sorted_proxy(model):
+    proxy = TakeListProxyModel()
+    proxy.setSourceModel(model)
+    proxy.sort(0, Qt.AscendingOrder)
+    return proxy
+
+
+@pytest.fixture
+def model_tester():
+    ''' Returns a function that attaches a QAbstractItemModelTester to a model. Any failure it reports fails the test '''
+    try:
+        from PySide2.QtTest import QAbstractItemModelTester
+    except ImportError:
+        pytest.skip("QAbstractItemModelTester isn't available in these Qt bindings")
+
+    failures = []
+    def on_message(message_type, context, message):
+        if context.category == 'qt.modeltest' or message.startswith("FAIL!"):
+            failures.append(message)
+    previous_handler = qInstallMessageHandler(on_message)
+
+    testers = []
+    def attach(model):
+        testers.append(QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Warning))
+    yield attach
+
+    qInstallMessageHandler(previous_handler)
+    assert not failures
+
+
+def add_takes(model, take_count: int):
+    for sequence, slate, take in generate_takes(take_count):
+        model.add_take(sequence, slate, take, "", "G", 0)
+
+
+def test_add_take_to_new_sequence(model):
+    signals = ModelSignalRecorder(model)
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+
+    # The sequence goes in with its slate and take already attached
+    assert signals.inserted == [(None, 0, 0)]
+    assert signals.structural_counts() == {'rowsAboutToBeInserted': 1, 'rowsInserted': 1}
+    assert not signals.errors
+
+
+def test_add_take_to_existing_slate(model):
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    signals = ModelSignalRecorder(model)
+    model.add_take("Shot1", "Slate1", 2, "", "G", 0)
+
+    assert signals.inserted == [(model.get_slate("Shot1", "Slate1"), 1, 1)]
+    assert signals.structural_counts() == {'rowsAboutToBeInserted': 1, 'rowsInserted': 1}
+    assert not signals.errors
+
+
+def test_add_take_to_new_slate(model):
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    signals = ModelSignalRecorder(model)
+    model.add_take("Shot1", "Slate2", 1, "", "G", 0)
+
+    assert signals.inserted == [(model.get_sequence("Shot1"), 1, 1)]
+    assert not signals.errors
+
+
+def test_add_existing_take_emits_nothing(model):
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    signals = ModelSignalRecorder(model)
+    model.add_take("Shot1", "Slate1", 1, "", "NG", 0)
+
+    assert signals.structural_counts() == {}
+
+
+def test_add_takes_coalesces_inserts(model):
+    model.add_take("Shot1", "Slate1", 1, "", "G", 0)
+    signals = ModelSignalRecorder(model)
+    model.add_takes({'Sequence': "Shot1", 'Slate': "Slate1", 'Take': take, 'Timecode': 0, 'Duration': 0, 'Status': "G", 'Notes': ""}
+                    for take in range(2, 12))
+
+    assert signals.inserted == [(model.get_slate("Shot1", "Slate1"), 1, 10)]
+    assert not signals.errors
+
+
+def test_add_take_signals_with_sorted_proxy(model, sorted_proxy):
+    take_count = 2000
+    model_signals = ModelSignalRecorder(model)
+    proxy_signals = ModelSignalRecorder(sorted_proxy)
+    add_takes(model, take_count)
+
+    # One insertion per take, slate or sequence, and nothing that makes views relayout or reset
+    assert model_signals.counts['rowsInserted'] == take_count
+    assert not model_signals.errors
+    assert not proxy_signals.errors
+    for signals in (model_signals, proxy_signals):
+        assert signals.counts['layoutChanged'] == 0
+        assert signals.counts['modelReset'] == 0
+    assert sorted_proxy.rowCount(QModelIndex()) == model.rowCount(QModelIndex())
+
+
+def test_model_tester(model, sorted_proxy, model_tester):
+    model_tester(model)
+    model_tester(sorted_proxy)
+    add_takes(model, 100)
+    model.add_takes({'Sequence': "Shot1", 'Slate': "Slate1", 'Take': take, 'Timecode': 0, 'Duration': 0, 'Status': "NG", 'Notes': ""}
+                    for take in range(100, 110))
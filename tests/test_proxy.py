@@ -0,0 +1,82 @@
+''' Tests for the take list sort/filter proxy '''
+import pytest
+
+from PySide2.QtCore import QModelIndex, Qt
+from switchboard.devices.takelist.takelist_benchmark import generate_take_rows, restored_model
+from switchboard.devices.takelist.takelist_model import TakeListModel
+from switchboard.devices.takelist.takelist_proxy import TakeListProxyModel
+
+
+@pytest.fixture
+def proxy():
+    proxy = TakeListProxyModel()
+    proxy.setSourceModel(restored_model(generate_take_rows(2000)))
+    return proxy
+
+
+def visible_takes(proxy) -> list:
+    takes = []
+    stack = [QModelIndex()]
+    while stack:
+        parent = stack.pop()
+        for row in range(proxy.rowCount(parent)):
+            index = proxy.index(row, 0, parent)
+            item = proxy.mapToSource(index).internalPointer()
+            if proxy.hasChildren(index):
+                stack.append(index)
+            else:
+                takes.append(item.keyPath())
+    return sorted(takes)
+
+
+def matching_takes(proxy, sequence=None, slate=None, statuses=None) -> list:
+    ''' The takes a filter should show, found by checking every take '''
+    return sorted(take_item.keyPath() for take_item in proxy.iter_takes(proxy.sourceModel().rootItem)
+                  if (sequence is None or take_item.parentItem.parentItem.sequence == sequence)
+                  and (slate is None or take_item.parentItem.slate == slate)
+                  and (statuses is None or take_item.status in statuses))
+
+
+def test_sequence_filter(proxy):
+    proxy.set_sequence_filter("SEQ002")
+    assert visible_takes(proxy) == matching_takes(proxy, sequence="SEQ002")
+    assert visible_takes(proxy)
+
+
+def test_slate_filter_with_status(proxy):
+    slate = proxy.sourceModel().rootItem.child(1).child(0).slate
+    proxy.set_slate_filter(slate)
+    proxy.set_status_filter(["G", "S"])
+    assert visible_takes(proxy) == matching_takes(proxy, slate=slate, statuses={"G", "S"})
+
+
+def test_unknown_location_shows_nothing(proxy):
+    proxy.set_sequence_filter("SEQ999")
+    assert visible_takes(proxy) == []
+    proxy.set_sequence_filter("")
+    assert len(visible_takes(proxy)) == 2000
+
+
+def test_takes_added_under_filter(proxy):
+    proxy.set_sequence_filter("SEQ001")
+    slate = proxy.sourceModel().rootItem.child(0).child(0).slate
+    proxy.sourceModel().add_take("SEQ001", slate, 100, "", "G", 0)
+    proxy.sourceModel().add_take("SEQ002", slate, 100, "", "G", 0)
+    assert visible_takes(proxy) == matching_takes(proxy, sequence="SEQ001")
+
+
+@pytest.mark.parametrize('colname', ['Timecode', 'Duration'])
+def test_mixed_rates_sort_chronologically(colname):
+    model = TakeListModel(None, persistent=False)
+    # (take, rate, seconds). Sorted by frame count, 8s at 24 fps (192) would come before 7s at 30 fps (210)
+    takes = [(1, 30, 10), (2, 24, 5), (3, 30, 7), (4, 24, 8)]
+    for take, rate, seconds in takes:
+        frames = seconds * rate
+        model.add_take("Shot1", "Slate1", take, "", "G", frames if colname == 'Timecode' else 0, frames if colname == 'Duration' else 0, rate)
+    proxy = TakeListProxyModel()
+    proxy.setSourceModel(model)
+
+    proxy.sort(model.colnames.index(colname), Qt.AscendingOrder)
+    slate_index = proxy.index(0, 0, proxy.index(0, 0))
+    order = [proxy.mapToSource(proxy.index(row, 0, slate_index)).internalPointer().take for row in range(proxy.rowCount(slate_index))]
+    assert order == [2, 3, 4, 1]
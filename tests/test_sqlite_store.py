@@ -0,0 +1,137 @@
+''' Tests for the sqlite take list store, against temporary and in-memory databases '''
+import sqlite3
+
+import pytest
+
+from switchboard.devices.takelist.takelist_core import CSV_HEADER_DATA
+from switchboard.devices.takelist.takelist_io import read_takelist, rows_to_takelist_dict, write_takelist_json
+from switchboard.devices.takelist.takelist_journal import TakeListJournal
+from switchboard.devices.takelist.takelist_sqlite import TakeListSQLiteStore
+from switchboard.devices.takelist.takelist_timecode import timecode_to_frames
+from switchboard.devices.takelist.takelist_writer import TakeListWriter
+
+FIELDNAMES = list(CSV_HEADER_DATA) + ['Lens']
+
+
+def take_row(take: int, slate: str = "Slate1", sequence: str = "Shot1", timecode: int = 0, rate=24, **values) -> dict:
+    return {
+        'Sequence': sequence,
+        'Slate': slate,
+        'Take': take,
+        'Timecode': timecode,
+        'Duration': 48,
+        'Rate': rate,
+        'Status': "G",
+        'Notes': f"Take {take}",
+        **values
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TakeListSQLiteStore(tmp_path / "takelist.db", tmp_path / "takelist.csv", FIELDNAMES)
+
+
+def test_upsert_keeps_one_row_per_take_in_order(store):
+    store.append_many([TakeListJournal.take_record(take_row(take)) for take in (1, 2, 3)])
+    store.append(TakeListJournal.take_record(take_row(2, Status="NG", Notes="Boom in shot")))
+
+    rows = list(store.query())
+    assert [row['Take'] for row in rows] == [1, 2, 3]
+    assert rows[1] == take_row(2, Status="NG", Notes="Boom in shot")
+
+
+def test_edit_records(store):
+    store.append(TakeListJournal.take_record(take_row(1, Lens="35mm")))
+    store.append_many([
+        TakeListJournal.edit_record("Shot1", "Slate1", 1, 'Notes', "Soft focus"),
+        TakeListJournal.edit_record("Shot1", "Slate1", 1, 'Lens', "50mm"),
+        # Edits of takes that aren't in the store are ignored
+        TakeListJournal.edit_record("Shot1", "Slate1", 2, 'Lens', "85mm"),
+    ])
+    assert list(store.query()) == [take_row(1, Notes="Soft focus", Lens="50mm")]
+
+    store.append(TakeListJournal.edit_record("Shot1", "Slate1", 1, 'Lens', ""))
+    assert list(store.query()) == [take_row(1, Notes="Soft focus")]
+    assert store.extra_columns() == []
+
+
+def test_remove_records(store):
+    store.append_many([TakeListJournal.take_record(take_row(take)) for take in (1, 2, 3)])
+    store.append(TakeListJournal.remove_record("Shot1", "Slate1", 2))
+
+    assert [row['Take'] for row in store.query()] == [1, 3]
+    assert list(store.query(take=2)) == []
+
+
+def test_query_filters(store):
+    store.append_many([TakeListJournal.take_record(row) for row in (
+        take_row(1), take_row(2, Status="NG"), take_row(1, slate="Slate2"), take_row(1, slate="Slate1", sequence="Shot2"))])
+
+    assert [(row['Slate'], row['Take']) for row in store.query(sequence="Shot1")] == [("Slate1", 1), ("Slate1", 2), ("Slate2", 1)]
+    assert [row['Take'] for row in store.query(sequence="Shot1", slate="Slate1", status="NG")] == [2]
+    assert list(store.slates()) == [("Shot1", "Slate1"), ("Shot1", "Slate2"), ("Shot2", "Slate1")]
+
+
+def test_query_timecode_between(store):
+    # 01:00:00:00 is a different frame count at each rate, so the range has to be converted per rate
+    store.append_many([TakeListJournal.take_record(row) for row in (
+        take_row(1, timecode=timecode_to_frames("00:59:59:23", 24)),
+        take_row(2, timecode=timecode_to_frames("01:00:00:00", 24)),
+        take_row(3, timecode=timecode_to_frames("01:00:10:00", 30), rate=30),
+        take_row(4, timecode=timecode_to_frames("01:00:10:01", 30), rate=30),
+    )])
+
+    assert [row['Take'] for row in store.query(timecode_between=("01:00:00:00", "01:00:10:00"))] == [2, 3]
+    # A range that starts later than it ends runs through midnight
+    assert [row['Take'] for row in store.query(timecode_between=("01:00:10:01", "00:59:59:23"))] == [1, 4]
+    assert list(TakeListSQLiteStore(":memory:", "unused.csv", FIELDNAMES).query(timecode_between=("01:00:00:00", "01:00:10:00"))) == []
+
+
+def test_migrates_version_1_database(tmp_path):
+    database_path = tmp_path / "takelist.db"
+    connection = sqlite3.connect(str(database_path))
+    connection.execute("CREATE TABLE takes (sequence TEXT NOT NULL, slate TEXT NOT NULL, take INTEGER NOT NULL, timecode INTEGER,"
+                       " duration INTEGER, rate NUMERIC, status TEXT, notes TEXT, PRIMARY KEY (sequence, slate, take))")
+    connection.execute("INSERT INTO takes VALUES ('Shot1', 'Slate1', 1, 0, 48, 24, 'G', 'Take 1')")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+
+    store = TakeListSQLiteStore(database_path, tmp_path / "takelist.csv", FIELDNAMES)
+    assert store.connection().execute("PRAGMA user_version").fetchone()[0] == TakeListSQLiteStore.SCHEMA_VERSION
+    assert list(store.query()) == [take_row(1)]
+
+    store.append(TakeListJournal.edit_record("Shot1", "Slate1", 1, 'Lens', "35mm"))
+    assert list(store.query()) == [take_row(1, Lens="35mm")]
+
+
+def test_export_round_trips(store, tmp_path):
+    rows = [take_row(1, Lens="35mm"), take_row(2, timecode=timecode_to_frames("10:11:12:13", 24)), take_row(1, slate="Slate2", Lens="50mm")]
+    store.compact(rows)
+
+    # compact exports the csv take list
+    assert list(read_takelist(store.snapshot_path)) == [{'Lens': "", **row} for row in rows]
+
+    json_path = tmp_path / "takelist.json"
+    write_takelist_json(json_path, rows_to_takelist_dict(store.query()))
+    assert list(read_takelist(json_path)) == rows
+
+
+def test_in_memory_store():
+    store = TakeListSQLiteStore(":memory:", "unused.csv", FIELDNAMES)
+    store.append_many([TakeListJournal.take_record(take_row(take)) for take in (1, 2)])
+    assert [row['Take'] for row in store.read_snapshot()] == [1, 2]
+    assert list(store.read_records()) == []
+
+
+def test_in_memory_store_is_shared_with_the_writer_thread():
+    store = TakeListSQLiteStore(":memory:", "unused.csv", FIELDNAMES)
+    writer = TakeListWriter(store)
+    writer.append([TakeListJournal.take_record(take_row(take)) for take in (1, 2, 3)])
+    writer.append([TakeListJournal.edit_record("Shot1", "Slate1", 2, 'Lens', "50mm")])
+    assert writer.close(timeout=5)
+
+    assert [row['Take'] for row in store.query()] == [1, 2, 3]
+    assert store.extra_columns() == ['Lens']
+    assert list(store.slates()) == [("Shot1", "Slate1")]
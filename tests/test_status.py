@@ -0,0 +1,37 @@
+''' Tests for take status codes, including take lists saved with status glyphs by older versions '''
+import pytest
+
+from PySide2.QtCore import Qt
+from switchboard.devices.takelist.takelist_core import CSV_HEADER_DATA
+from switchboard.devices.takelist.takelist_io import write_takelist_csv
+from switchboard.devices.takelist.takelist_model import TakeListModel
+from switchboard.devices.takelist.takelist_proxy import TakeListProxyModel
+
+
+@pytest.fixture
+def legacy_model(tmp_path):
+    csv_path = tmp_path / "takelist.csv"
+    rows = [{'Sequence': "Shot1", 'Slate': "Slate1", 'Take': take, 'Timecode': 0, 'Duration': 24, 'Rate': 24,
+             'Status': status, 'Notes': ""}
+            for take, status in enumerate(("⭐", "✔️", "❌", "✔", ""), 1)]
+    write_takelist_csv(csv_path, rows, CSV_HEADER_DATA)
+
+    model = TakeListModel(None, persistent=False)
+    model.load_takes(csv_path)
+    return model
+
+
+def test_glyph_statuses_load_as_codes(legacy_model):
+    statuses = [legacy_model.find_take("Shot1", "Slate1", take).status for take in range(1, 6)]
+    assert statuses == ['S', 'G', 'NG', 'G', ""]
+
+    status_index = legacy_model.findChildRowIndex("Shot1", "Slate1", 1).siblingAtColumn(legacy_model.colnames.index('Status'))
+    assert legacy_model.data(status_index, Qt.BackgroundRole) == TakeListModel.STATUS_COLORS['S']
+    assert legacy_model.data(status_index, Qt.ToolTipRole) == TakeListModel.STATUS_TOOLTIPS['S']
+
+
+def test_status_filter_matches_glyph_statuses(legacy_model):
+    proxy = TakeListProxyModel()
+    proxy.setSourceModel(legacy_model)
+    proxy.set_status_filter(["G"])
+    assert sorted(take_item.take for take_item in proxy.iter_takes(legacy_model.rootItem) if take_item in proxy.accepted_items) == [2, 4]
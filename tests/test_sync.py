@@ -0,0 +1,239 @@
+''' Tests for syncing take removals, such as undoing the addition of takes, between stations, and of the hub with real stations '''
+import asyncio, threading, time
+
+import pytest
+
+from PySide2.QtWidgets import QApplication, QUndoStack
+from switchboard.devices.takelist.takelist_model import TakeListModel
+from switchboard.devices.takelist.takelist_sync import (NO_VERSION, OP_REMOVE, OP_TAKE, TakeListSyncServer, remove_message, take_message)
+from switchboard.devices.takelist.takelist_sync_client import TakeListSyncClient
+from switchboard.devices.takelist.takelist_undo import AddTakesCommand
+
+KEY = ("Shot1", "Slate1", 1)
+
+
+def take_row(notes: str = "") -> dict:
+    return {'Sequence': KEY[0], 'Slate': KEY[1], 'Take': KEY[2], 'Timecode': 0, 'Duration': 0, 'Rate': 24, 'Status': "G", 'Notes': notes}
+
+
+class RecordingWriter(object):
+    ''' Stands in for a station's stream, keeping what the hub writes to it '''
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line: bytes):
+        self.lines.append(line)
+
+
+@pytest.fixture
+def server():
+    server = TakeListSyncServer(port=0)
+    server.writers.add(RecordingWriter())
+    return server
+
+
+def send(server, message: dict) -> bool:
+    ''' Returns whether the hub relayed the message '''
+    seq = server.seq
+    server.receive(dict(message), RecordingWriter())
+    return server.seq != seq
+
+
+def test_hub_relays_removal_to_stations_catching_up(server):
+    send(server, take_message(take_row(), {'Status': [1, "A"], 'Notes': [1, "A"]}, [1, "A"]))
+    assert send(server, remove_message(KEY, [2, "A"]))
+
+    assert server.changes_since(0) == [{**remove_message(KEY, [2, "A"]), 'seq': 2}]
+    # Neither edits nor older copies of the take bring it back
+    assert not send(server, {'op': 'edit', 'key': list(KEY), 'column': 'Notes', 'value': "late", 'version': [3, "B"]})
+    assert not send(server, take_message(take_row(), {'Status': NO_VERSION, 'Notes': NO_VERSION}, NO_VERSION))
+
+
+def test_hub_takes_back_readded_take(server):
+    send(server, take_message(take_row(), {'Status': [1, "A"], 'Notes': [1, "A"]}, [1, "A"]))
+    send(server, remove_message(KEY, [2, "A"]))
+    assert send(server, take_message(take_row("again"), {'Status': [3, "A"], 'Notes': [3, "A"]}, [3, "A"]))
+
+    assert [change['op'] for change in server.changes_since(0)] == [OP_TAKE]
+    # A removal made against the first copy loses against the take added again
+    assert not send(server, remove_message(KEY, [2, "B"]))
+
+
+def test_hub_keeps_removal_of_unknown_take(server):
+    assert send(server, remove_message(KEY, [2, "A"]))
+    assert not send(server, take_message(take_row(), {'Status': [1, "B"], 'Notes': [1, "B"]}, [1, "B"]))
+
+
+@pytest.fixture
+def station():
+    ''' A model with a sync client that records what it would send instead of connecting '''
+    model = TakeListModel(None, persistent=False)
+    client = TakeListSyncClient(model, station="A")
+    sent = []
+    client.connection.send = sent.append
+    return model, client, sent
+
+
+def test_undoing_added_takes_sends_removal(station):
+    model, client, sent = station
+    undo_stack = QUndoStack()
+    model.add_take(*KEY, "", "G", 0)
+    undo_stack.push(AddTakesCommand(model, [KEY]))
+
+    undo_stack.undo()
+    assert sent[-1]['op'] == OP_REMOVE
+    removal = sent[-1]['version']
+    assert tuple(sent[-1]['key']) == KEY
+
+    # Redoing adds the take again with a version newer than its removal
+    undo_stack.redo()
+    assert sent[-1]['op'] == OP_TAKE
+    assert tuple(sent[-1]['added']) > tuple(removal)
+
+
+def test_remote_removal(station):
+    model, client, sent = station
+    client.apply_message(take_message(take_row(), {'Status': [1, "B"], 'Notes': [1, "B"]}, [1, "B"]))
+    assert model.find_take(*KEY)
+
+    client.apply_message(remove_message(KEY, [2, "B"]))
+    assert model.find_take(*KEY) is None
+    # Applied without being sent back out
+    assert sent == []
+    # The hub keeps the removal, so no tombstone is kept here
+    assert client.removed == {}
+
+
+def test_remote_removal_loses_against_take_added_again(station):
+    model, client, sent = station
+    model.add_take(*KEY, "", "G", 0)
+    added = sent[-1]['added']
+    client.apply_message(remove_message(KEY, [added[0] - 1, "B"]))
+    assert model.find_take(*KEY)
+
+
+def test_publish_all_sends_removals(station):
+    model, client, sent = station
+    model.add_take(*KEY, "", "G", 0)
+    model.remove_takes([KEY])
+    sent.clear()
+
+    client.publish_all()
+    assert [(message['op'], tuple(message.get('key', ()))) for message in sent] == [(OP_REMOVE, KEY)]
+
+
+def test_confirmed_removals_are_not_published_again(station):
+    model, client, sent = station
+    model.add_take(*KEY, "", "G", 0)
+    model.remove_takes([KEY])
+    removal = sent[-1]
+    model.add_take("Shot1", "Slate1", 2, "", "G", 0)
+    model.remove_takes([("Shot1", "Slate1", 2)])
+
+    client.on_message_confirmed(removal)
+    sent.clear()
+    client.publish_all()
+    assert [(message['op'], tuple(message['key'])) for message in sent] == [(OP_REMOVE, ("Shot1", "Slate1", 2))]
+
+
+# ~ Stations syncing through a hub on localhost
+
+
+def rows(model) -> list:
+    return sorted((row['Sequence'], row['Slate'], row['Take'], row['Status'], row['Notes']) for row in model.rootItem.iterRows())
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    ''' Processes Qt events, which is where stations apply what the hub relays, until condition holds '''
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        QApplication.processEvents()
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def hub():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = TakeListSyncServer(host="127.0.0.1", port=0)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=5)
+    yield server
+
+    async def shutdown():
+        server.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def stations(hub):
+    clients = []
+    for name in ("A", "B"):
+        client = TakeListSyncClient(TakeListModel(None, persistent=False), host="127.0.0.1", port=hub.port, station=name)
+        client.start()
+        clients.append(client)
+    assert wait_until(lambda: all(client.connection.connected.is_set() for client in clients))
+    yield clients
+    for client in clients:
+        client.stop()
+
+
+def test_stations_relay_through_hub(hub, stations):
+    a, b = stations
+    a.model.add_take(*KEY, "from A", "G", 0)
+    assert wait_until(lambda: rows(b.model) == rows(a.model) != [])
+
+    b.model.update_take(*KEY, {'Status': "S"})
+    assert wait_until(lambda: rows(a.model) == [KEY + ("S", "from A")])
+
+    a.model.remove_takes([KEY])
+    assert wait_until(lambda: rows(b.model) == [])
+    # The hub has taken in the removal, so the tombstone is dropped
+    assert wait_until(lambda: a.removed == {})
+    assert not a.connection.pending and not b.connection.pending
+
+
+def test_concurrent_edits_tie_break_on_station(hub, stations):
+    a, b = stations
+    a.model.add_take(*KEY, "", "G", 0)
+    assert wait_until(lambda: b.model.find_take(*KEY) is not None)
+    assert a.clock.counter == b.clock.counter
+
+    # Edits made before either station sees the other's stamp the same counter, and the higher station name wins
+    a.model.update_take(*KEY, {'Notes': "A's note"})
+    b.model.update_take(*KEY, {'Notes': "B's note"})
+    assert wait_until(lambda: rows(a.model) == rows(b.model) == [KEY + ("G", "B's note")])
+
+
+def test_reconnected_station_catches_up_from_its_seq(hub, stations, monkeypatch):
+    a, b = stations
+    a.model.add_take(*KEY, "", "G", 0)
+    assert wait_until(lambda: b.model.find_take(*KEY) is not None)
+
+    b.stop()
+    since = b.connection.seq
+    assert since > 0
+    a.model.add_take("Shot1", "Slate2", 1, "while B was away", "NG", 0)
+    a.model.update_take(*KEY, {'Notes': "edited while B was away"})
+    assert wait_until(lambda: hub.seq == since + 2)
+
+    requested = []
+    changes_since = hub.changes_since
+    monkeypatch.setattr(hub, 'changes_since', lambda seq: requested.append(seq) or changes_since(seq))
+    b.start()
+    assert wait_until(lambda: rows(b.model) == rows(a.model))
+    # Same hub, so no resync, only what changed after the last change B had seen
+    assert requested == [since]
+    assert b.connection.seq == hub.seq
@@ -0,0 +1,122 @@
+''' Tests for timecode conversions, ranges and clocks '''
+import pytest
+
+from switchboard.devices.takelist.takelist_timecode import (LTCFileClock, TimecodeClock, TimecodeRange, duration_to_frames,
+                                                            frames_to_timecode, frames_to_timecodes, parse_timecode_columns,
+                                                            timecode_to_frames, timecodes_to_frames)
+
+# (timecode, rate, frames). Non-integer rates count their nominal, rounded number of frames per second
+CONVERSIONS = [
+    ("00:00:00:00", 24, 0),
+    ("00:00:01:00", 24, 24),
+    ("01:00:00:00", 24, 86400),
+    ("10:11:12:13", 25, ((10 * 60 + 11) * 60 + 12) * 25 + 13),
+    ("23:59:59:29", 30, 24 * 60 * 60 * 30 - 1),
+    ("01:00:00:00", 23.976, 86400),
+    ("00:00:01:29", 29.97, 59),
+    ("00:00:00:59", 59.94, 59),
+]
+
+
+@pytest.mark.parametrize('timecode, rate, frames', CONVERSIONS)
+def test_conversions(timecode, rate, frames):
+    assert timecode_to_frames(timecode, rate) == frames
+    assert frames_to_timecode(frames, rate) == timecode
+
+
+def test_drop_frame_separator_reads_as_non_drop():
+    assert timecode_to_frames("00:01:00;02", 29.97) == 60 * 30 + 2
+
+
+def test_no_timecode():
+    assert timecode_to_frames("", 24) is None
+    assert timecode_to_frames(None, 24) is None
+    assert frames_to_timecode(None, 24) == ""
+
+
+def test_hours_past_99():
+    assert frames_to_timecode(100 * 3600 * 24, 24) == "100:00:00:00"
+
+
+def test_bulk_conversions_match_single_ones():
+    timecodes = [timecode for timecode, _, _ in CONVERSIONS] + ["", None]
+    rates = [rate for _, rate, _ in CONVERSIONS] + [24, 24]
+    frames = timecodes_to_frames(timecodes, rates)
+    assert frames == [timecode_to_frames(timecode, rate) for timecode, rate in zip(timecodes, rates)]
+    assert frames_to_timecodes(frames, rates) == [frames_to_timecode(count, rate) for count, rate in zip(frames, rates)]
+
+
+@pytest.mark.parametrize('rate', [24, 29.97])
+def test_bulk_conversions_with_one_rate(rate):
+    frames = [0, 1, 1000, None]
+    assert frames_to_timecodes(frames, rate) == [frames_to_timecode(count, rate) for count in frames]
+    assert timecodes_to_frames(frames_to_timecodes(frames, rate), rate) == frames
+
+
+def test_durations():
+    # Older take lists stored durations as seconds
+    assert duration_to_frames(2.5, 24) == 60
+    assert duration_to_frames("2.5", 24) == 60
+    assert duration_to_frames("00:00:02:12", 24) == 60
+    assert duration_to_frames(60, 24) == 60
+    assert duration_to_frames("", 24) == 0
+
+
+def test_parse_timecode_columns():
+    row = parse_timecode_columns({'Timecode': "01:00:00:00", 'Duration': 0.0, 'Rate': "29.97"})
+    assert row == {'Timecode': 3600 * 30, 'Duration': 0, 'Rate': 29.97}
+    assert parse_timecode_columns({'Timecode': "00:00:01:00", 'Duration': "00:00:01:00"})['Rate'] == 24
+
+
+def test_range_compares_at_each_rate():
+    timecode_range = TimecodeRange("01:00:00:00", "01:00:10:00")
+    assert timecode_range.contains(timecode_to_frames("01:00:00:00", 24), 24)
+    assert timecode_range.contains(timecode_to_frames("01:00:10:00", 30), 30)
+    assert not timecode_range.contains(timecode_to_frames("01:00:10:01", 30), 30)
+    assert not timecode_range.contains(timecode_to_frames("00:59:59:23", 24), 24)
+    assert not timecode_range.contains(None, 24)
+
+
+def test_open_ended_range():
+    assert TimecodeRange("", "01:00:00:00").contains(0, 24)
+    assert TimecodeRange("01:00:00:00", "").contains(10 ** 9, 24)
+
+
+def test_range_through_midnight():
+    night = TimecodeRange("23:00:00:00", "01:00:00:00")
+    for timecode in ("23:00:00:00", "23:59:59:23", "00:00:00:00", "01:00:00:00"):
+        assert night.contains(timecode_to_frames(timecode, 24), 24), timecode
+    for timecode in ("22:59:59:23", "01:00:00:01", "12:00:00:00"):
+        assert not night.contains(timecode_to_frames(timecode, 24), 24), timecode
+
+
+def test_clock_is_abstract():
+    with pytest.raises(TypeError):
+        TimecodeClock()
+
+
+@pytest.fixture
+def ltc_path(tmp_path):
+    path = tmp_path / "ltc.txt"
+    path.write_text("# night shoot\n23:59:58:00\n\n00:00:03:12\n", encoding='utf-8')
+    return path
+
+
+def test_ltc_file_clock_plays_back_timecodes(ltc_path):
+    clock = LTCFileClock(ltc_path, 24)
+    assert clock.timecode() == "23:59:58:00"
+    assert clock.timecode() == "00:00:03:12"
+    # The last timecode repeats once the file runs out
+    assert clock.timecode() == "00:00:03:12"
+
+
+def test_duration_through_midnight(ltc_path):
+    clock = LTCFileClock(ltc_path, 24)
+    start, stop = clock.frames(), clock.frames()
+    assert clock.duration(start, stop) == timecode_to_frames("00:00:05:12", 24)
+
+
+def test_empty_ltc_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("", encoding='utf-8')
+    assert LTCFileClock(path).frames() == 0
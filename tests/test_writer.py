@@ -0,0 +1,32 @@
+''' Tests for the background take list writer '''
+import atexit
+
+from switchboard.devices.takelist.takelist_benchmark import BenchmarkModel
+from switchboard.devices.takelist.takelist_journal import TakeListJournal
+from switchboard.devices.takelist.takelist_writer import TakeListWriter
+
+
+def test_close_writes_queued_records_and_stops(tmp_path, monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(atexit, 'unregister', unregistered.append)
+    store = TakeListJournal(tmp_path / "takelist.csv", tmp_path / "takelist.journal", ['Sequence', 'Slate', 'Take'])
+    writer = TakeListWriter(store)
+    writer.append([TakeListJournal.remove_record("Shot1", "Slate1", take) for take in range(10)])
+
+    assert writer.close(timeout=5)
+    assert not writer.thread.is_alive()
+    assert unregistered == [writer.flush]
+    assert len(list(store.read_records())) == 10
+
+
+def test_replacing_the_store_closes_its_writer(tmp_path):
+    model = BenchmarkModel(str(tmp_path / "first"))
+    (tmp_path / "first").mkdir()
+    model.restore_data()
+    writer = model.get_writer()
+
+    model.root_dir = str(tmp_path / "second")
+    (tmp_path / "second").mkdir()
+    model.get_store()
+    assert model.get_writer() is not writer
+    assert not writer.thread.is_alive()